@@ -1,12 +1,25 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.routes.api import router
+from src.config import METRICS_ENABLED
+from src.routes.api import history_service, nasa_service, profile_store, router
+from src.services.metrics import InstrumentationMiddleware, registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await nasa_service.close()
+    history_service.close()
+
 
 app = FastAPI(
     title="Conntour Space Explorer API",
     description="NASA image search and exploration API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -20,6 +33,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings and profiles cover the whole stack
+if METRICS_ENABLED or profile_store is not None:
+    app.add_middleware(InstrumentationMiddleware, registry=registry, profiles=profile_store)
+
 app.include_router(router)
 
 if __name__ == "__main__":
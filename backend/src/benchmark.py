@@ -0,0 +1,494 @@
+"""Offline benchmarks for the search, history and cache hot paths.
+
+Corpora are synthetic but shaped like the NASA Images API catalog: Zipfian
+vocabulary in titles and descriptions, a handful of multi-word keywords per
+image drawn from a skewed pool, NASA-style ids, dates and preview URLs.
+Everything is seeded, so two runs (or two versions) measure the same data.
+
+    python -m src.cli benchmark --sizes 10000,100000 --output before.json
+
+Results are one JSON document; latencies are in milliseconds.
+"""
+import asyncio
+import gc
+import importlib
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .models.schemas import ImageItem
+from .services.catalog_cache import CompactCatalog
+from .services.history_service import HistoryService
+from .services.nasa_service import NASAService
+from .services.query_cache import QueryCache
+from .services.search_service import SearchService
+from .services.vector_scorer import numpy_available
+
+SECTIONS = ("build", "search", "history", "cache", "e2e")
+
+# Vocabulary roughly following the real catalog's most common terms
+SPACE_TERMS = (
+    "nasa space mars moon earth apollo shuttle station international iss astronaut crew launch "
+    "orbit orbiter rover lunar solar sun saturn jupiter venus mercury neptune uranus pluto galaxy "
+    "nebula star stars cluster comet asteroid hubble telescope image view surface crater spacecraft "
+    "mission flight test engine rocket kennedy center johnson goddard marshall ames langley jet "
+    "propulsion laboratory cassini voyager juno spitzer chandra webb infrared ultraviolet x-ray "
+    "atmosphere cloud clouds storm hurricane ocean ice polar cap dust plume eruption volcano "
+    "spacewalk eva module laboratory payload satellite deploy landing landed descent ascent "
+    "capsule parachute splashdown recovery training simulator mockup hangar pad vehicle assembly "
+    "building crawler booster solid tank external main propellant cryogenic hydrogen oxygen "
+    "artemis orion gemini mercury skylab mir soyuz progress dragon cygnus dock docking berthing "
+    "arm robotic canadarm solar array panel radiator truss node cupola window earthrise horizon "
+    "aurora night city lights coast river delta desert mountain glacier island reef forest fire"
+).split()
+
+STOP_WORDS = ("the", "of", "and", "a", "in", "to", "is", "on", "for", "with", "from", "at", "by", "an")
+
+MISSIONS = (
+    "Apollo 11", "Apollo 13", "Apollo 17", "Gemini 4", "Skylab", "STS-1", "STS-31", "STS-125",
+    "Expedition 1", "Expedition 64", "Artemis I", "Mars 2020", "Curiosity", "Perseverance",
+    "Cassini", "Voyager 1", "Juno", "Hubble", "James Webb", "New Horizons", "InSight", "Ingenuity",
+)
+
+ID_PREFIXES = ("PIA", "KSC", "JSC", "GSFC", "MSFC", "ARC", "LRC", "iss", "jsc", "as11")
+
+
+class SyntheticCorpus:
+    """Seeded generator of NASA-shaped ``ImageItem`` corpora.
+
+    The vocabulary grows with the corpus (Heaps' law), so larger corpora
+    have a realistic share of rare terms; word and keyword frequencies are
+    Zipf distributed.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seed = seed
+        rng = random.Random(seed)
+        tail = [_pseudo_word(rng) for _ in range(int(40 * size ** 0.55))]
+        self.words = list(SPACE_TERMS) + list(dict.fromkeys(w for w in tail if w not in SPACE_TERMS))
+        self.word_weights = _zipf_cumulative(len(self.words), 1.07)
+
+        # Keywords are one to three words, a few hundred common ones and a long tail
+        keyword_count = max(200, int(3 * size ** 0.5))
+        keywords = dict.fromkeys(MISSIONS)
+        while len(keywords) < keyword_count:
+            n = rng.choice((1, 1, 2, 2, 3))
+            keywords[" ".join(self._words(rng, n)).title()] = None
+        self.keywords = list(keywords)
+        self.keyword_weights = _zipf_cumulative(len(self.keywords), 0.9)
+
+    def images(self, chunk: int = 10000) -> CompactCatalog:
+        """The whole corpus in columnar form."""
+        catalog = CompactCatalog(ts=int(time.time()))
+        items = self.iter_images()
+        while len(catalog) < self.size:
+            catalog.extend(item for _, item in zip(range(chunk), items))
+        return catalog
+
+    def iter_images(self) -> Iterator[ImageItem]:
+        rng = random.Random(self.seed + 1)
+        for i in range(self.size):
+            year = rng.randint(1958, 2024)
+            nasa_id = f"{rng.choice(ID_PREFIXES)}{year}-{i:07d}"
+            keywords = rng.choices(self.keywords, cum_weights=self.keyword_weights, k=min(12, int(rng.expovariate(0.2))))
+            title = " ".join(self._words(rng, rng.randint(2, 9)))
+            if keywords and rng.random() < 0.3:
+                title = f"{keywords[0]} {title}"
+            description = self._description(rng, min(600, int(rng.lognormvariate(3.4, 0.9))))
+            yield ImageItem.model_construct(
+                id=nasa_id.replace("-", "_"),
+                nasa_id=nasa_id,
+                title=title.capitalize(),
+                description=description,
+                date_created=f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z",
+                keywords=list(dict.fromkeys(keywords)),
+                preview_url=f"https://images-assets.nasa.gov/image/{nasa_id}/{nasa_id}~thumb.jpg"
+            )
+
+    def query_mixes(self, count: int, seed: int = 0) -> Dict[str, List[str]]:
+        """Query sets by kind: frequent and rare terms, multi-word, exact keywords,
+        misses and quoted keyword phrases."""
+        rng = random.Random(seed + 2)
+        head = self.words[:50]
+        rare = self.words[len(self.words) // 2:] or self.words
+        return {
+            "head": [rng.choice(head) for _ in range(count)],
+            "tail": [rng.choice(rare) for _ in range(count)],
+            "multi": [" ".join(self._words(rng, rng.randint(2, 4))) for _ in range(count)],
+            "keyword": rng.choices(self.keywords, cum_weights=self.keyword_weights, k=count),
+            "miss": [f"{_pseudo_word(rng)}qx" for _ in range(count)],
+            "phrase": [f'"{keyword}"' for keyword in rng.choices(self.keywords, cum_weights=self.keyword_weights, k=count)],
+        }
+
+    def _words(self, rng: random.Random, n: int) -> List[str]:
+        return rng.choices(self.words, cum_weights=self.word_weights, k=n)
+
+    def _description(self, rng: random.Random, n: int) -> str:
+        words = self._words(rng, n)
+        # About a third of running text is stop words
+        for i in range(0, len(words), 3):
+            words[i] = rng.choice(STOP_WORDS)
+        return " ".join(words)
+
+
+def run_benchmarks(
+    sizes: Sequence[int],
+    sections: Iterable[str] = SECTIONS,
+    scorers: Sequence[str] = ("python", "numpy"),
+    queries: int = 100,
+    history_sizes: Sequence[int] = (10000, 100000),
+    e2e_requests: int = 2000,
+    concurrency: int = 16,
+    budget: float = 30.0,
+    seed: int = 0,
+    workdir: Optional[str] = None,
+    log: Callable[[str], None] = lambda message: print(message, file=sys.stderr)
+) -> Dict[str, Any]:
+    """Run the selected benchmark sections and return the results document."""
+    sections = [s for s in SECTIONS if s in set(sections)]
+    scorers = [s for s in scorers if s == "python" or numpy_available()]
+    own_workdir = workdir is None
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix="benchmark-"))
+    os.makedirs(workdir, exist_ok=True)
+
+    report: Dict[str, Any] = {
+        "environment": _environment(),
+        "parameters": {
+            "sizes": list(sizes), "sections": sections, "scorers": scorers, "queries": queries,
+            "history_sizes": list(history_sizes), "e2e_requests": e2e_requests,
+            "concurrency": concurrency, "budget": budget, "seed": seed,
+        },
+        "corpora": {},
+    }
+    try:
+        for size in sizes:
+            log(f"Generating corpus of {size} images...")
+            generator = SyntheticCorpus(size, seed)
+            started = time.perf_counter()
+            corpus = generator.images()
+            result: Dict[str, Any] = {
+                "generate_seconds": round(time.perf_counter() - started, 3),
+                "vocabulary": len(generator.words),
+                "keywords": len(generator.keywords),
+            }
+            mixes = generator.query_mixes(queries, seed)
+
+            if "build" in sections or "search" in sections:
+                for scorer in scorers:
+                    log(f"[{size}] build_index and search ({scorer} scorer)...")
+                    result[f"search_{scorer}"] = bench_search(
+                        corpus, mixes, scorer, budget, search="search" in sections
+                    )
+            if "cache" in sections:
+                log(f"[{size}] catalog cache save/load...")
+                result["cache"] = bench_cache(corpus, os.path.join(workdir, f"cache-{size}.bin"))
+            if "e2e" in sections:
+                log(f"[{size}] end-to-end /search...")
+                mix = mixes["head"] + mixes["tail"] + mixes["multi"] + mixes["keyword"]
+                result["e2e"] = bench_e2e(
+                    corpus, mix, os.path.join(workdir, "e2e"), e2e_requests, concurrency, budget, seed
+                )
+            report["corpora"][str(size)] = result
+            del corpus
+            gc.collect()
+
+        if "history" in sections:
+            report["history"] = {}
+            generator = SyntheticCorpus(min(sizes or [10000]), seed)
+            pool = list(generator.iter_images())[:5000]
+            for history_size in history_sizes:
+                log(f"History with {history_size} searches...")
+                report["history"][str(history_size)] = bench_history(
+                    generator, pool, history_size, os.path.join(workdir, f"history-{history_size}.log"), budget, seed
+                )
+    finally:
+        api = sys.modules.get("src.routes.api")
+        if api is not None:
+            api.history_service.close()
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def bench_search(
+    corpus: Sequence[ImageItem], mixes: Dict[str, List[str]], scorer: str, budget: float, search: bool = True
+) -> Dict[str, Any]:
+    """Time ``build_index`` and first-page search latency per query mix, uncached."""
+    service = SearchService(executor="inline", cache=QueryCache(max_entries=0), scorer=scorer)
+    gc.collect()
+    started = time.perf_counter()
+    service.build_index(corpus)
+    build_seconds = time.perf_counter() - started
+
+    result: Dict[str, Any] = {
+        "build_index_seconds": round(build_seconds, 3),
+        "build_index_docs_per_second": round(len(corpus) / build_seconds),
+        "terms": service.snapshot.index.term_count,
+    }
+    if search:
+        for name, mix in mixes.items():
+            hits: List[int] = []
+
+            def search_page(query: str) -> None:
+                ranked = service.rank(query)
+                ranked.page(0, 20)
+                hits.append(ranked.total)
+
+            for query in mix[:3]:
+                search_page(query)  # warm up
+            hits.clear()
+            result[name] = _time_calls(search_page, mix, budget)
+            result[name]["mean_hits"] = round(sum(hits) / len(hits), 1) if hits else 0
+    return result
+
+
+def bench_cache(corpus: Sequence[ImageItem], path: str) -> Dict[str, Any]:
+    """Time writing the catalog cache file, opening it and reading every image."""
+    service = NASAService(cache_file=path, legacy_cache_file=path + ".json")
+    started = time.perf_counter()
+    service._save_to_cache(corpus)
+    save_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    images = service._load_from_cache()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in images:
+        pass
+    read_seconds = time.perf_counter() - started
+
+    result = {
+        "save_seconds": round(save_seconds, 3),
+        "load_seconds": round(load_seconds, 6),
+        "read_all_seconds": round(read_seconds, 3),
+        "file_bytes": os.path.getsize(path),
+        "images": len(images),
+    }
+    del images
+    os.remove(path)
+    return result
+
+
+def bench_history(
+    generator: SyntheticCorpus, pool: List[ImageItem], size: int, path: str, budget: float, seed: int
+) -> Dict[str, Any]:
+    """Time ``add_search`` up to ``size`` entries, then suggestions, flush and reload."""
+    rng = random.Random(seed + 3)
+    # A repeated query replaces its entry, so grow the history with distinct
+    # queries, then repeat popular ones as users do
+    distinct: Dict[str, None] = {}
+    while len(distinct) < size:
+        distinct[" ".join(generator._words(rng, rng.randint(1, 4)))] = None
+    searches = list(distinct)
+    rng.shuffle(searches)
+    searches += rng.choices(searches, cum_weights=_zipf_cumulative(size, 1.0), k=size // 10)
+
+    service = HistoryService(history_file=path, legacy_history_file=path + ".json", flush_interval=1.0)
+    add_samples = []
+    started = time.perf_counter()
+    for query in searches:
+        count = rng.randint(0, 100)
+        offset = rng.randrange(len(pool))
+        results = [pool[(offset + i) % len(pool)] for i in range(count)]
+        scores = {img.id: round(1 - i / (count + 1), 3) for i, img in enumerate(results)}
+        call_started = time.perf_counter()
+        service.add_search(query, results, scores)
+        add_samples.append(time.perf_counter() - call_started)
+    add_seconds = time.perf_counter() - started
+
+    prefixes = [q[:rng.randint(1, min(4, len(q)))] for q in rng.choices(searches, k=500)]
+    suggestions = _time_calls(service.get_suggestions, prefixes, budget)
+
+    started = time.perf_counter()
+    service.close()
+    close_seconds = time.perf_counter() - started
+    log_bytes = os.path.getsize(path)
+
+    started = time.perf_counter()
+    reloaded = HistoryService(history_file=path, legacy_history_file=path + ".json", flush_interval=0)
+    reload_seconds = time.perf_counter() - started
+    entries = len(reloaded.history)
+    reloaded.close()
+    os.remove(path)
+
+    return {
+        "add_search": dict(_summary(add_samples), per_second=round(len(searches) / add_seconds)),
+        "get_suggestions": suggestions,
+        "close_seconds": round(close_seconds, 3),
+        "reload_seconds": round(reload_seconds, 3),
+        "entries": entries,
+        "log_bytes": log_bytes,
+    }
+
+
+def bench_e2e(
+    corpus: Sequence[ImageItem], queries: List[str], workdir: str,
+    requests: int, concurrency: int, budget: float, seed: int
+) -> Dict[str, Any]:
+    """Throughput of GET /search through the ASGI app, in process.
+
+    The app keeps its data files in ``workdir`` and starts on the corpus as
+    a fresh catalog cache. The NASA API is never contacted: zero-hit queries
+    still take the fallback path, against a stub answering with no images.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    app, api = _import_app(workdir)
+
+    # Start from this corpus as if the server had just restarted on it
+    api.nasa_service._save_to_cache(corpus)
+    if os.path.exists(api.SEARCH_INDEX_FILE):
+        os.remove(api.SEARCH_INDEX_FILE)
+    api._search_initialized = False
+    api._background_loading = True  # the cache is fresh, no NASA refresh
+    return asyncio.run(_run_e2e(app, api, queries, requests, concurrency, budget, seed))
+
+
+async def _run_e2e(app, api, queries: List[str], requests: int, concurrency: int, budget: float, seed: int) -> Dict[str, Any]:
+    import httpx
+
+    rng = random.Random(seed + 4)
+    plan = [rng.choice(queries) for _ in range(requests)]
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    cache_before = api.search_service.cache.stats()
+
+    # The fallback's pooled client, bound to this event loop
+    api.nasa_service._client = httpx.AsyncClient(transport=httpx.MockTransport(_empty_nasa_search))
+    api.nasa_service._client_loop = asyncio.get_running_loop()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        started = time.perf_counter()
+        await client.get("/sources", params={"page_size": 1})
+        startup_seconds = time.perf_counter() - started
+
+        deadline = time.perf_counter() + budget
+        pending = iter(plan)
+
+        async def worker() -> None:
+            for query in pending:
+                if time.perf_counter() > deadline:
+                    return
+                call_started = time.perf_counter()
+                response = await client.get("/search", params={"q": query})
+                samples.append(time.perf_counter() - call_started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    await api.nasa_service.close()
+
+    cache_after = api.search_service.cache.stats()
+    lookups = (cache_after["hits"] - cache_before["hits"]) + (cache_after["misses"] - cache_before["misses"])
+    return {
+        "startup_seconds": round(startup_seconds, 3),
+        "requests_per_second": round(len(samples) / elapsed, 1),
+        "latency": _summary(samples),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "query_cache_hit_rate": round((cache_after["hits"] - cache_before["hits"]) / lookups, 4) if lookups else 0.0,
+    }
+
+
+def _empty_nasa_search(request):
+    import httpx
+
+    return httpx.Response(200, json={"collection": {"items": []}})
+
+
+def _import_app(workdir: str):
+    """The ASGI app and routes module, with every data file inside ``workdir``."""
+    from . import config
+
+    if "src.routes.api" not in sys.modules:
+        # Read by the routes module when it creates its services
+        config.HISTORY_FILE = os.path.join(workdir, "history.log")
+        config.SEARCH_INDEX_FILE = os.path.join(workdir, "index.bin")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+    app = importlib.import_module("app").app
+    api = importlib.import_module("src.routes.api")
+    api.nasa_service.cache_file = os.path.join(workdir, "cache.bin")
+    api.nasa_service.legacy_cache_file = os.path.join(workdir, "cache.json")
+    return app, api
+
+
+def _time_calls(fn: Callable[[Any], Any], args: Sequence[Any], budget: float) -> Dict[str, Any]:
+    """Latency summary of ``fn`` over ``args``, stopping early once ``budget`` seconds pass."""
+    samples = []
+    deadline = time.perf_counter() + budget
+    for arg in args:
+        started = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - started)
+        if started > deadline:
+            break
+    return _summary(samples)
+
+
+def _summary(samples: List[float]) -> Dict[str, Any]:
+    """Count, mean and nearest-rank percentiles of ``samples`` (seconds) in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))] * 1000, 4)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def _environment() -> Dict[str, Any]:
+    from . import config
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy_available(),
+        "config": {
+            name: getattr(config, name) for name in dir(config)
+            if name.isupper() and isinstance(getattr(config, name), (str, int, float, bool, type(None)))
+        },
+    }
+
+
+def _zipf_cumulative(n: int, exponent: float) -> List[float]:
+    total = 0.0
+    weights = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def _pseudo_word(rng: random.Random) -> str:
+    syllables = ("ka", "lo", "mi", "ra", "te", "no", "su", "vi", "an", "el", "or", "is", "ce", "tra", "pho", "gen")
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
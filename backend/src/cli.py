@@ -0,0 +1,175 @@
+"""Command-line tools for the backend.
+
+    python -m src.cli build-index [--fetch]
+    python -m src.cli memory-report
+    python -m src.cli benchmark [--sizes 10000,100000,1000000] [--output results.json]
+    python -m src.cli loader
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tracemalloc
+from typing import List, Optional
+
+from . import benchmark as benchmarks
+from . import config
+from .config import CATALOG_MAX_PAGES, NASA_API_URL, NASA_FETCH_CONCURRENCY, NASA_RATE_LIMIT, SEARCH_INDEX_FILE
+from .models.schemas import ImageItem
+from .services.catalog_cache import CompactCatalog
+from .services.nasa_service import NASAService
+from .services.search_service import SearchService
+
+
+async def _fetch_catalog(nasa_service: NASAService, max_pages: int) -> List[ImageItem]:
+    """Download the full catalog from the NASA API."""
+    images: List[ImageItem] = []
+    try:
+        async for _, page_images in nasa_service.iter_pages(1, max_pages, 100):
+            images.extend(page_images)
+    finally:
+        await nasa_service.close()
+    return images
+
+
+def build_index(args: argparse.Namespace) -> int:
+    """Build the search index for the catalog cache and persist it."""
+    nasa_service = NASAService(
+        base_url=NASA_API_URL,
+        concurrency=NASA_FETCH_CONCURRENCY,
+        rate_limit=NASA_RATE_LIMIT
+    )
+    
+    images = [] if args.fetch else nasa_service._load_from_cache()
+    if not images:
+        print(f"Fetching up to {args.max_pages} pages from the NASA API...")
+        images = asyncio.run(_fetch_catalog(nasa_service, args.max_pages))
+        if not images:
+            print("No images available, index not built")
+            return 1
+        nasa_service._save_to_cache(images)
+    
+    search_service = SearchService()
+    search_service.build_index(images)
+    if not search_service.save_index(args.output, images, nasa_service.cache_checksum):
+        return 1
+    
+    print(f"Indexed {len(images)} images into {args.output}")
+    return 0
+
+
+def memory_report(args: argparse.Namespace) -> int:
+    """Compare the heap cost per image of pydantic models and the columnar catalog."""
+    nasa_service = NASAService()
+    catalog = nasa_service._load_from_cache()
+    if not catalog:
+        print("No catalog cache found, run build-index --fetch first")
+        return 1
+    
+    # Models are built the way the old JSON cache load did
+    payload = json.dumps([img.model_dump() for img in catalog])
+    
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    models = [ImageItem(**item) for item in json.loads(payload)]
+    models_bytes = tracemalloc.get_traced_memory()[0] - start
+    
+    start = tracemalloc.get_traced_memory()[0]
+    compact = CompactCatalog(models)
+    compact_bytes = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    
+    count = len(models)
+    print(f"Images:                    {count}")
+    print(f"pydantic ImageItem list:   {models_bytes / count:8.0f} bytes/image")
+    print(f"CompactCatalog:            {compact_bytes / len(compact):8.0f} bytes/image")
+    if os.path.exists(nasa_service.cache_file):
+        size = os.path.getsize(nasa_service.cache_file)
+        print(f"Memory-mapped cache file:  {size / count:8.0f} bytes/image (page cache, shared)")
+    return 0
+
+
+def benchmark(args: argparse.Namespace) -> int:
+    """Run the offline benchmarks and write the results as JSON."""
+    report = benchmarks.run_benchmarks(
+        sizes=args.sizes,
+        sections=args.sections,
+        scorers=args.scorers,
+        queries=args.queries,
+        history_sizes=args.history_sizes,
+        e2e_requests=args.e2e_requests,
+        concurrency=args.concurrency,
+        budget=args.budget,
+        seed=args.seed,
+        workdir=args.workdir
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Benchmark results written to {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+def loader(args: argparse.Namespace) -> int:
+    """Run the shared-state loader for workers started with SHARED_STATE=worker."""
+    config.SHARED_STATE = "loader"
+    from .routes import api
+    
+    asyncio.run(api.run_loader())
+    return 0
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def _name_list(choices):
+    def parse(value: str) -> List[str]:
+        names = [v.strip() for v in value.split(",") if v.strip()]
+        unknown = set(names) - set(choices)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown {', '.join(sorted(unknown))}, expected {', '.join(choices)}")
+        return names
+    return parse
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build-index", help="prebuild the search index snapshot")
+    build.add_argument("--fetch", action="store_true", help="download the catalog even if a cache exists")
+    build.add_argument("--max-pages", type=int, default=CATALOG_MAX_PAGES)
+    build.add_argument("--output", default=SEARCH_INDEX_FILE)
+    build.set_defaults(handler=build_index)
+    
+    report = commands.add_parser("memory-report", help="report catalog memory per image")
+    report.set_defaults(handler=memory_report)
+    
+    bench = commands.add_parser("benchmark", help="benchmark hot paths on synthetic corpora (offline)")
+    bench.add_argument("--sizes", type=_int_list, default=[10000, 100000, 1000000], help="corpus sizes, comma separated")
+    bench.add_argument("--sections", type=_name_list(benchmarks.SECTIONS), default=list(benchmarks.SECTIONS))
+    bench.add_argument("--scorers", type=_name_list(("python", "numpy")), default=["python", "numpy"])
+    bench.add_argument("--queries", type=int, default=100, help="queries per query mix")
+    bench.add_argument("--history-sizes", type=_int_list, default=[10000, 100000])
+    bench.add_argument("--e2e-requests", type=int, default=2000)
+    bench.add_argument("--concurrency", type=int, default=16, help="concurrent clients for the /search run")
+    bench.add_argument("--budget", type=float, default=30.0, help="seconds per latency measurement before stopping early")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--workdir", help="directory for data files (default: a temporary one)")
+    bench.add_argument("--output", help="write JSON here instead of stdout")
+    bench.set_defaults(handler=benchmark)
+    
+    load = commands.add_parser("loader", help="load the catalog and serve history for SHARED_STATE=worker processes")
+    load.set_defaults(handler=loader)
+    
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import os
+
+# Where CPU-bound indexing and scoring run: "inline" (on the event loop),
+# "thread" or "process" pool; worker count defaults to the CPU count
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0")) or None
+
+# Scorer: "python" (postings loops) or "numpy" (sparse matrix, needs numpy and
+# scipy from requirements-optional.txt; falls back to "python" without them)
+SEARCH_SCORER = os.getenv("SEARCH_SCORER", "python")
+
+# Prebuilt index snapshot, reused while it matches the catalog cache
+SEARCH_INDEX_FILE = os.getenv("SEARCH_INDEX_FILE", "data/index.bin")
+
+# Ranked-result cache; SEARCH_CACHE_SIZE=0 disables it
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Catalog size limit (pages of 100 images); search cost scales with matches, not catalog size
+CATALOG_MAX_PAGES = int(os.getenv("CATALOG_MAX_PAGES", "100"))
+
+# NASA Images API access: pages fetched in parallel under a shared rate limit
+NASA_API_URL = os.getenv("NASA_API_URL", "https://images-api.nasa.gov/search")
+NASA_FETCH_CONCURRENCY = int(os.getenv("NASA_FETCH_CONCURRENCY", "8"))
+NASA_RATE_LIMIT = float(os.getenv("NASA_RATE_LIMIT", "10"))
+
+# Fallback searches for queries without local hits: results are cached for
+# the TTL (empty ones for the negative TTL) and, with NASA_FALLBACK_MERGE=1,
+# added to the catalog and index so the next search is served locally
+NASA_FALLBACK_CACHE_SIZE = int(os.getenv("NASA_FALLBACK_CACHE_SIZE", "1024"))
+NASA_FALLBACK_TTL = float(os.getenv("NASA_FALLBACK_TTL", "3600"))
+NASA_FALLBACK_NEGATIVE_TTL = float(os.getenv("NASA_FALLBACK_NEGATIVE_TTL", "300"))
+NASA_FALLBACK_MERGE = os.getenv("NASA_FALLBACK_MERGE", "1") == "1"
+
+# Search history log; queued changes are written and fsynced every interval
+HISTORY_FILE = os.getenv("HISTORY_FILE", "data/history.log")
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+# Results kept per history entry (highest ranked first); 0 keeps them all
+HISTORY_MAX_RESULTS = int(os.getenv("HISTORY_MAX_RESULTS", "0"))
+
+# Top up /suggestions with catalog keywords and titles when history has too few matches
+SUGGEST_FROM_CATALOG = os.getenv("SUGGEST_FROM_CATALOG", "1") == "1"
+
+# Serve /sources and /search pages from pre-serialized item JSON with strong
+# ETags; /search then only returns scores for the items on the page
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "0") == "1"
+
+# Prometheus metrics at /metrics; with METRICS_ENABLED=0 nothing is recorded
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Allow profiling single requests sent with an "X-Profile: 1" header; the
+# collapsed stacks are served under /debug/profiles
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+
+# Multi-worker deployments: one "loader" process (python -m src.cli loader)
+# fetches the catalog, writes the cache and index files and owns the history
+# log; "worker" processes memory-map those files, re-attach when the loader
+# publishes new ones (checked every SHARED_STATE_POLL seconds) and send
+# history reads and writes to the loader over SHARED_STATE_SOCKET.
+# Unset runs everything in one process.
+SHARED_STATE = os.getenv("SHARED_STATE", "")
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET", "data/history.sock")
+SHARED_STATE_POLL = float(os.getenv("SHARED_STATE_POLL", "5"))
@@ -1,5 +1,5 @@
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Optional
+from pydantic import BaseModel, Field, StringConstraints
 
 
 class ImageItem(BaseModel):
@@ -37,19 +37,70 @@ class PaginatedHistory(PaginationMixin):
     items: List[HistoryEntry]
 
 
+class KeywordCount(BaseModel):
+    keyword: str
+    count: int
+
+
+class YearCount(BaseModel):
+    year: int
+    count: int
+
+
+class Facets(BaseModel):
+    keywords: List[KeywordCount]
+    years: List[YearCount]
+
+
 class PaginatedImages(PaginationMixin):
     items: List[ImageItem]
+    facets: Optional[Facets] = None
 
 
 class PaginatedSearchResult(PaginationMixin):
     query: str
     items: List[ImageItem]
     scores: Dict[str, float]
+    facets: Optional[Facets] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[Annotated[str, StringConstraints(min_length=1, max_length=200)]] = Field(min_length=1, max_length=100)
+    page: int = Field(1, ge=1)
+    page_size: int = Field(20, ge=1, le=100)
+    record_history: bool = True
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[PaginatedSearchResult]
 
 
 class HealthResponse(BaseModel):
     status: str = "ok"
 
 
+class CacheStats(BaseModel):
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    invalidations: int
+    version: int
+
+
+class FallbackCacheStats(BaseModel):
+    entries: int
+    inflight: int
+    hits: int
+    misses: int
+    coalesced: int
+    hit_rate: float
+
+
 class DeleteResponse(BaseModel):
     deleted: str
\ No newline at end of file
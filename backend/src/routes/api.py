@@ -1,83 +1,425 @@
 import asyncio
-from typing import List, Optional
+import hashlib
+import json
+import signal
+import time
+from itertools import islice
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
 
+from ..config import (
+    CATALOG_MAX_PAGES,
+    FAST_RESPONSES,
+    HISTORY_FILE,
+    HISTORY_FLUSH_INTERVAL,
+    HISTORY_MAX_RESULTS,
+    METRICS_ENABLED,
+    NASA_API_URL,
+    NASA_FALLBACK_CACHE_SIZE,
+    NASA_FALLBACK_MERGE,
+    NASA_FALLBACK_NEGATIVE_TTL,
+    NASA_FALLBACK_TTL,
+    NASA_FETCH_CONCURRENCY,
+    NASA_RATE_LIMIT,
+    PROFILING_ENABLED,
+    SEARCH_CACHE_MAX_BYTES,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    SEARCH_EXECUTOR,
+    SEARCH_INDEX_FILE,
+    SEARCH_SCORER,
+    SEARCH_WORKERS,
+    SHARED_STATE,
+    SHARED_STATE_POLL,
+    SHARED_STATE_SOCKET,
+    SUGGEST_FROM_CATALOG,
+)
 from ..models.schemas import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    CacheStats,
     DeleteResponse,
+    Facets,
+    FallbackCacheStats,
     HealthResponse,
+    ImageItem,
+    KeywordCount,
     PaginatedHistory,
     PaginatedImages,
     PaginatedSearchResult,
     SearchResult,
+    YearCount,
 )
+from ..services.catalog_cache import CompactCatalog
+from ..services.catalog_store import CatalogSnapshot, CatalogStore
+from ..services.export import EXPORT_FORMATS, arrow_available, arrow_chunks, ndjson_chunks, scored_json
+from ..services.facet_index import FacetCounts, FacetIndex, Filters, facet_index_for, iter_bits, make_filters, popcount
 from ..services.history_service import HistoryService
-from ..services.nasa_service import NASAService
+from ..services.metrics import SEARCH_STAGE_SECONDS, Family, ProfileStore, registry
+from ..services.nasa_service import FallbackCache, NASAService
+from ..services.query_cache import QueryCache
 from ..services.search_service import SearchService
+from ..services.shared_state import HistoryClient, HistoryServer, file_signature
 
 router = APIRouter()
 
 # Service instances (singletons)
-nasa_service = NASAService()
-search_service = SearchService()
-history_service = HistoryService()
+nasa_service = NASAService(
+    base_url=NASA_API_URL,
+    concurrency=NASA_FETCH_CONCURRENCY,
+    rate_limit=NASA_RATE_LIMIT,
+    fallback_cache=FallbackCache(
+        max_entries=NASA_FALLBACK_CACHE_SIZE,
+        ttl=NASA_FALLBACK_TTL,
+        negative_ttl=NASA_FALLBACK_NEGATIVE_TTL
+    )
+)
+search_service = SearchService(
+    executor=SEARCH_EXECUTOR,
+    max_workers=SEARCH_WORKERS,
+    cache=QueryCache(max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES),
+    scorer=SEARCH_SCORER
+)
+# Workers share the loader's history; see SHARED_STATE in config
+if SHARED_STATE == "worker":
+    history_service = HistoryClient(SHARED_STATE_SOCKET)
+else:
+    history_service = HistoryService(
+        history_file=HISTORY_FILE,
+        flush_interval=HISTORY_FLUSH_INTERVAL,
+        max_results=HISTORY_MAX_RESULTS
+    )
+
+# Instrumentation; recording calls are no-ops with metrics disabled
+registry.enabled = METRICS_ENABLED
+profile_store = ProfileStore() if PROFILING_ENABLED else None
+CATALOG_LOAD_PAGES = registry.gauge("catalog_load_pages", "Pages fetched by the running or last full catalog load")
+CATALOG_LOAD_IMAGES = registry.gauge("catalog_load_images", "Images fetched by the running or last full catalog load")
+CATALOG_UPDATE_SECONDS = registry.gauge(
+    "catalog_update_duration_seconds", "Duration of the last completed catalog load or refresh", ("kind",)
+)
+CATALOG_UPDATE_TIMESTAMP = registry.gauge(
+    "catalog_update_timestamp_seconds", "Completion time of the last catalog load or refresh", ("kind",)
+)
 
 # Application state
 _search_initialized = False
+_search_ready: Optional[asyncio.Event] = None
 _background_loading = False
-all_images_cache = []
+# Set while a full load or refresh builds a new catalog from the current one
+_catalog_updating = False
+catalog_store = CatalogStore()
+# Cache and index file signatures a worker last attached to (or tried)
+_shared_seen: Tuple[Optional[Tuple[int, int, int]], ...] = (None, None)
+# History counters as of the last /metrics scrape, which fetches them first
+_history_stats: Dict[str, int] = {"entries": 0, "result_ids": 0, "pending_records": 0, "log_records": 0}
 
 async def ensure_search_initialized():
     """Initialize search with background loading."""
-    global _search_initialized, _background_loading, all_images_cache
+    global _search_initialized, _search_ready, _background_loading
     if not _search_initialized:
         _search_initialized = True
+        _search_ready = asyncio.Event()
         
-        # Start with cached images if available
-        cached = nasa_service._load_from_cache()
-        if cached:
-            all_images_cache = cached
-            search_service.build_index(cached)
-            print(f"Search initialized with {len(cached)} cached images")
+        try:
+            # Workers never fetch or write the catalog; the loader publishes it
+            cached = [] if SHARED_STATE == "worker" else nasa_service._load_from_cache()
+            if SHARED_STATE == "worker":
+                if await _attach_shared_state():
+                    print(f"Attached to shared catalog of {len(catalog_store)} images")
+                else:
+                    print("No shared catalog published yet, waiting for the loader")
+            elif cached:
+                catalog_store.replace(cached)
+                if search_service.load_index(SEARCH_INDEX_FILE, cached, nasa_service.cache_checksum):
+                    print(f"Search initialized with {len(cached)} cached images from prebuilt index")
+                else:
+                    await search_service.build_index_async(cached)
+                    await _save_index(cached)
+                    print(f"Search initialized with {len(cached)} cached images")
+                await _prepare_catalog(cached)
+            else:
+                # No cache - load first page immediately
+                initial_images = await nasa_service.fetch_page(1, 100)
+                if initial_images:
+                    catalog_store.replace(initial_images)
+                    await search_service.build_index_async(initial_images)
+                    await _prepare_catalog(initial_images)
+                    await _publish_checkpoint(initial_images)
+                    print(f"Loaded {len(initial_images)} initial images")
+        finally:
+            _search_ready.set()
+            # Start background loading, or following the loader, even if
+            # the initial load failed so the catalog still gets populated
+            if not _background_loading:
+                _background_loading = True
+                asyncio.create_task(follow_shared_state() if SHARED_STATE == "worker" else keep_catalog_fresh())
+    
+    # Concurrent first requests wait for the initial index instead of
+    # falling through to the NASA API
+    await _search_ready.wait()
+
+async def keep_catalog_fresh():
+    """Background task: (re)load the catalog whenever the cache goes stale."""
+    while True:
+        if not nasa_service.cache_ts:
+            await load_all_images()
+        elif not nasa_service.is_cache_fresh():
+            await refresh_images()
         else:
-            # No cache - load first page immediately
-            initial_images = await nasa_service.fetch_page(1, 100)
-            if initial_images:
-                all_images_cache = initial_images
-                search_service.build_index(initial_images)
-                print(f"Loaded {len(initial_images)} initial images")
+            print(f"Catalog cache is fresh ({int(nasa_service.cache_age())}s old), skipping NASA refresh")
         
-        # Start background loading
-        if not _background_loading:
-            _background_loading = True
-            asyncio.create_task(load_all_images())
+        # Retry a failed load after a minute, otherwise wake up at expiry
+        remaining = nasa_service.cache_duration - nasa_service.cache_age()
+        await asyncio.sleep(max(remaining, 60.0))
+
+
+async def refresh_images():
+    """Patch the catalog and index with images added or changed upstream."""
+    global _catalog_updating
+    _catalog_updating = True
+    started = perf_counter()
+    try:
+        catalog, updated = await nasa_service.refresh_catalog(catalog_store.images, CATALOG_MAX_PAGES)
+        if updated:
+            catalog_store.replace(catalog)
+            await search_service.update_documents_async(updated)
+            await _prepare_catalog(catalog)
+        nasa_service._save_to_cache(catalog)
+        await _save_index(catalog)
+        _record_catalog_update("refresh", started)
+        print(f"Catalog refresh complete: {len(updated)} new or changed images")
+        
+    except Exception as e:
+        print(f"Catalog refresh failed: {e}")
+    finally:
+        _catalog_updating = False
+
 
 async def load_all_images():
     """Load all images in background."""
-    global all_images_cache
+    global _catalog_updating
+    _catalog_updating = True
+    started = perf_counter()
     try:
-        all_images = []
-        for page in range(1, 101):  # Load 10,000 images
-            images = await nasa_service.fetch_page(page, 100)
-            if not images:
-                break
+        all_images = CompactCatalog()
+        indexed = 0
+        async for page, images in nasa_service.iter_pages(1, CATALOG_MAX_PAGES, 100):
             all_images.extend(images)
-            await asyncio.sleep(0.05)
+            CATALOG_LOAD_PAGES.set(page)
+            CATALOG_LOAD_IMAGES.set(len(all_images))
             
-            # Update cache every 10 pages
+            # Update cache every 10 pages; the first swap replaces the startup
+            # index, later ones only index the newly fetched pages
             if page % 10 == 0:
-                all_images_cache = all_images.copy()
-                search_service.build_index(all_images_cache)
+                catalog_store.replace(all_images)
+                await _index_loaded_images(all_images, indexed)
+                await _prepare_catalog(catalog_store.images)
+                await _publish_checkpoint(all_images)
+                indexed = len(all_images)
                 print(f"Background loaded {len(all_images)} images...")
         
+        if not all_images:
+            print("Background loading fetched no images, keeping current catalog")
+            return
+        
         # Final update
-        all_images_cache = all_images
-        search_service.build_index(all_images_cache)
+        catalog_store.replace(all_images)
+        await _index_loaded_images(all_images, indexed)
+        await _prepare_catalog(all_images)
         nasa_service._save_to_cache(all_images)
+        await _save_index(all_images)
+        _record_catalog_update("load", started)
         print(f"Background loading complete: {len(all_images)} images")
         
     except Exception as e:
         print(f"Background loading failed: {e}")
+    finally:
+        _catalog_updating = False
+
+
+async def follow_shared_state():
+    """Worker background task: attach to each catalog the loader publishes.
+    
+    A new cache whose index is not written yet is retried once it is.
+    """
+    while True:
+        await asyncio.sleep(SHARED_STATE_POLL)
+        if _shared_files() != _shared_seen and await _attach_shared_state():
+            print(f"Attached to shared catalog of {len(catalog_store)} images")
+
+
+async def run_loader():
+    """Run the loader of a multi-worker deployment until interrupted.
+    
+    Keeps the catalog cache and index files current for the workers and
+    serves the history log to them.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    server = HistoryServer(history_service, SHARED_STATE_SOCKET)
+    await server.start()
+    print(f"Serving search history on {SHARED_STATE_SOCKET}")
+    try:
+        await ensure_search_initialized()
+        await stop.wait()
+    finally:
+        await server.close()
+        await nasa_service.close()
+        history_service.close()
+
+
+async def merge_fallback_images(images: List[ImageItem]) -> None:
+    """Add NASA fallback hits missing from the catalog to it and the index.
+    
+    Skipped while a load or refresh is building a new catalog, which would
+    drop them again, and in workers, whose catalog is the loader's file.
+    """
+    if not NASA_FALLBACK_MERGE or SHARED_STATE == "worker" or _catalog_updating or not images:
+        return
+    try:
+        added = catalog_store.append(images)
+        if added:
+            snapshot = catalog_store.snapshot()
+            await search_service.add_documents_async(added)
+            await _prepare_appended(snapshot, added)
+            print(f"Merged {len(added)} NASA fallback images into the catalog")
+    except Exception as e:
+        print(f"Merging fallback images failed: {e}")
+
+
+def _record_catalog_update(kind: str, started: float) -> None:
+    CATALOG_UPDATE_SECONDS.set(round(perf_counter() - started, 3), kind=kind)
+    CATALOG_UPDATE_TIMESTAMP.set(int(time.time()), kind=kind)
+
+
+async def _index_loaded_images(all_images: Sequence[ImageItem], indexed: int) -> None:
+    """Index background-loaded images that are not yet in the search index."""
+    if not indexed:
+        await search_service.build_index_async(all_images)
+    else:
+        await search_service.add_documents_async(all_images[indexed:])
+
+
+async def _save_index(catalog: Sequence[ImageItem]) -> None:
+    """Persist the search index next to the catalog cache it was built from."""
+    if nasa_service.cache_checksum:
+        await search_service.save_index_async(SEARCH_INDEX_FILE, catalog, nasa_service.cache_checksum)
+
+
+async def _publish_checkpoint(catalog: Sequence[ImageItem]) -> None:
+    """Let workers see a partially loaded catalog (loader only).
+    
+    Saved without a timestamp, so the full load still runs after a restart.
+    """
+    if SHARED_STATE == "loader":
+        nasa_service._save_to_cache(catalog, ts=0)
+        await _save_index(catalog)
+
+
+async def _attach_shared_state() -> bool:
+    """Adopt the loader's cache and index files if they belong together."""
+    global _shared_seen
+    _shared_seen = _shared_files()
+    cached = nasa_service._load_from_cache(legacy=False)
+    if not cached:
+        return False
+    loop = asyncio.get_running_loop()
+    loaded = await loop.run_in_executor(
+        None, search_service.load_index, SEARCH_INDEX_FILE, cached, nasa_service.cache_checksum
+    )
+    if not loaded:
+        return False
+    catalog_store.replace(cached)
+    await _prepare_catalog(cached)
+    return True
+
+
+def _shared_files() -> Tuple[Optional[Tuple[int, int, int]], Optional[Tuple[int, int, int]]]:
+    return file_signature(nasa_service.cache_file), file_signature(SEARCH_INDEX_FILE)
+
+
+async def _prepare_catalog(catalog: Sequence[ImageItem]) -> None:
+    """Rebuild data derived from a new catalog off the event loop.
+
+    That is the keywords and titles offered by /suggestions and, for the
+    fast response path, the id index and the JSON of every item. Workers
+    serialize items on demand instead, keeping their memory independent of
+    the catalog size.
+    """
+    loop = asyncio.get_running_loop()
+    if FAST_RESPONSES:
+        await loop.run_in_executor(None, catalog_store.snapshot().positions)
+    if SUGGEST_FROM_CATALOG:
+        await loop.run_in_executor(None, history_service.set_vocabulary, catalog)
+    if FAST_RESPONSES and SHARED_STATE != "worker":
+        await loop.run_in_executor(None, catalog_store.snapshot().serialize_all)
+
+
+async def _prepare_appended(snapshot: CatalogSnapshot, images: Sequence[ImageItem]) -> None:
+    """Like ``_prepare_catalog``, for ``images`` appended to make ``snapshot``.
+
+    Only the appended images are counted and serialized.
+    """
+    loop = asyncio.get_running_loop()
+    if SUGGEST_FROM_CATALOG:
+        await loop.run_in_executor(None, history_service.extend_vocabulary, images)
+    if FAST_RESPONSES and SHARED_STATE != "worker":
+        await loop.run_in_executor(None, snapshot.serialize_all, len(snapshot) - len(images))
+
+
+def _json_response(request: Request, body: bytes) -> Response:
+    """Raw JSON response with a strong ETag, or 304 when the client has it."""
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+def _model_response(model: BaseModel) -> Response:
+    """Serialize a response model as FastAPI would, timed as the serialize stage."""
+    started = perf_counter()
+    response = JSONResponse(model.model_dump(mode="json", exclude_none=True))
+    SEARCH_STAGE_SECONDS.since(started, stage="serialize")
+    return response
+
+
+def _export_response(format: str, chunks: Iterator[bytes], total: int) -> StreamingResponse:
+    """Stream export chunks; the synchronous generator runs in the thread pool
+    and is only advanced as fast as the client reads."""
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow export needs pyarrow installed")
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers={"X-Total-Count": str(total)})
+
+
+def _filters(keywords: List[str], date_from: Optional[str], date_to: Optional[str]) -> Filters:
+    try:
+        return make_filters(keywords, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _facets_model(counts: FacetCounts) -> Facets:
+    return Facets(
+        keywords=[KeywordCount(keyword=keyword, count=count) for keyword, count in counts.keywords],
+        years=[YearCount(year=year, count=count) for year, count in counts.years]
+    )
+
+
+def _facets_json(facets: Optional[Facets]) -> bytes:
+    return b',"facets":' + facets.model_dump_json().encode() if facets is not None else b""
+
+
+def _page_prefix(total: int, page: int, page_size: int) -> bytes:
+    return f'{{"total":{total},"page":{page},"page_size":{page_size}'.encode()
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -86,15 +428,28 @@ async def health():
     return HealthResponse(status="ok")
 
 
-@router.get("/sources", response_model=PaginatedImages)
+@router.get("/sources", response_model=PaginatedImages, response_model_exclude_none=True)
 async def get_sources(
+    request: Request,
     page: int = Query(1, ge=1), 
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    keyword: List[str] = Query([], description="Only images with every one of these keywords"),
+    date_from: Optional[str] = Query(None, max_length=32, description="YYYY, YYYY-MM, YYYY-MM-DD or ISO timestamp"),
+    date_to: Optional[str] = Query(None, max_length=32, description="Inclusive, same formats as date_from"),
+    facets: bool = Query(False, description="Include keyword counts and a year histogram"),
+    facet_limit: int = Query(10, ge=1, le=100)
 ):
-    """Get paginated images from background-loaded cache."""
+    """Get paginated images from background-loaded cache, optionally filtered."""
     await ensure_search_initialized()
+    filters = _filters(keyword, date_from, date_to)
     
-    total = len(all_images_cache)
+    catalog = catalog_store.snapshot()
+    index = None
+    if filters.active or facets:
+        # Built on first use per catalog generation, which takes a while for large catalogs
+        index = await asyncio.get_running_loop().run_in_executor(None, facet_index_for, catalog.images)
+    mask = index.allowed(filters) if filters.active else None
+    total = len(catalog) if mask is None else popcount(mask)
     max_page = max(1, (total + page_size - 1) // page_size)
     
     if page > max_page:
@@ -102,40 +457,101 @@ async def get_sources(
     
     start = (page - 1) * page_size
     end = start + page_size
-    items = all_images_cache[start:end]
+    if mask is None:
+        positions = range(start, min(end, total))
+    else:
+        positions = list(islice(iter_bits(mask, len(catalog)), start, end))
+    facet_model = _facets_model(index.facets(mask, facet_limit)) if facets else None
+    
+    if FAST_RESPONSES:
+        items_json = b",".join(catalog.json_at(i) for i in positions)
+        return _json_response(
+            request,
+            _page_prefix(total, page, page_size) + b',"items":[' + items_json + b"]" + _facets_json(facet_model) + b"}"
+        )
+    
+    items = catalog.page(start, end) if mask is None else [catalog.images[i] for i in positions]
     
     return PaginatedImages(
         items=items,
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        facets=facet_model
     )
 
 
-@router.get("/search", response_model=PaginatedSearchResult)
+@router.get("/sources/export")
+async def export_sources(format: str = Query("ndjson", pattern="^(ndjson|arrow)$")):
+    """Stream the whole catalog as NDJSON (one image per line) or an Arrow IPC stream.
+    
+    The catalog generation current at the start is exported; items are
+    serialized chunk by chunk as the client reads them.
+    """
+    await ensure_search_initialized()
+    catalog = catalog_store.snapshot()
+    total = len(catalog)
+    
+    if format == "arrow":
+        images = catalog.images
+        chunks = arrow_chunks((images[i], None) for i in range(total))
+    else:
+        chunks = ndjson_chunks(catalog.iter_json())
+    return _export_response(format, chunks, total)
+
+
+@router.get("/search", response_model=PaginatedSearchResult, response_model_exclude_none=True)
 async def search_images(
+    request: Request,
+    background_tasks: BackgroundTasks,
     q: str = Query(..., min_length=1, max_length=200),
     page: int = Query(1, ge=1), 
-    page_size: int = Query(20, ge=1, le=100)
+    page_size: int = Query(20, ge=1, le=100),
+    keyword: List[str] = Query([], description="Only images with every one of these keywords"),
+    date_from: Optional[str] = Query(None, max_length=32, description="YYYY, YYYY-MM, YYYY-MM-DD or ISO timestamp"),
+    date_to: Optional[str] = Query(None, max_length=32, description="Inclusive, same formats as date_from"),
+    facets: bool = Query(False, description="Include keyword counts and a year histogram over all results"),
+    facet_limit: int = Query(10, ge=1, le=100)
 ):
-    """Search images with confidence scores and NASA API fallback."""
+    """Search images with confidence scores and NASA API fallback.
+    
+    Filters are applied before scoring, so they narrow the work as well as
+    the results; facets count every result, not just the page.
+    """
     await ensure_search_initialized()
+    query = q.strip()
+    filters = _filters(keyword, date_from, date_to)
     
-    # Try BM25 search on cached data first
-    all_results, scores = search_service.search(q.strip())
+    # Try BM25 search on cached data first; only the requested page is ordered
+    ranked = await search_service.rank_async(query, filters)
     
-    # Fallback to NASA API if no results from cache
-    if not all_results:
-        print(f"No BM25 results for '{q}', trying NASA API fallback...")
-        nasa_results = await nasa_service.search_nasa_api(q.strip(), limit=100)
+    if ranked.total:
+        total_results = ranked.total
+        scores = ranked.scores
+        page_hits = ranked.page_hits
+        history_results = ranked.ids
+        facet_counts = lambda: ranked.facets(facet_limit)
+    else:
+        # Fallback to NASA API if no results from cache. Filtered searches
+        # are answered locally: the filters, not the catalog, usually left
+        # nothing, and a narrower query must not cost a remote call
+        nasa_results: List[ImageItem] = []
+        if not filters.active:
+            print(f"No BM25 results for '{q}', trying NASA API fallback...")
+            nasa_results = await nasa_service.search_fallback(query, limit=100)
+            background_tasks.add_task(merge_fallback_images, nasa_results)
+        facet_counts = lambda: FacetIndex(nasa_results).facets(limit=facet_limit)
         
+        # Assign default confidence scores for NASA API results
+        fallback_scores = {img.id: 0.5 for img in nasa_results}  # 50% confidence for fallback
+        scores = lambda: fallback_scores
         if nasa_results:
-            # Assign default confidence scores for NASA API results
-            all_results = nasa_results
-            scores = {img.id: 0.5 for img in nasa_results}  # 50% confidence for fallback
             print(f"NASA API fallback returned {len(nasa_results)} results")
+        
+        total_results = len(nasa_results)
+        page_hits = lambda start, end: [(img, 0.5) for img in nasa_results[start:end]]
+        history_results = lambda: ([img.id for img in nasa_results], fallback_scores)
     
-    total_results = len(all_results)
     max_page = max(1, (total_results + page_size - 1) // page_size)
     
     if page > max_page:
@@ -143,23 +559,227 @@ async def search_images(
     
     # Paginate results
     start = (page - 1) * page_size
-    end = start + page_size
-    paginated_results = all_results[start:end]
+    hits = page_hits(start, start + page_size)
     
-    # Create paginated search result
-    search_result = PaginatedSearchResult(
-        query=q.strip(),
-        items=paginated_results,
-        scores=scores,
+    # Add to history after the response is sent; the full ordering is built there
+    background_tasks.add_task(_record_search, query, history_results)
+    facet_model = None
+    if facets:
+        # Counting builds a bitset over every hit (and the facet index on
+        # first use), so keep it off the event loop
+        facet_model = _facets_model(await asyncio.get_running_loop().run_in_executor(None, facet_counts))
+    
+    if FAST_RESPONSES:
+        # Only the page is serialized, with scores for the returned items
+        started = perf_counter()
+        catalog = catalog_store.snapshot()
+        body = b"".join((
+            _page_prefix(total_results, page, page_size),
+            b',"query":', json.dumps(query, ensure_ascii=False).encode(),
+            b',"items":[', b",".join(catalog.item_json(img) for img, _ in hits),
+            b'],"scores":', json.dumps({img.id: score for img, score in hits}, separators=(",", ":")).encode(),
+            _facets_json(facet_model),
+            b"}"
+        ))
+        SEARCH_STAGE_SECONDS.since(started, stage="serialize")
+        return _json_response(request, body)
+    
+    # Create paginated search result; scoring every hit in rank order sorts
+    # them all, so keep it off the event loop
+    return _model_response(PaginatedSearchResult(
+        query=query,
+        items=[img for img, _ in hits],
+        scores=await asyncio.get_running_loop().run_in_executor(None, scores),
         total=total_results,
         page=page,
-        page_size=page_size
-    )
+        page_size=page_size,
+        facets=facet_model
+    ))
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest, background_tasks: BackgroundTasks):
+    """Search many queries at once; identical queries are ranked once.
+    
+    Each result is the requested page for its query, as /search would
+    return it, except that a page past the end is empty instead of a 404.
+    """
+    await ensure_search_initialized()
+    queries = [q.strip() for q in request.queries]
+    ranked_results = await search_service.rank_many_async(queries)
+    
+    # Queries without local hits fall back to the NASA API, concurrently
+    missing = list(dict.fromkeys(q for q, ranked in zip(queries, ranked_results) if not ranked.total))
+    fallbacks = dict(zip(missing, await asyncio.gather(
+        *(nasa_service.search_fallback(q, limit=100) for q in missing)
+    )))
+    for nasa_results in fallbacks.values():
+        background_tasks.add_task(merge_fallback_images, nasa_results)
+    
+    start = (request.page - 1) * request.page_size
+    end = start + request.page_size
+    loop = asyncio.get_running_loop()
+    results = []
+    recorded = set()
+    for query, ranked in zip(queries, ranked_results):
+        if ranked.total:
+            total = ranked.total
+            hits = ranked.page_hits(start, end)
+            scores = ranked.scores
+            history_results = ranked.ids
+        else:
+            nasa_results = fallbacks[query]
+            fallback_scores = {img.id: 0.5 for img in nasa_results}
+            total = len(nasa_results)
+            hits = [(img, 0.5) for img in nasa_results[start:end]]
+            scores = lambda fallback_scores=fallback_scores: fallback_scores
+            history_results = lambda nasa_results=nasa_results, fallback_scores=fallback_scores: (
+                [img.id for img in nasa_results], fallback_scores
+            )
+        
+        if FAST_RESPONSES:
+            page_scores = {img.id: score for img, score in hits}
+        else:
+            page_scores = await loop.run_in_executor(None, scores)
+        results.append(PaginatedSearchResult(
+            query=query,
+            items=[img for img, _ in hits],
+            scores=page_scores,
+            total=total,
+            page=request.page,
+            page_size=request.page_size
+        ))
+        
+        if request.record_history and query not in recorded:
+            recorded.add(query)
+            background_tasks.add_task(_record_search, query, history_results)
+    
+    return _model_response(BatchSearchResponse(results=results))
+
+
+async def _history(method: str, *args: Any) -> Any:
+    """Call a history method without blocking the event loop.
+    
+    Workers await the owner over its socket; the in-process service runs
+    on the default executor.
+    """
+    if isinstance(history_service, HistoryClient):
+        return await getattr(history_service, method)(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, getattr(history_service, method), *args)
+
+
+async def _record_search(
+    query: str, history_results: Callable[[], Tuple[List[str], Dict[str, float]]]
+) -> None:
+    """Record a search in history with its fully ordered result ids.
+    
+    Ordering every hit is a full sort, so it runs on the default executor.
+    """
+    result_ids, scores = await asyncio.get_running_loop().run_in_executor(None, history_results)
+    await _history("add_search_ids", query, result_ids, scores)
+
+
+@router.get("/search/export")
+async def export_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$")
+):
+    """Stream every local hit for a query in rank order, with normalized scores.
+    
+    Each NDJSON line is an image with a ``score`` field; Arrow streams get
+    a ``score`` column. Unlike /search there is no NASA API fallback and the
+    query is not recorded in the history.
+    """
+    await ensure_search_initialized()
+    ranked = await search_service.rank_async(q.strip())
+    
+    if format == "arrow":
+        chunks = arrow_chunks(ranked.iter_hits(), with_score=True)
+    else:
+        chunks = ndjson_chunks(scored_json(img.model_dump_json().encode(), score) for img, score in ranked.iter_hits())
+    return _export_response(format, chunks, ranked.total)
+
+
+@router.get("/search/cache", response_model=CacheStats)
+async def get_search_cache_stats():
+    """Get search result cache counters."""
+    return CacheStats(**search_service.cache.stats())
+
+
+@router.get("/search/fallback/cache", response_model=FallbackCacheStats)
+async def get_fallback_cache_stats():
+    """Get NASA fallback cache counters."""
+    return FallbackCacheStats(**nasa_service.fallback_cache.stats())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics in the text exposition format."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    global _history_stats
+    _history_stats = await _history("stats")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/profiles", include_in_schema=False)
+async def list_profiles():
+    """Profiles of recent requests sent with an "X-Profile: 1" header."""
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return profile_store.list()
+
+
+@router.get("/debug/profiles/{profile_id}", include_in_schema=False)
+async def get_profile(profile_id: str):
+    """One request profile as collapsed stacks, the input format of flame graph tools."""
+    profile = profile_store.get(profile_id) if profile_store is not None else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(profile[2].collapsed(), media_type="text/plain")
+
+
+def _collect_state() -> Iterator[Family]:
+    """Gauges and counters read from the services at scrape time."""
+    yield "catalog_images", "gauge", "Images in the current catalog", [({}, len(catalog_store))]
+    yield "catalog_updating", "gauge", "1 while a full load or refresh is running", [({}, int(_catalog_updating))]
+    if nasa_service.cache_ts:
+        yield "catalog_cache_age_seconds", "gauge", "Age of the catalog cache file", [({}, int(nasa_service.cache_age()))]
     
-    # Add to history (async/non-blocking)
-    history_service.add_search(q.strip(), all_results, scores)
+    snapshot = search_service.snapshot
+    if snapshot is not None:
+        index = snapshot.index
+        yield "search_index_documents", "gauge", "Live documents in the search index", [
+            ({}, index.doc_count - len(index.deleted))
+        ]
+        yield "search_index_deleted", "gauge", "Tombstoned documents awaiting compaction", [({}, len(index.deleted))]
+        yield "search_index_terms", "gauge", "Distinct terms in the search index", [({}, index.term_count)]
+        yield "search_index_version", "gauge", "Version of the published index snapshot", [({}, index.version)]
     
-    return search_result
+    cache = search_service.cache.stats()
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        yield f"search_cache_{name}_total", "counter", f"Ranked-result cache {name}", [({}, cache[name])]
+    yield "search_cache_entries", "gauge", "Ranked-result cache entries", [({}, cache["entries"])]
+    yield "search_cache_bytes", "gauge", "Estimated ranked-result cache size", [({}, cache["bytes"])]
+    
+    fallback = nasa_service.fallback_cache.stats()
+    for name in ("hits", "misses", "coalesced"):
+        yield f"nasa_fallback_cache_{name}_total", "counter", f"NASA fallback cache {name}", [({}, fallback[name])]
+    yield "nasa_fallback_cache_entries", "gauge", "NASA fallback cache entries", [({}, fallback["entries"])]
+    yield "nasa_rate_limit_per_second", "gauge", "Current NASA API request rate limit", [
+        ({}, nasa_service.rate_limiter.rate)
+    ]
+    
+    history = _history_stats
+    yield "history_entries", "gauge", "Search history entries", [({}, history["entries"])]
+    yield "history_pending_records", "gauge", "History records queued for the next flush", [
+        ({}, history["pending_records"])
+    ]
+    yield "history_log_records", "gauge", "Records in the history log file", [({}, history["log_records"])]
+
+
+if METRICS_ENABLED:
+    registry.add_collector(_collect_state)
 
 
 @router.get("/history", response_model=PaginatedHistory)
@@ -168,27 +788,22 @@ async def get_history(
     page_size: int = Query(10, ge=1, le=100)
 ):
     """Get paginated search history."""
-    return history_service.get_paginated(page, page_size)
+    return await _history("get_paginated", page, page_size)
 
 
 @router.get("/history/{history_id}/results", response_model=SearchResult)
 async def get_history_results(history_id: str):
     """Get exact snapshot of historical search."""
-    history_entry = history_service.get_entry(history_id)
+    history_entry = await _history("get_entry", history_id)
     if not history_entry:
         raise HTTPException(status_code=404, detail="History entry not found")
     
     await ensure_search_initialized()
     
-    # Create lookup dict for O(1) access
-    images_by_id = {img.id: img for img in all_images_cache}
-    
-    # Reconstruct results in exact order
-    results = [
-        images_by_id[img_id] 
-        for img_id in history_entry.result_ids 
-        if img_id in images_by_id
-    ]
+    # Reconstruct results in exact order from the maintained id index
+    results = await asyncio.get_running_loop().run_in_executor(
+        None, catalog_store.snapshot().lookup, history_entry.result_ids
+    )
     
     return SearchResult(
         query=history_entry.query,
@@ -197,10 +812,48 @@ async def get_history_results(history_id: str):
     )
 
 
+@router.get(
+    "/history/{history_id}/results/paginated", response_model=PaginatedSearchResult, response_model_exclude_none=True
+)
+async def get_history_results_page(
+    history_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100)
+):
+    """Get one page of a historical search, with scores for that page only."""
+    history_entry = await _history("get_entry", history_id)
+    if not history_entry:
+        raise HTTPException(status_code=404, detail="History entry not found")
+    
+    await ensure_search_initialized()
+    
+    # Resolving every stored id is linear in the result count
+    catalog = catalog_store.snapshot()
+    positions = await asyncio.get_running_loop().run_in_executor(None, catalog.resolve, history_entry.result_ids)
+    total = len(positions)
+    max_page = max(1, (total + page_size - 1) // page_size)
+    
+    if page > max_page:
+        raise HTTPException(status_code=404, detail=f"Page {page} not found. Max page is {max_page}")
+    
+    start = (page - 1) * page_size
+    items = [catalog.images[position] for position in positions[start:start + page_size]]
+    scores = {img.id: history_entry.result_scores[img.id] for img in items if img.id in history_entry.result_scores}
+    
+    return PaginatedSearchResult(
+        query=history_entry.query,
+        items=items,
+        scores=scores,
+        total=total,
+        page=page,
+        page_size=page_size
+    )
+
+
 @router.delete("/history/{history_id}", response_model=DeleteResponse)
 async def delete_history(history_id: str):
     """Delete history entry."""
-    if not history_service.delete_entry(history_id):
+    if not await _history("delete_entry", history_id):
         raise HTTPException(status_code=404, detail="History entry not found")
     
     return DeleteResponse(deleted=history_id)
@@ -208,5 +861,5 @@ async def delete_history(history_id: str):
 
 @router.get("/suggestions", response_model=List[str])
 async def get_search_suggestions(q: str = ""):
-    """Get search suggestions from history."""
-    return history_service.get_suggestions(q, limit=5)
\ No newline at end of file
+    """Get search suggestions from history, then the catalog vocabulary."""
+    return await _history("get_suggestions", q, 5)
\ No newline at end of file
@@ -0,0 +1,415 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+from ..models.schemas import ImageItem
+
+# Section file layout (little-endian):
+#   header     magic, format version, ts (u64), item count (u32), section count (u32)
+#   directory  per section: name (32 bytes, NUL padded), offset (u64), length (u64)
+#   sections   8-byte aligned blobs addressed by name
+#   checksum   last section: BLAKE2b digest of every byte before it
+#
+# Each string column is stored as "<field>.offsets" (u64, count + 1) plus
+# "<field>.data" (concatenated UTF-8). Keywords are interned: a string table
+# ("keywords.table.offsets" / "keywords.table.data"), a flattened array of
+# keyword ids ("keywords.ids", u32) and per-image ranges into it
+# ("keywords.offsets", u32, count + 1).
+MAGIC = b"CSXC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIQII")
+DIRECTORY_ENTRY = struct.Struct("<32sQQ")
+STRING_FIELDS = ("id", "nasa_id", "title", "description", "date_created", "preview_url")
+DIGEST_SECTION = "checksum"
+DIGEST_SIZE = 32
+
+# Files are created readable by all, as open() would, so worker processes
+# running as another user can map them; the umask is read once, at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o644 & ~_UMASK
+
+
+class CatalogCacheError(Exception):
+    """Raised when a cache file is truncated, of another format or stale."""
+
+
+def write_catalog(path: str, images: Sequence[ImageItem], ts: int) -> str:
+    """Write images to ``path`` atomically, returning the file checksum."""
+    sections: Dict[str, bytes] = {}
+
+    for field in STRING_FIELDS:
+        offsets, data = string_column(getattr(img, field) for img in images)
+        sections[f"{field}.offsets"] = offsets
+        sections[f"{field}.data"] = data
+
+    keyword_ids: Dict[str, int] = {}
+    flat_ids = array('I')
+    ranges = array('I', [0])
+    for img in images:
+        for keyword in img.keywords:
+            flat_ids.append(keyword_ids.setdefault(keyword, len(keyword_ids)))
+        ranges.append(len(flat_ids))
+    table_offsets, table_data = string_column(keyword_ids)
+    sections["keywords.offsets"] = ranges.tobytes()
+    sections["keywords.ids"] = flat_ids.tobytes()
+    sections["keywords.table.offsets"] = table_offsets
+    sections["keywords.table.data"] = table_data
+
+    return write_sections(path, MAGIC, FORMAT_VERSION, ts, len(images), sections)
+
+
+class SectionFile:
+    """Read-only, memory-mapped section file.
+
+    Pages are shared through the OS page cache, so every worker process
+    mapping the same file pays for it once. Replacing the file (by rename)
+    does not disturb existing mappings.
+
+    Any damage to the header or directory raises ``CatalogCacheError``. With
+    ``verify`` the stored digest is checked too, which reads the whole file
+    once (and computes ``checksum`` on the way); files written before the
+    digest section existed are accepted unverified.
+    """
+
+    def __init__(self, path: str, magic: bytes, format_version: int, verify: bool = False):
+        if sys.byteorder != "little":
+            raise CatalogCacheError("Catalog cache files are little-endian only")
+
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise CatalogCacheError(str(e))
+
+        self.path = path
+        self._checksum: Optional[str] = None
+        self._view = memoryview(self._mm)
+        if len(self._mm) < HEADER.size:
+            raise CatalogCacheError(f"{path} is truncated")
+
+        file_magic, version, self.ts, self.count, section_count = HEADER.unpack_from(self._mm, 0)
+        if file_magic != magic or version != format_version:
+            raise CatalogCacheError(f"{path} is not a version {format_version} {magic.decode()} file")
+
+        if HEADER.size + DIRECTORY_ENTRY.size * section_count > len(self._mm):
+            raise CatalogCacheError(f"{path} is truncated")
+
+        self._sections: Dict[str, memoryview] = {}
+        digest_offset = None
+        position = HEADER.size
+        for _ in range(section_count):
+            raw_name, offset, length = DIRECTORY_ENTRY.unpack_from(self._mm, position)
+            if offset + length > len(self._mm):
+                raise CatalogCacheError(f"{path} is truncated")
+            try:
+                name = raw_name.rstrip(b"\0").decode("ascii")
+            except UnicodeDecodeError:
+                raise CatalogCacheError(f"{path} has a damaged directory")
+            if name == DIGEST_SECTION:
+                digest_offset = offset
+            self._sections[name] = self._view[offset:offset + length]
+            position += DIRECTORY_ENTRY.size
+
+        if verify and digest_offset is not None:
+            self._verify(digest_offset)
+
+    @property
+    def checksum(self) -> str:
+        """BLAKE2b digest of the whole file, computed on first use."""
+        if self._checksum is None:
+            self._checksum = hashlib.blake2b(self._mm, digest_size=32).hexdigest()
+        return self._checksum
+
+    @property
+    def verifiable(self) -> bool:
+        """Whether the file carries a digest (files written before it was added do not)."""
+        return DIGEST_SECTION in self._sections
+
+    def _verify(self, digest_offset: int) -> None:
+        digest = hashlib.blake2b(self._view[:digest_offset], digest_size=DIGEST_SIZE)
+        if digest.digest() != self._sections[DIGEST_SECTION]:
+            raise CatalogCacheError(f"{self.path} is damaged (checksum mismatch)")
+        digest.update(self._view[digest_offset:])
+        self._checksum = digest.hexdigest()
+
+    def has_section(self, name: str) -> bool:
+        return name in self._sections
+
+    def section(self, name: str) -> memoryview:
+        """Raw bytes of a named section."""
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise CatalogCacheError(f"{self.path} has no section '{name}'")
+
+    def array(self, name: str, typecode: str) -> memoryview:
+        """A named section viewed as a typed array without copying."""
+        try:
+            return self.section(name).cast(typecode)
+        except TypeError:  # length not a multiple of the item size
+            raise CatalogCacheError(f"{self.path} has a damaged section '{name}'")
+
+    def unpack(self, name: str, layout: struct.Struct) -> Tuple:
+        """A named section holding exactly one ``layout`` record."""
+        section = self.section(name)
+        if len(section) != layout.size:
+            raise CatalogCacheError(f"{self.path} has a damaged section '{name}'")
+        return layout.unpack(section)
+
+
+class CatalogFile(SectionFile):
+    """Memory-mapped catalog cache."""
+
+    def __init__(self, path: str):
+        super().__init__(path, MAGIC, FORMAT_VERSION, verify=True)
+        if not self.verifiable:
+            self._check_strings()
+
+    def _check_strings(self) -> None:
+        """Make sure every string column decodes, so that reading items later cannot fail."""
+        columns = [(f"{field}.offsets", f"{field}.data") for field in STRING_FIELDS]
+        columns.append(("keywords.table.offsets", "keywords.table.data"))
+        for offsets_name, data_name in columns:
+            offsets, data = self.array(offsets_name, 'Q'), self.section(data_name)
+            if not len(offsets) or offsets[-1] != len(data):
+                raise CatalogCacheError(f"{self.path} has a damaged section '{offsets_name}'")
+            try:
+                str(data, "utf-8")
+            except UnicodeDecodeError:
+                raise CatalogCacheError(f"{self.path} has a damaged section '{data_name}'")
+
+    def images(self) -> "CatalogView":
+        return CatalogView(self)
+
+
+class CatalogView(Sequence[ImageItem]):
+    """Lazy sequence of ``ImageItem`` backed by a ``CatalogFile``.
+
+    Items are built on access without re-validation, so opening a cache
+    costs nothing per image until the image is actually used. This is the
+    catalog's storage format; pydantic models only exist for the images a
+    request actually touches.
+    """
+
+    def __init__(self, catalog: CatalogFile):
+        self._catalog = catalog
+        self._columns = {
+            field: (catalog.array(f"{field}.offsets", 'Q'), catalog.section(f"{field}.data"))
+            for field in STRING_FIELDS
+        }
+        self._keyword_ranges = catalog.array("keywords.offsets", 'I')
+        self._keyword_ids = catalog.array("keywords.ids", 'I')
+        self._keyword_offsets = catalog.array("keywords.table.offsets", 'Q')
+        self._keyword_data = catalog.section("keywords.table.data")
+        self._keywords: List[Optional[str]] = [None] * (len(self._keyword_offsets) - 1)
+
+    @property
+    def ts(self) -> int:
+        return self._catalog.ts
+
+    def __len__(self) -> int:
+        return self._catalog.count
+
+    @overload
+    def __getitem__(self, index: int) -> ImageItem: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[ImageItem]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ImageItem, List[ImageItem]]:
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("catalog index out of range")
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[ImageItem]:
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def __reduce__(self):
+        # Memory maps cannot be pickled; ship the materialized items instead
+        return list, (list(self),)
+
+    def ids(self) -> List[str]:
+        """Every image id, without building the items."""
+        return [self.string("id", i) for i in range(len(self))]
+
+    def string(self, field: str, index: int) -> str:
+        """One string field of one image, without building the item."""
+        offsets, data = self._columns[field]
+        return str(data[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def keywords(self, index: int) -> List[str]:
+        """Keywords of one image, without building the item."""
+        start, end = self._keyword_ranges[index], self._keyword_ranges[index + 1]
+        return [self._keyword(k) for k in self._keyword_ids[start:end]]
+
+    def keyword_ids(self, index: int) -> Sequence[int]:
+        """Ids of one image's keywords in the catalog's keyword table, see ``keyword``."""
+        return self._keyword_ids[self._keyword_ranges[index]:self._keyword_ranges[index + 1]]
+
+    def keyword(self, keyword_id: int) -> str:
+        """A keyword by its id in the keyword table."""
+        return self._keyword(keyword_id)
+
+    def _keyword(self, keyword_id: int) -> str:
+        keyword = self._keywords[keyword_id]
+        if keyword is None:
+            start, end = self._keyword_offsets[keyword_id], self._keyword_offsets[keyword_id + 1]
+            keyword = sys.intern(str(self._keyword_data[start:end], "utf-8"))
+            self._keywords[keyword_id] = keyword
+        return keyword
+
+    def _item(self, index: int) -> ImageItem:
+        return ImageItem.model_construct(
+            id=self.string("id", index),
+            nasa_id=self.string("nasa_id", index),
+            title=self.string("title", index),
+            description=self.string("description", index),
+            date_created=self.string("date_created", index),
+            keywords=self.keywords(index),
+            preview_url=self.string("preview_url", index)
+        )
+
+
+class CompactCatalog(CatalogView):
+    """Appendable in-memory catalog in the cache file's columnar layout.
+
+    Each string field is one UTF-8 buffer plus offsets and keywords are
+    interned ids, so an image costs a few hundred bytes instead of a
+    pydantic model with a dozen string objects. Appending never moves
+    existing images, so readers bounded by an earlier length are unaffected.
+    """
+
+    def __init__(self, images: Iterable[ImageItem] = (), ts: int = 0):
+        self._ts = ts
+        self._columns = {field: (array('Q', [0]), bytearray()) for field in STRING_FIELDS}
+        self._keyword_ranges = array('I', [0])
+        self._keyword_ids = array('I')
+        self._keywords: List[str] = []
+        self._keyword_numbers: Dict[str, int] = {}
+        self.extend(images)
+
+    @property
+    def ts(self) -> int:
+        return self._ts
+
+    def __len__(self) -> int:
+        return len(self._keyword_ranges) - 1
+
+    def __reduce__(self):
+        columns = {field: (offsets, bytes(data)) for field, (offsets, data) in self._columns.items()}
+        return _restore_compact_catalog, (self._ts, columns, self._keyword_ranges, self._keyword_ids, self._keywords)
+
+    def extend(self, images: Iterable[ImageItem]) -> None:
+        keyword_ids = self._keyword_ids
+        for img in images:
+            for field, (offsets, data) in self._columns.items():
+                data += getattr(img, field).encode("utf-8")
+                offsets.append(len(data))
+
+            for keyword in img.keywords:
+                number = self._keyword_numbers.get(keyword)
+                if number is None:
+                    number = self._keyword_numbers[keyword] = len(self._keywords)
+                    self._keywords.append(sys.intern(keyword))
+                keyword_ids.append(number)
+            # Published last: the image exists once its keyword range does
+            self._keyword_ranges.append(len(keyword_ids))
+
+    def copy(self) -> "CompactCatalog":
+        return _restore_compact_catalog(*self.__reduce__()[1])
+
+
+def _restore_compact_catalog(ts, columns, keyword_ranges, keyword_ids, keywords) -> CompactCatalog:
+    catalog = CompactCatalog(ts=ts)
+    catalog._columns = {field: (array('Q', offsets), bytearray(data)) for field, (offsets, data) in columns.items()}
+    catalog._keyword_ranges = array('I', keyword_ranges)
+    catalog._keyword_ids = array('I', keyword_ids)
+    catalog._keywords = list(keywords)
+    catalog._keyword_numbers = {keyword: number for number, keyword in enumerate(keywords)}
+    return catalog
+
+
+def compact(images: Sequence[ImageItem]) -> CatalogView:
+    """Read-only columnar form of ``images``; catalog views are shared, not copied."""
+    if isinstance(images, CompactCatalog):
+        return images.copy()
+    if isinstance(images, CatalogView):
+        return images
+    return CompactCatalog(images)
+
+
+def string_column(values) -> Tuple[bytes, bytes]:
+    """Encode strings as (u64 offsets, concatenated UTF-8) bytes."""
+    offsets = array('Q', [0])
+    chunks = []
+    total = 0
+    for value in values:
+        encoded = value.encode("utf-8")
+        chunks.append(encoded)
+        total += len(encoded)
+        offsets.append(total)
+    return offsets.tobytes(), b"".join(chunks)
+
+
+def write_sections(
+    path: str, magic: bytes, format_version: int, ts: int, count: int, sections: Dict[str, bytes]
+) -> str:
+    """Write named sections to ``path`` via temp file, fsync and rename.
+
+    A digest of everything before it is appended as the last section.
+    Returns the BLAKE2b checksum of the written file.
+    """
+    directory_size = HEADER.size + DIRECTORY_ENTRY.size * (len(sections) + 1)
+    position = _align(directory_size)
+    entries = []
+    for name, data in sections.items():
+        entries.append((name, position, len(data)))
+        position = _align(position + len(data))
+    digest_offset = position
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    try:
+        # mkstemp creates the file owner-only
+        os.fchmod(fd, FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            def write(data: bytes) -> None:
+                f.write(data)
+                digest.update(data)
+
+            write(HEADER.pack(magic, format_version, ts, count, len(sections) + 1))
+            for name, offset, length in entries:
+                write(DIRECTORY_ENTRY.pack(name.encode(), offset, length))
+            write(DIRECTORY_ENTRY.pack(DIGEST_SECTION.encode(), digest_offset, DIGEST_SIZE))
+            position = directory_size
+            for (_, offset, length), data in zip(entries, sections.values()):
+                write(b"\0" * (offset - position))
+                write(data)
+                position = offset + length
+            write(b"\0" * (digest_offset - position))
+            write(digest.copy().digest())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+def _align(position: int, alignment: int = 8) -> int:
+    return (position + alignment - 1) // alignment * alignment
@@ -0,0 +1,166 @@
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from ..models.schemas import ImageItem
+from .catalog_cache import CatalogView, CompactCatalog, compact
+
+
+class CatalogSnapshot:
+    """One immutable generation of the catalog with id and nasa_id indexes.
+
+    The indexes are built on first lookup; a ``CatalogView`` is indexed from
+    its string columns without materializing the items. Items can also be
+    serialized to JSON once per generation for responses assembled from
+    bytes. A generation covers the images present when it was made; later
+    generations may append to the same ``CompactCatalog``.
+    """
+
+    def __init__(self, images: Sequence[ImageItem]):
+        self.images = images
+        self._length = len(images)
+        self._positions: Optional[Dict[str, int]] = None
+        self._nasa_positions: Optional[Dict[str, int]] = None
+        self._json: List[Optional[bytes]] = [None] * len(images)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def page(self, start: int, end: int) -> List[ImageItem]:
+        return list(self.images[start:min(end, self._length)])
+
+    def get(self, image_id: str) -> Optional[ImageItem]:
+        position = self.positions().get(image_id)
+        return self.images[position] if position is not None else None
+
+    def get_by_nasa_id(self, nasa_id: str) -> Optional[ImageItem]:
+        if self._nasa_positions is None:
+            self._nasa_positions = _index_field(self.images, "nasa_id", self._length)
+        position = self._nasa_positions.get(nasa_id)
+        return self.images[position] if position is not None else None
+
+    def lookup(self, image_ids: Sequence[str]) -> List[ImageItem]:
+        """Images for ``image_ids`` in the given order, skipping unknown ids."""
+        return [self.images[position] for position in self.resolve(image_ids)]
+
+    def resolve(self, image_ids: Sequence[str]) -> List[int]:
+        """Catalog positions of ``image_ids`` in the given order, skipping unknown ids."""
+        positions = self.positions()
+        return [positions[image_id] for image_id in image_ids if image_id in positions]
+
+    def item_json(self, image: ImageItem) -> bytes:
+        """JSON for ``image``, cached when it is part of this catalog.
+
+        Requests must not wait for the id index to be built, so until it
+        exists the image is serialized without the cache.
+        """
+        positions = self._positions
+        position = positions.get(image.id) if positions is not None else None
+        if position is None:
+            return image.model_dump_json().encode()
+        return self.json_at(position)
+
+    def json_at(self, position: int) -> bytes:
+        data = self._json[position]
+        if data is None:
+            data = self._json[position] = self.images[position].model_dump_json().encode()
+        return data
+
+    def iter_json(self) -> Iterator[bytes]:
+        """JSON of every image in catalog order.
+
+        Cached JSON is reused but not filled in, so a full export does not
+        keep the serialized catalog in memory.
+        """
+        images = self.images
+        for position, data in enumerate(self._json):
+            yield data if data is not None else images[position].model_dump_json().encode()
+
+    def serialize_all(self, start: int = 0) -> None:
+        """Fill the JSON cache for every image from ``start`` on ahead of requests."""
+        for position in range(start, self._length):
+            self.json_at(position)
+
+    def positions(self) -> Dict[str, int]:
+        if self._positions is None:
+            self._positions = _index_field(self.images, "id", self._length)
+        return self._positions
+
+    def extended(self, images: Sequence[ImageItem]) -> "CatalogSnapshot":
+        """A new generation with ``images`` appended.
+
+        Indexes and serialized JSON built so far are carried over, so only
+        the appended images cost anything. An in-memory catalog is extended
+        in place: appending never moves existing images and this generation
+        stays bounded by its length.
+        """
+        if isinstance(self.images, CompactCatalog) and len(self.images) == self._length:
+            catalog = self.images
+        elif isinstance(self.images, CompactCatalog):
+            # A later generation already appended to it; branch off a copy
+            catalog = CompactCatalog(islice(self.images, self._length), ts=self.images.ts)
+        else:
+            # A memory-mapped cache is read-only; move it into memory once
+            catalog = CompactCatalog(self.images, ts=self.images.ts)
+        catalog.extend(images)
+        snapshot = CatalogSnapshot(catalog)
+        snapshot._json[:len(self._json)] = self._json
+        start = self._length
+        if self._positions is not None:
+            snapshot._positions = dict(self._positions)
+            snapshot._positions.update((img.id, start + i) for i, img in enumerate(images))
+        if self._nasa_positions is not None:
+            snapshot._nasa_positions = dict(self._nasa_positions)
+            snapshot._nasa_positions.update((img.nasa_id, start + i) for i, img in enumerate(images))
+        return snapshot
+
+
+class CatalogStore:
+    """Owner of the current catalog, shared by the API routes.
+
+    The background loader publishes new data with ``replace``, which swaps
+    in a whole new ``CatalogSnapshot``; requests that took a snapshot keep
+    a consistent view of images and indexes until they finish.
+    """
+
+    def __init__(self, images: Sequence[ImageItem] = ()):
+        self._snapshot = CatalogSnapshot(compact(images))
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    @property
+    def images(self) -> Sequence[ImageItem]:
+        return self._snapshot.images
+
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def replace(self, images: Sequence[ImageItem]) -> None:
+        """Publish a new catalog generation, stored in columnar form."""
+        self._snapshot = CatalogSnapshot(compact(images))
+
+    def append(self, images: Sequence[ImageItem]) -> List[ImageItem]:
+        """Publish a generation with the images not yet in the catalog appended.
+
+        Images are matched on ``nasa_id``; returns the ones that were added.
+        """
+        snapshot = self._snapshot
+        added: List[ImageItem] = []
+        seen = set()
+        for img in images:
+            if img.nasa_id not in seen and snapshot.get_by_nasa_id(img.nasa_id) is None:
+                seen.add(img.nasa_id)
+                added.append(img)
+        if added:
+            self._snapshot = snapshot.extended(added)
+        return added
+
+
+def _index_field(images: Sequence[ImageItem], field: str, length: int) -> Dict[str, int]:
+    if isinstance(images, CatalogView):
+        values = (images.string(field, i) for i in range(length))
+    else:
+        values = (getattr(img, field) for img in islice(images, length))
+
+    # For duplicate ids the last image wins
+    return {value: position for position, value in enumerate(values)}
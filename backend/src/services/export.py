@@ -0,0 +1,83 @@
+import io
+import json
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency, only needed for Arrow exports
+    pa = None
+
+from ..models.schemas import ImageItem
+
+# Export formats and their media types
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Rows per chunk handed to the server; each chunk is one write to the client
+NDJSON_CHUNK_ROWS = 1000
+ARROW_BATCH_ROWS = 10000
+
+FIELDS = ("id", "nasa_id", "title", "description", "date_created", "keywords", "preview_url")
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def ndjson_chunks(lines: Iterable[bytes], chunk_rows: int = NDJSON_CHUNK_ROWS) -> Iterator[bytes]:
+    """Join JSON documents into newline-delimited chunks of ``chunk_rows``."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_rows:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def scored_json(item_json: bytes, score: float) -> bytes:
+    """Item JSON with a trailing ``score`` field."""
+    return item_json[:-1] + b',"score":' + json.dumps(score).encode() + b"}"
+
+
+def arrow_chunks(
+    rows: Iterable[Tuple[ImageItem, Optional[float]]],
+    with_score: bool = False,
+    batch_rows: int = ARROW_BATCH_ROWS
+) -> Iterator[bytes]:
+    """Encode (image, score) rows as an Arrow IPC stream, one record batch per chunk."""
+    fields = [(name, pa.list_(pa.string()) if name == "keywords" else pa.string()) for name in FIELDS]
+    if with_score:
+        fields.append(("score", pa.float64()))
+    schema = pa.schema(fields)
+
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield _drain(sink)  # the schema message
+
+    columns = {name: [] for name in schema.names}
+    count = 0
+    for image, score in rows:
+        for name in FIELDS:
+            columns[name].append(getattr(image, name))
+        if with_score:
+            columns["score"].append(score)
+        count += 1
+        if count == batch_rows:
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            yield _drain(sink)
+            columns = {name: [] for name in schema.names}
+            count = 0
+    if count:
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+    writer.close()
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
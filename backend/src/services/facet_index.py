@@ -0,0 +1,356 @@
+import heapq
+import re
+import threading
+import weakref
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..models.schemas import ImageItem
+from .catalog_cache import CatalogView
+
+# Keywords on at least 1/DENSE_KEYWORD_DIVISOR of the documents keep a
+# precomputed bitset; below that a doc-id array is smaller, and it is
+# turned into a bitset when a filter uses it
+DENSE_KEYWORD_DIVISOR = 32
+# Up to this many documents, facets are counted per document rather than per keyword
+DIRECT_COUNT_DOCS = 4096
+
+# Bit positions set in each byte value, for enumerating bitsets
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+_NONZERO_BYTE = re.compile(b"[^\x00]")
+
+
+class Filters(NamedTuple):
+    """Keywords an image must all have and a [date_from, date_to) range in epoch seconds."""
+    keywords: Tuple[str, ...] = ()
+    date_from: Optional[int] = None
+    date_to: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.keywords) or self.date_from is not None or self.date_to is not None
+
+    def matches(self, image: ImageItem) -> bool:
+        """Whether one image passes, for images outside any ``FacetIndex``."""
+        if self.keywords:
+            own = {_keyword_key(keyword) for keyword in image.keywords}
+            if not all(keyword in own for keyword in self.keywords):
+                return False
+        if self.date_from is not None or self.date_to is not None:
+            created = parse_datetime(image.date_created)
+            if created is None:
+                return False
+            ts = int(created.timestamp())
+            if self.date_from is not None and ts < self.date_from:
+                return False
+            if self.date_to is not None and ts >= self.date_to:
+                return False
+        return True
+
+
+NO_FILTERS = Filters()
+
+
+class FacetCounts(NamedTuple):
+    """Top keywords as (keyword, count), most common first, and (year, count) by year."""
+    keywords: List[Tuple[str, int]]
+    years: List[Tuple[int, int]]
+
+
+def make_filters(keywords: Iterable[str] = (), date_from: Optional[str] = None, date_to: Optional[str] = None) -> Filters:
+    """Filters from request parameters; raises ``ValueError`` for malformed dates.
+
+    Dates are ``YYYY``, ``YYYY-MM``, ``YYYY-MM-DD`` or ISO 8601 timestamps;
+    ``date_to`` includes the whole year, month or day it names.
+    """
+    return Filters(
+        tuple(sorted({_keyword_key(keyword) for keyword in keywords} - {""})),
+        parse_date_bound(date_from) if date_from else None,
+        parse_date_bound(date_to, upper=True) if date_to else None
+    )
+
+
+def parse_datetime(value: str) -> Optional[datetime]:
+    """``date_created`` as an aware datetime (UTC if unspecified), or None."""
+    if not value:
+        return None
+    try:
+        created = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return created if created.tzinfo else created.replace(tzinfo=timezone.utc)
+
+
+def parse_date_bound(value: str, upper: bool = False) -> int:
+    """Start of the period ``value`` names in epoch seconds, or with ``upper`` the end (exclusive)."""
+    value = value.strip()
+    parts = value.split("-")
+    if len(value) in (4, 7, 10) and all(part.isdigit() for part in parts):
+        year = int(parts[0])
+        month = int(parts[1]) if len(parts) > 1 else 1
+        day = int(parts[2]) if len(parts) > 2 else 1
+        start = datetime(year, month, day, tzinfo=timezone.utc)
+        if not upper:
+            return int(start.timestamp())
+        if len(parts) == 1:
+            end = start.replace(year=year + 1)
+        elif len(parts) == 2:
+            end = start.replace(year=year + month // 12, month=month % 12 + 1)
+        else:
+            end = start + timedelta(days=1)
+        return int(end.timestamp())
+
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"Invalid date '{value}'")
+    return int(moment.timestamp()) + (1 if upper else 0)
+
+
+def bitset(doc_ids: Iterable[int], size: int) -> int:
+    """Bitset (as an int) with the bits of ``doc_ids`` set."""
+    data = bytearray((size + 7) // 8)
+    for doc_id in doc_ids:
+        data[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(data, "little")
+
+
+def bitmap(mask: int, size: int) -> bytes:
+    """Bitset as bytes, for constant time membership tests: ``data[d >> 3] >> (d & 7) & 1``."""
+    return mask.to_bytes((size + 7) // 8, "little")
+
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(mask: int) -> int:
+        """Number of set bits in a bitset."""
+        return bin(mask).count("1")
+
+
+def iter_bits(mask: int, size: int) -> Iterator[int]:
+    """Doc ids in a bitset, ascending."""
+    data = bitmap(mask, size)
+    byte_bits = _BYTE_BITS
+    for match in _NONZERO_BYTE.finditer(data):
+        index = match.start()
+        for bit in byte_bits[data[index]]:
+            yield (index << 3) + bit
+
+
+class FacetIndex:
+    """Keyword and date indexes over one image sequence, doc ids being positions.
+
+    Keyword filters intersect per-keyword bitsets (Python ints, so ``&`` and
+    ``popcount`` run in C). Date ranges come from the timestamps of dated
+    images sorted ascending: whole years in the range use precomputed year
+    bitsets and only the partial years at either end are built from the
+    sorted doc ids. Keywords are matched case-insensitively.
+    """
+
+    def __init__(self, images: Sequence[ImageItem]):
+        self.size = size = len(images)
+        columns = isinstance(images, CatalogView)
+        # Keywords get provisional ids in order of appearance; with a
+        # CatalogView each distinct keyword is decoded and normalized once
+        provisional: Dict[str, int] = {}
+        catalog_keywords: Dict[int, int] = {}
+        labels: List[str] = []
+        postings: List[List[int]] = []
+        doc_keywords = array('I')
+        self._doc_offsets = doc_offsets = array('I', [0])
+        self._doc_years = array('H', bytes(2 * size))  # 0 for undated images
+        dates: Dict[str, Optional[Tuple[int, int]]] = {}
+        dated: List[Tuple[int, int]] = []
+
+        def keyword_id(keyword: str) -> int:
+            key = _keyword_key(keyword)
+            if not key:
+                return -1
+            found = provisional.get(key)
+            if found is None:
+                found = provisional[key] = len(labels)
+                labels.append(keyword.strip())
+                postings.append([])
+            return found
+
+        for doc_id in range(size):
+            if columns:
+                ids = []
+                for catalog_id in images.keyword_ids(doc_id):
+                    found = catalog_keywords.get(catalog_id)
+                    if found is None:
+                        found = catalog_keywords[catalog_id] = keyword_id(images.keyword(catalog_id))
+                    ids.append(found)
+                created = images.string("date_created", doc_id)
+            else:
+                image = images[doc_id]
+                ids = [keyword_id(keyword) for keyword in image.keywords]
+                created = image.date_created
+            for found in ids:
+                if found >= 0:
+                    docs = postings[found]
+                    if not docs or docs[-1] != doc_id:
+                        docs.append(doc_id)
+                        doc_keywords.append(found)
+            doc_offsets.append(len(doc_keywords))
+
+            date = dates.get(created, False)
+            if date is False:
+                moment = parse_datetime(created)
+                date = dates[created] = (
+                    (int(moment.timestamp()), moment.astimezone(timezone.utc).year) if moment else None
+                )
+            if date is not None:
+                dated.append((date[0], doc_id))
+                self._doc_years[doc_id] = date[1]
+
+        # Final keyword ids run from the most to the least common keyword
+        keys = list(provisional)
+        order = sorted(range(len(keys)), key=lambda i: (-len(postings[i]), keys[i]))
+        final = array('I', bytes(4 * len(order)))
+        for rank, provisional_id in enumerate(order):
+            final[provisional_id] = rank
+        self._keyword_ids = {keys[i]: final[i] for i in range(len(keys))}
+        self._doc_keywords = array('I', [final[i] for i in doc_keywords])
+        self.labels = [labels[i] for i in order]
+        self.counts = array('I', (len(postings[i]) for i in order))
+        dense_min = max(1, size // DENSE_KEYWORD_DIVISOR)
+        self._dense: List[Optional[int]] = []
+        self._sparse: List[Optional[array]] = []
+        for i in order:
+            docs = postings[i]
+            dense = len(docs) >= dense_min
+            self._dense.append(bitset(docs, size) if dense else None)
+            self._sparse.append(None if dense else array('I', docs))
+
+        dated.sort()
+        self._timestamps = array('q', (ts for ts, _ in dated))
+        self._dated_docs = array('I', (doc_id for _, doc_id in dated))
+        self._years: Dict[int, Tuple[int, int, int]] = {}  # year: (start, end, bitset)
+        start = 0
+        for end in range(1, len(dated) + 1):
+            year = self._doc_years[self._dated_docs[start]]
+            if end == len(dated) or self._doc_years[self._dated_docs[end]] != year:
+                self._years[year] = (start, end, bitset(self._dated_docs[start:end], size))
+                start = end
+
+    def allowed(self, filters: Filters) -> Optional[int]:
+        """Bitset of the documents passing ``filters``, or None when nothing is filtered."""
+        mask = None
+        for keyword in filters.keywords:
+            bits = self.keyword_bits(keyword)
+            mask = bits if mask is None else mask & bits
+            if not mask:
+                return 0
+        if filters.date_from is not None or filters.date_to is not None:
+            bits = self.date_bits(filters.date_from, filters.date_to)
+            mask = bits if mask is None else mask & bits
+        return mask
+
+    def keyword_bits(self, keyword: str) -> int:
+        keyword_id = self._keyword_ids.get(_keyword_key(keyword))
+        if keyword_id is None:
+            return 0
+        dense = self._dense[keyword_id]
+        return dense if dense is not None else bitset(self._sparse[keyword_id], self.size)
+
+    def date_bits(self, date_from: Optional[int], date_to: Optional[int]) -> int:
+        """Bitset of the documents dated in [date_from, date_to)."""
+        timestamps = self._timestamps
+        start = bisect_left(timestamps, date_from) if date_from is not None else 0
+        end = bisect_left(timestamps, date_to) if date_to is not None else len(timestamps)
+        mask = 0
+        for year_start, year_end, bits in self._years.values():
+            lo, hi = max(start, year_start), min(end, year_end)
+            if lo >= hi:
+                continue
+            if lo == year_start and hi == year_end:
+                mask |= bits
+            else:
+                mask |= bitset(self._dated_docs[lo:hi], self.size)
+        return mask
+
+    def facets(self, mask: Optional[int] = None, limit: int = 10) -> FacetCounts:
+        """Top ``limit`` keywords and the per-year histogram of the documents in ``mask`` (all without one)."""
+        if mask is None:
+            keywords = [(self.labels[i], self.counts[i]) for i in range(min(limit, len(self.labels)))]
+            years = [(year, end - start) for year, (start, end, _) in sorted(self._years.items())]
+            return FacetCounts(keywords, years)
+
+        if popcount(mask) <= DIRECT_COUNT_DOCS:
+            return self._count_documents(iter_bits(mask, self.size), limit)
+
+        # Exact top-k over keywords by falling global frequency: a keyword
+        # cannot count more than its frequency, so the scan stops once that
+        # drops to the k-th best count (ties go to the more common keyword)
+        membership = bitmap(mask, self.size)
+        top: List[Tuple[int, int]] = []  # min-heap of (count, -keyword id)
+        for keyword_id, total in enumerate(self.counts):
+            if len(top) == limit and total <= top[0][0]:
+                break
+            dense = self._dense[keyword_id]
+            if dense is not None:
+                count = popcount(mask & dense)
+            else:
+                count = sum(membership[d >> 3] >> (d & 7) & 1 for d in self._sparse[keyword_id])
+            if not count:
+                continue
+            if len(top) < limit:
+                heapq.heappush(top, (count, -keyword_id))
+            elif count > top[0][0]:
+                heapq.heapreplace(top, (count, -keyword_id))
+
+        keywords = [(self.labels[-neg_id], count) for count, neg_id in sorted(top, key=lambda c: (-c[0], -c[1]))]
+        years = [(year, popcount(mask & bits)) for year, (_, _, bits) in sorted(self._years.items())]
+        return FacetCounts(keywords, [(year, count) for year, count in years if count])
+
+    def _count_documents(self, doc_ids: Iterable[int], limit: int) -> FacetCounts:
+        keyword_counts: Dict[int, int] = {}
+        year_counts: Dict[int, int] = {}
+        offsets, doc_keywords, doc_years = self._doc_offsets, self._doc_keywords, self._doc_years
+        for doc_id in doc_ids:
+            for keyword_id in doc_keywords[offsets[doc_id]:offsets[doc_id + 1]]:
+                keyword_counts[keyword_id] = keyword_counts.get(keyword_id, 0) + 1
+            year = doc_years[doc_id]
+            if year:
+                year_counts[year] = year_counts.get(year, 0) + 1
+        top = heapq.nsmallest(limit, keyword_counts.items(), key=lambda item: (-item[1], item[0]))
+        return FacetCounts([(self.labels[i], count) for i, count in top], sorted(year_counts.items()))
+
+
+_indexes: "weakref.WeakKeyDictionary[Sequence[ImageItem], FacetIndex]" = weakref.WeakKeyDictionary()
+# Guards the two dictionaries; each catalog's build lock serializes its builds
+_indexes_lock = threading.Lock()
+_build_locks: "weakref.WeakKeyDictionary[Sequence[ImageItem], threading.Lock]" = weakref.WeakKeyDictionary()
+
+
+def facet_index_for(images: Sequence[ImageItem]) -> FacetIndex:
+    """The ``FacetIndex`` of an image sequence, built on first use.
+
+    Indexes are kept as long as the sequence they cover; a sequence that
+    grew since (a catalog still loading) gets a new one. Concurrent callers
+    for one catalog share a single build; other catalogs are not held up.
+    """
+    try:
+        with _indexes_lock:
+            index = _indexes.get(images)
+            if index is not None and index.size == len(images):
+                return index
+            build_lock = _build_locks.setdefault(images, threading.Lock())
+    except TypeError:  # plain lists cannot be weakly referenced
+        return FacetIndex(images)
+
+    with build_lock:
+        with _indexes_lock:
+            index = _indexes.get(images)
+        if index is None or index.size != len(images):
+            index = FacetIndex(images)
+            with _indexes_lock:
+                _indexes[images] = index
+        return index
+
+
+def _keyword_key(keyword: str) -> str:
+    return keyword.strip().lower()
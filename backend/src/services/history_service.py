@@ -1,121 +1,439 @@
+import base64
 import json
 import os
+import tempfile
+import threading
 import time
 import uuid
-from typing import Dict, List, Optional
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from ..models.schemas import HistoryEntry, ImageItem, PaginatedHistory
+from .metrics import HISTORY_FLUSH_SECONDS, SEARCH_STAGE_SECONDS
+from .suggestion_index import PrefixIndex, catalog_vocabulary, extended_vocabulary, frecency
+
+# Result scores are stored in thousandths, exact for the three-decimal
+# normalized scores searches produce
+SCORE_SCALE = 1000
+
+
+class CompactEntry:
+    """In-memory form of a ``HistoryEntry``.
+
+    Result ids are indices into the service's id table and scores are a
+    parallel array of thousandths. Score maps that do not fit that shape
+    (legacy entries, duplicate ids) are kept as given in ``raw_scores``.
+    """
+
+    __slots__ = ("id", "timestamp", "query", "total", "docs", "scores", "raw_scores")
+
+    def __init__(
+        self, id: str, timestamp: int, query: str, total: int, docs: array,
+        scores: Optional[array], raw_scores: Optional[Dict[str, float]] = None
+    ):
+        self.id = id
+        self.timestamp = timestamp
+        self.query = query
+        self.total = total
+        self.docs = docs
+        self.scores = scores
+        self.raw_scores = raw_scores
 
 
 class HistoryService:
-    def __init__(self, history_file: str = "data/history.json"):
+    """Search history persisted as an append-only JSON lines log.
+
+    Each change appends one record: ``{"op": "add", "entry": ...}`` or a
+    ``{"op": "del", "id": ...}`` tombstone, preceded by an
+    ``{"op": "ids", "ids": [...]}`` record when a search returns image ids
+    not seen before. Add records reference results by their position in
+    that id table and carry scores as base64 arrays. Records are queued in memory
+    and written, fsynced, by a background flusher every
+    ``flush_interval`` seconds, so requests never wait on disk. Startup
+    replays the log; once it holds far more records than live entries it
+    is rewritten with just the live ones.
+
+    Suggestions come from a prefix index over distinct queries ranked by
+    frecency, optionally topped up from the catalog vocabulary.
+    """
+
+    def __init__(
+        self,
+        history_file: str = "data/history.log",
+        legacy_history_file: str = "data/history.json",
+        flush_interval: float = 1.0,
+        compact_min_records: int = 1000,
+        max_results: int = 0
+    ):
         self.history_file = history_file
-        self.history: List[HistoryEntry] = []
-        self._id_index: Dict[str, HistoryEntry] = {}
-        self._query_index: Dict[str, HistoryEntry] = {}
-        self._reversed_cache: List[HistoryEntry] = []
+        self.legacy_history_file = legacy_history_file
+        self.flush_interval = flush_interval
+        self.compact_min_records = compact_min_records
+        # Results kept per entry; 0 keeps them all
+        self.max_results = max_results
+        # Entries keyed by id, oldest first; a repeated query moves to the end
+        self.history: "OrderedDict[str, CompactEntry]" = OrderedDict()
+        self._id_table: List[str] = []
+        self._id_numbers: Dict[str, int] = {}
+        self._query_index: Dict[str, str] = {}
+        self._suggestions = PrefixIndex()
+        self._vocabulary: Optional[PrefixIndex] = None
+        self._sequence = 0
+        self._pending: List[Tuple[str, object]] = []
+        self._log_records = 0
+        # Set when a write failed part way, leaving the log's tail unknown
+        self._rewrite_due = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
         self._load_history()
+
+        self._flusher: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="history-flusher", daemon=True)
+            self._flusher.start()
     
     def add_search(self, query: str, results: List[ImageItem], scores: Dict[str, float]) -> str:
         """Add search to history."""
-        # Remove existing entry with same query to prevent duplicates
-        if query in self._query_index:
-            old_entry = self._query_index[query]
-            self.history.remove(old_entry)
-            del self._id_index[old_entry.id]
-            del self._query_index[query]
+        return self.add_search_ids(query, [img.id for img in results], scores)
         
-        entry = HistoryEntry(
-            id=str(uuid.uuid4()),
-            timestamp=int(time.time()),
-            query=query,
-            total=len(results),
-            result_ids=[img.id for img in results],
-            result_scores=scores
-        )
+    def add_search_ids(self, query: str, result_ids: List[str], scores: Dict[str, float]) -> str:
+        """Add search to history from the ordered result ids."""
+        started = perf_counter()
+        total = len(result_ids)
+        if self.max_results and len(result_ids) > self.max_results:
+            result_ids = result_ids[:self.max_results]
+            scores = {i: scores[i] for i in result_ids if i in scores}
         
-        self.history.append(entry)
-        self._id_index[entry.id] = entry
-        self._query_index[entry.query] = entry
-        self._reversed_cache = list(reversed(self.history))
-        self._save_history()
+        with self._lock:
+            known = len(self._id_table)
+            entry = self._compact(str(uuid.uuid4()), int(time.time()), query, total, result_ids, scores)
+            if len(self._id_table) > known:
+                self._pending.append(("ids", self._id_table[known:]))
+            self._apply_add(entry)
+            self._pending.append(("add", entry))
+        SEARCH_STAGE_SECONDS.since(started, stage="history_write")
+
+        if not self.flush_interval:
+            self.flush()
         return entry.id
     
     def get_paginated(self, page: int = 1, page_size: int = 10) -> PaginatedHistory:
         """Get paginated history, most recent first."""
         start = (page - 1) * page_size
-        items = self._reversed_cache[start:start + page_size]
+        with self._lock:
+            entries = list(islice(reversed(self.history.values()), start, start + page_size))
+            total = len(self.history)
+        # Entries are never changed once added and the id table only grows,
+        # so they are expanded outside the lock
+        items = [self._expand(e) for e in entries]
         
         return PaginatedHistory(
             items=items,
-            total=len(self.history),
+            total=total,
             page=page,
             page_size=page_size
         )
     
     def get_entry(self, history_id: str) -> Optional[HistoryEntry]:
         """Get history entry by ID."""
-        return self._id_index.get(history_id)
+        with self._lock:
+            entry = self.history.get(history_id)
+        return self._expand(entry) if entry is not None else None
     
     def get_suggestions(self, query: str, limit: int = 5) -> List[str]:
         """Get search suggestions."""
-        if not query.strip():
-            seen = set()
-            suggestions = []
-            for entry in self._reversed_cache:
-                if entry.query not in seen and len(suggestions) < limit:
-                    suggestions.append(entry.query)
-                    seen.add(entry.query)
-            return suggestions
-        
-        query_lower = query.lower()
-        suggestions = []
-        seen = set()
-        
-        for entry in self._reversed_cache:
-            if (entry.query.lower().startswith(query_lower) and 
-                entry.query not in seen and len(suggestions) < limit):
-                suggestions.append(entry.query)
-                seen.add(entry.query)
+        with self._lock:
+            if not query.strip():
+                # Most recent searches; each query has one entry
+                return [entry.query for entry in islice(reversed(self.history.values()), limit)]
+            
+            suggestions = self._suggestions.top(query, limit)
+        # The vocabulary is replaced, never changed, so it needs no lock
+        vocabulary = self._vocabulary
+        if len(suggestions) < limit and vocabulary is not None:
+            suggestions += vocabulary.top(query, limit - len(suggestions), exclude=suggestions)
         
         return suggestions
     
+    def stats(self) -> Dict[str, int]:
+        """Entry, interned id and log record counts."""
+        with self._lock:
+            return {
+                "entries": len(self.history),
+                "result_ids": len(self._id_table),
+                "pending_records": len(self._pending),
+                "log_records": self._log_records,
+            }
+
+    def set_vocabulary(self, images: Iterable[ImageItem]) -> None:
+        """Suggest catalog keywords and titles when history runs short."""
+        self._vocabulary = catalog_vocabulary(images)
+
+    def extend_vocabulary(self, images: Iterable[ImageItem]) -> None:
+        """Count images appended to the catalog into the vocabulary."""
+        if self._vocabulary is not None:
+            self._vocabulary = extended_vocabulary(self._vocabulary, images)
+
     def delete_entry(self, history_id: str) -> bool:
         """Delete history entry."""
-        if history_id in self._id_index:
-            entry = self._id_index[history_id]
-            self.history.remove(entry)
-            del self._id_index[history_id]
-            del self._query_index[entry.query]
-            self._reversed_cache = list(reversed(self.history))
-            self._save_history()
-            return True
-        return False
+        with self._lock:
+            if not self._apply_delete(history_id):
+                return False
+            self._pending.append(("del", history_id))
+
+        if not self.flush_interval:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Write queued records to the log and fsync it, compacting when due."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                compact = self._rewrite_due or (
+                    self._log_records + len(pending) > max(self.compact_min_records, 2 * len(self.history))
+                )
+                live = self._live_records() if compact else None
+                id_table = list(self._id_table) if compact else None
+
+            started = perf_counter()
+            try:
+                if compact:
+                    self._rewrite_log(id_table, live)
+                elif pending:
+                    self._append_records(pending)
+                else:
+                    return
+            except Exception as e:
+                print(f"Failed to persist history: {e}")
+                # Keep the records for the next flush, which rewrites the
+                # log from memory since this write may have landed in part
+                with self._lock:
+                    self._pending[:0] = pending
+                    self._rewrite_due = True
+            else:
+                if compact:
+                    self._rewrite_due = False
+            HISTORY_FLUSH_SECONDS.since(started)
+
+    def close(self) -> None:
+        """Stop the background flusher and write anything still queued."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def _compact(
+        self, id: str, timestamp: int, query: str, total: int, result_ids: List[str], scores: Dict[str, float]
+    ) -> CompactEntry:
+        """Intern result ids and quantize scores into a ``CompactEntry``."""
+        numbers = self._id_numbers
+        docs = array('I')
+        for result_id in result_ids:
+            number = numbers.get(result_id)
+            if number is None:
+                number = numbers[result_id] = len(self._id_table)
+                self._id_table.append(result_id)
+            docs.append(number)
+
+        packed = _pack_scores(result_ids, scores)
+        return CompactEntry(id, timestamp, query, total, docs, packed, None if packed is not None else dict(scores))
+
+    def _expand(self, entry: CompactEntry) -> HistoryEntry:
+        table = self._id_table
+        result_ids = [table[number] for number in entry.docs]
+        if entry.raw_scores is not None:
+            result_scores = dict(entry.raw_scores)
+        else:
+            result_scores = {i: q / SCORE_SCALE for i, q in zip(result_ids, entry.scores)}
+        return HistoryEntry.model_construct(
+            id=entry.id,
+            timestamp=entry.timestamp,
+            query=entry.query,
+            total=entry.total,
+            result_ids=result_ids,
+            result_scores=result_scores
+        )
+
+    def _apply_add(self, entry: CompactEntry, score: Optional[float] = None) -> None:
+        # Remove existing entry with same query to prevent duplicates
+        old_id = self._query_index.pop(entry.query, None)
+        if old_id is not None:
+            del self.history[old_id]
+
+        self.history[entry.id] = entry
+        self._query_index[entry.query] = entry.id
+
+        # Rank by frecency, ties going to the most recent search
+        if score is None:
+            previous = self._suggestions.rank(entry.query)
+            score = frecency(previous[0] if previous else None, entry.timestamp)
+        self._sequence += 1
+        self._suggestions.set(entry.query, (score, self._sequence))
+
+    def _apply_delete(self, history_id: str) -> bool:
+        entry = self.history.pop(history_id, None)
+        if entry is None:
+            return False
+
+        del self._query_index[entry.query]
+        self._suggestions.discard(entry.query)
+        return True
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _append_records(self, records: List[Tuple[str, object]]) -> None:
+        lines = []
+        for op, payload in records:
+            if op == "add":
+                record = _add_record(payload)
+            elif op == "ids":
+                record = {"op": "ids", "ids": payload}
+            else:
+                record = {"op": "del", "id": payload}
+            lines.append(json.dumps(record, separators=(',', ':')))
+
+        os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+        with open(self.history_file, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_records += len(records)
+
+    def _live_records(self) -> List[Tuple[CompactEntry, float]]:
+        return [(entry, self._suggestions.rank(entry.query)[0]) for entry in self.history.values()]
+
+    def _rewrite_log(self, id_table: List[str], entries: List[Tuple[CompactEntry, float]]) -> None:
+        """Atomically replace the log with the id table and one add record per live entry.
+
+        Records carry the query's frecency, which replaying only the
+        latest search of each query could not reproduce. The whole id table
+        is kept so indices in records appended later stay valid.
+        """
+        directory = os.path.dirname(self.history_file) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".history-", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps({"op": "ids", "ids": id_table}, separators=(',', ':')))
+                f.write("\n")
+                for entry, score in entries:
+                    f.write(json.dumps(_add_record(entry, score), separators=(',', ':')))
+                    f.write("\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.history_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._log_records = len(entries)
     
     def _load_history(self) -> None:
-        """Load history from file."""
+        """Replay the history log, migrating a legacy JSON history file."""
         if not os.path.exists(self.history_file):
+            self._load_legacy_history()
+            return
+
+        end = 0
+        with open(self.history_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash mid-append
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                    if record["op"] == "add":
+                        self._apply_add(self._read_add_record(record), record.get("frecency"))
+                    elif record["op"] == "ids":
+                        for result_id in record["ids"]:
+                            self._id_numbers[result_id] = len(self._id_table)
+                            self._id_table.append(result_id)
+                    elif record["op"] == "del":
+                        self._apply_delete(record["id"])
+                except Exception:
+                    continue
+                self._log_records += 1
+
+        # Drop the torn tail so the next append starts on a fresh line
+        if end != os.path.getsize(self.history_file):
+            with open(self.history_file, 'r+b') as f:
+                f.truncate(end)
+
+    def _read_add_record(self, record: Dict[str, Any]) -> CompactEntry:
+        data = record["entry"]
+        if "docs" not in record:
+            # Written before results were interned
+            entry = HistoryEntry(**data)
+            return self._compact(
+                entry.id, entry.timestamp, entry.query, entry.total, entry.result_ids, entry.result_scores
+            )
+
+        docs = _decode_array('I', record["docs"])
+        if any(number >= len(self._id_table) for number in docs):
+            raise ValueError("History record references an unknown result id")
+        raw_scores = record.get("result_scores")
+        scores = _decode_array('H', record["scores"]) if raw_scores is None else None
+        return CompactEntry(data["id"], data["timestamp"], data["query"], data["total"], docs, scores, raw_scores)
+
+    def _load_legacy_history(self) -> None:
+        if not os.path.exists(self.legacy_history_file):
             return
             
         try:
-            with open(self.history_file, 'r') as f:
+            with open(self.legacy_history_file, 'r') as f:
                 data = json.load(f)
-                self.history = [HistoryEntry(**entry) for entry in data]
-                self._build_indexes()
+            for item in data:
+                entry = HistoryEntry(**item)
+                self._apply_add(self._compact(
+                    entry.id, entry.timestamp, entry.query, entry.total, entry.result_ids, entry.result_scores
+                ))
+            self._rewrite_log(self._id_table, self._live_records())
         except Exception:
-            self.history = []
+            self.history.clear()
+            self._query_index.clear()
+            self._suggestions = PrefixIndex()
+            self._id_table.clear()
+            self._id_numbers.clear()
     
-    def _save_history(self) -> None:
-        """Save history to file."""
-        try:
-            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-            with open(self.history_file, 'w') as f:
-                json.dump([e.dict() for e in self.history], f, separators=(',', ':'))
-        except Exception:
-            pass
     
-    def _build_indexes(self) -> None:
-        """Build indexes for fast lookups."""
-        self._id_index = {e.id: e for e in self.history}
-        self._query_index = {e.query: e for e in self.history}
-        self._reversed_cache = list(reversed(self.history))
\ No newline at end of file
+def _pack_scores(result_ids: List[str], scores: Dict[str, float]) -> Optional[array]:
+    """Scores parallel to ``result_ids`` in thousandths, or None if that would lose anything."""
+    if len(scores) != len(result_ids):
+        return None
+
+    packed = array('H')
+    for result_id, (score_id, score) in zip(result_ids, scores.items()):
+        quantized = round(score * SCORE_SCALE)
+        if score_id != result_id or not 0 <= quantized <= 0xFFFF or quantized / SCORE_SCALE != score:
+            return None
+        packed.append(quantized)
+    return packed
+
+
+def _add_record(entry: CompactEntry, score: Optional[float] = None) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        "op": "add",
+        "entry": {"id": entry.id, "timestamp": entry.timestamp, "query": entry.query, "total": entry.total},
+        "docs": base64.b64encode(entry.docs.tobytes()).decode(),
+    }
+    if entry.raw_scores is not None:
+        record["result_scores"] = entry.raw_scores
+    else:
+        record["scores"] = base64.b64encode(entry.scores.tobytes()).decode()
+    if score is not None:
+        record["frecency"] = score
+    return record
+
+
+def _decode_array(typecode: str, data: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
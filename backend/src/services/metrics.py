@@ -0,0 +1,357 @@
+import bisect
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; from 100us (cached lookups) up to tens of seconds (index builds)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# (name, type, help, [(labels, value)]) as produced by collectors at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str]):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def label_names_for(self, suffix: str) -> Tuple[str, ...]:
+        return self.label_names
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][i] += 1
+            state[1][0] += value
+
+    def since(self, started: float, **labels: str) -> None:
+        """Observe the time elapsed since ``started`` (a ``perf_counter`` reading)."""
+        if self._registry.enabled:
+            self.observe(perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], float]]:
+        samples = []
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", key + (_format_value(bound),), cumulative))
+            samples.append(("_sum", key, total))
+            samples.append(("_count", key, cumulative))
+        return samples
+
+    def label_names_for(self, suffix: str) -> Tuple[str, ...]:
+        return self.label_names + ("le",) if suffix == "_bucket" else self.label_names
+
+
+class Registry:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Metrics are created once at import time by the modules that record
+    them; while ``enabled`` is off every recording call returns right after
+    a flag check. Collectors sample state that already exists elsewhere
+    (cache counters, index size) only when ``/metrics`` is scraped.
+
+    Work done in worker processes (``SEARCH_EXECUTOR=process``) is recorded
+    in those processes and does not show up here.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(self, name, help, labels, buckets=buckets)
+            return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Call ``collector`` on every scrape for extra metric families."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines += _header(metric.name, metric.kind, metric.help)
+            for suffix, key, value in metric.samples():
+                names = metric.label_names_for(suffix)
+                lines.append(f"{metric.name}{suffix}{_labels(zip(names, key))} {_format_value(value)}")
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines += _header(name, kind, help)
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.items())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, cls, name: str, help: str, labels: Sequence[str]):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, labels)
+            return metric
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling every thread's stack at an interval.
+
+    Samples are folded into collapsed stacks (``outer;inner count`` lines,
+    the flame graph input format). The profile covers the whole process
+    while it runs, so it is most telling on an otherwise quiet instance.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self.started = perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration = perf_counter() - self.started
+
+    def collapsed(self) -> str:
+        lines = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in lines)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+class ProfileStore:
+    """The most recent request profiles, by id."""
+
+    def __init__(self, max_profiles: int = 20):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Tuple[float, str, SamplingProfiler]]" = OrderedDict()
+
+    def add(self, label: str, profiler: SamplingProfiler) -> str:
+        profile_id = uuid.uuid4().hex[:16]
+        self._profiles[profile_id] = (time.time(), label, profiler)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Tuple[float, str, SamplingProfiler]]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, object]]:
+        return [
+            {"id": profile_id, "timestamp": int(ts), "request": label,
+             "samples": profiler.samples, "duration": round(profiler.duration, 6)}
+            for profile_id, (ts, label, profiler) in reversed(self._profiles.items())
+        ]
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware timing requests by route and profiling on demand.
+
+    With a ``ProfileStore``, a request carrying ``X-Profile: 1`` runs under
+    a ``SamplingProfiler``; the response names the stored profile in an
+    ``X-Profile-Id`` header.
+    """
+
+    def __init__(self, app, registry: Registry, profiles: Optional[ProfileStore] = None):
+        self.app = app
+        self.registry = registry
+        self.profiles = profiles
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = profile_id = None
+        if self.profiles is not None and (b"x-profile", b"1") in scope["headers"]:
+            profiler = SamplingProfiler()
+            profile_id = self.profiles.add(f"{scope['method']} {scope['path']}", profiler)
+            profiler.start()
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_id is not None:
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile_id.encode())
+                    ])
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            if self.registry.enabled:
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    perf_counter() - started,
+                    method=scope["method"],
+                    route=getattr(route, "path", "unmatched"),
+                    status=str(status)
+                )
+
+
+def _header(name: str, kind: str, help: str) -> List[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Shared by every service in the process
+registry = Registry()
+
+SEARCH_STAGE_SECONDS = registry.histogram(
+    "search_stage_seconds", "Time spent per search stage", ("stage",)
+)
+INDEX_BUILD_SECONDS = registry.histogram(
+    "search_index_build_seconds", "Index updates by mode, including publishing the snapshot", ("mode",)
+)
+NASA_REQUESTS = registry.counter(
+    "nasa_requests_total", "NASA API requests by kind and HTTP status (error for transport failures)",
+    ("kind", "status")
+)
+NASA_REQUEST_SECONDS = registry.histogram(
+    "nasa_request_seconds", "NASA API request latency", ("kind",)
+)
+NASA_RETRIES = registry.counter("nasa_retries_total", "NASA API page fetch retries")
+NASA_RATE_LIMITED = registry.counter("nasa_rate_limited_total", "NASA API 429 responses", ("kind",))
+HISTORY_FLUSH_SECONDS = registry.histogram("history_flush_seconds", "History log writes including fsync")
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
@@ -1,76 +1,341 @@
 import asyncio
 import json
-import os
 import time
-from typing import List
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from time import perf_counter
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
 import httpx
 
 from ..models.schemas import ImageItem
+from .catalog_cache import CatalogCacheError, CatalogFile, write_catalog
+from .metrics import NASA_RATE_LIMITED, NASA_REQUEST_SECONDS, NASA_REQUESTS, NASA_RETRIES
+
+
+class TokenBucket:
+    """Reservation-based token bucket that backs off on 429 responses.
+
+    Callers reserve a token and sleep until it is available, so no lock is
+    needed on a single event loop. A 429 pauses every caller until the
+    server's Retry-After has passed and halves the rate; successes restore
+    it additively.
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for a token."""
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        self._tokens -= 1
+        
+        wait = max(self._paused_until - now, 0.0)
+        if self._tokens < 0:
+            wait += -self._tokens / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, delay: float) -> None:
+        """Pause all callers for ``delay`` seconds and halve the rate."""
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.rate = max(self.min_rate, self.rate / 2)
+        # No tokens accrue while paused
+        self._tokens = min(self._tokens, 0.0)
+        self._updated = max(self._updated, self._paused_until)
+
+    def recover(self) -> None:
+        """Step the rate back towards its configured maximum."""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class FallbackCache:
+    """TTL cache of NASA API searches with single-flight loading.
+
+    Concurrent requests for a query that is already being fetched await the
+    same task instead of calling the API again. Results are kept for
+    ``ttl`` seconds and empty results, which are as costly to look up, for
+    ``negative_ttl``; failed lookups are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, negative_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[ImageItem]]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(
+        self, key: Tuple, load: Callable[[], Awaitable[Optional[List[ImageItem]]]]
+    ) -> List[ImageItem]:
+        """Cached results for ``key``, calling ``load`` at most once at a time."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._load(key, load))
+        else:
+            self.coalesced += 1
+        # A cancelled request must not cancel the lookup other requests await
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def _load(self, key: Tuple, load: Callable[[], Awaitable[Optional[List[ImageItem]]]]) -> List[ImageItem]:
+        try:
+            results = await load()
+        finally:
+            del self._inflight[key]
+        if results is None:
+            return []
+
+        if self.max_entries > 0:
+            ttl = self.ttl if results else self.negative_ttl
+            self._entries[key] = (time.monotonic() + ttl, results)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
 
 
 class NASAService:
-    def __init__(self, cache_file: str = "data/cache.json"):
+    def __init__(
+        self,
+        cache_file: str = "data/cache.bin",
+        legacy_cache_file: str = "data/cache.json",
+        base_url: str = "https://images-api.nasa.gov/search",
+        concurrency: int = 8,
+        rate_limit: float = 10.0,
+        fallback_cache: Optional[FallbackCache] = None
+    ):
         self.cache_file = cache_file
+        self.legacy_cache_file = legacy_cache_file
         self.cache_duration = 86400  # 24 hours
-        self.base_url = "https://images-api.nasa.gov/search"
+        self.base_url = base_url
         self.max_retries = 3
         self.retry_delay = 1.0
+        self.max_retry_after = 60.0
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate=rate_limit, burst=concurrency)
+        self.fallback_cache = fallback_cache or FallbackCache()
+        self.cache_ts = 0
+        self.cache_checksum: Optional[str] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
     
     async def fetch_page(self, page: int, page_size: int) -> List[ImageItem]:
         """Fetch a single page from NASA API for background loading."""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for attempt in range(self.max_retries):
-                try:
-                    response = await client.get(
-                        self.base_url,
-                        params={
-                            "media_type": "image",
-                            "page": page,
-                            "page_size": min(page_size, 100)  # NASA API max is 100
-                        }
-                    )
-                    
-                    if response.status_code == 429:
-                        await asyncio.sleep(2.0)
-                        continue
-                    
-                    if response.status_code != 200:
-                        continue
-                        
-                    data = response.json()
-                    return self._parse_nasa_response(data)
-                    
-                except Exception as e:
-                    if attempt == self.max_retries - 1:
-                        print(f"Failed to fetch page {page}: {e}")
-                        return []
-                    await asyncio.sleep(self.retry_delay * (2 ** attempt))
+        params = {
+            "media_type": "image",
+            "page": page,
+            "page_size": min(page_size, 100)  # NASA API max is 100
+        }
         
-        return []
-    
-    async def search_nasa_api(self, query: str, limit: int = 50) -> List[ImageItem]:
-        """Search NASA API directly for fallback when cache has no results."""
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        for attempt in range(self.max_retries):
+            if attempt:
+                NASA_RETRIES.inc()
+            await self.rate_limiter.acquire()
             try:
-                response = await client.get(
-                    self.base_url,
-                    params={
-                        "q": query,
-                        "media_type": "image",
-                        "page_size": min(limit, 100)
-                    }
-                )
+                response = await self._timed_get("page", params)
                 
-                if response.status_code != 200:
-                    return []
+                if response.status_code == 429:
+                    self.rate_limiter.backoff(self._retry_after(response, attempt))
+                    continue
                 
+                if response.status_code != 200:
+                    continue
+                    
                 data = response.json()
+                self.rate_limiter.recover()
                 return self._parse_nasa_response(data)
                 
             except Exception as e:
-                print(f"NASA API search failed: {e}")
-                return []
+                if attempt == self.max_retries - 1:
+                    print(f"Failed to fetch page {page}: {e}")
+                    return []
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+        
+        return []
+    
+    async def iter_pages(
+        self, first: int, last: int, page_size: int
+    ) -> AsyncIterator[Tuple[int, List[ImageItem]]]:
+        """Fetch pages concurrently, yielding them in order until an empty page."""
+        pending: Deque[Tuple[int, asyncio.Future]] = deque()
+        next_page = first
+        try:
+            while pending or next_page <= last:
+                while next_page <= last and len(pending) < self.concurrency:
+                    pending.append((next_page, asyncio.ensure_future(self.fetch_page(next_page, page_size))))
+                    next_page += 1
+                
+                page, task = pending.popleft()
+                images = await task
+                if not images:
+                    return
+                yield page, images
+        finally:
+            for _, task in pending:
+                task.cancel()
+    
+    async def refresh_catalog(
+        self, known: Sequence[ImageItem], max_pages: int
+    ) -> Tuple[List[ImageItem], List[ImageItem]]:
+        """Fetch pages until one holds only known, unchanged images.
+        
+        Returns the merged catalog (new images first, changed ones replaced
+        in place) and the images that are new or changed.
+        """
+        known_by_nasa_id = {img.nasa_id: img for img in known}
+        fresh: List[ImageItem] = []
+        changed: Dict[str, ImageItem] = {}
+        
+        async for _, images in self.iter_pages(1, max_pages, 100):
+            page_has_updates = False
+            for img in images:
+                old = known_by_nasa_id.get(img.nasa_id)
+                if old is None:
+                    fresh.append(img)
+                    known_by_nasa_id[img.nasa_id] = img
+                    page_has_updates = True
+                elif old != img and img.nasa_id not in changed:
+                    changed[img.nasa_id] = img
+                    page_has_updates = True
+            
+            if not page_has_updates:
+                break
+        
+        catalog = fresh + [changed.get(img.nasa_id, img) for img in known]
+        return catalog, fresh + list(changed.values())
+    
+    def cache_age(self) -> float:
+        """Seconds since the cache was written, or infinity without one."""
+        return time.time() - self.cache_ts if self.cache_ts else float("inf")
+    
+    def is_cache_fresh(self) -> bool:
+        """Whether the cache is younger than ``cache_duration``."""
+        return self.cache_age() < self.cache_duration
+    
+    async def search_nasa_api(self, query: str, limit: int = 50) -> List[ImageItem]:
+        """Search NASA API directly for fallback when cache has no results."""
+        return await self._query_nasa_api(query, limit) or []
+    
+    async def search_fallback(self, query: str, limit: int = 50) -> List[ImageItem]:
+        """``search_nasa_api`` through the fallback cache.
+        
+        Queries differing only in case or whitespace share one entry, and
+        identical lookups in flight share one API call.
+        """
+        key = (" ".join(query.lower().split()), min(limit, 100))
+        return await self.fallback_cache.get(key, lambda: self._query_nasa_api(query, limit))
+    
+    async def _query_nasa_api(self, query: str, limit: int) -> Optional[List[ImageItem]]:
+        """Search the NASA API; None when the request failed."""
+        await self.rate_limiter.acquire()
+        try:
+            response = await self._timed_get("search", {
+                "q": query,
+                "media_type": "image",
+                "page_size": min(limit, 100)
+            })
+            
+            if response.status_code == 429:
+                self.rate_limiter.backoff(self._retry_after(response, 0))
+                return None
+            
+            if response.status_code != 200:
+                return None
+            
+            data = response.json()
+            self.rate_limiter.recover()
+            return self._parse_nasa_response(data)
+            
+        except Exception as e:
+            print(f"NASA API search failed: {e}")
+            return None
+    
+    async def close(self) -> None:
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared keep-alive client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency * 2,
+                    max_keepalive_connections=self.concurrency
+                )
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def _timed_get(self, kind: str, params: dict) -> httpx.Response:
+        """GET the API, counting the request by outcome and timing it."""
+        started = perf_counter()
+        try:
+            response = await self._get_client().get(self.base_url, params=params)
+        except Exception:
+            NASA_REQUESTS.inc(kind=kind, status="error")
+            raise
+        finally:
+            NASA_REQUEST_SECONDS.since(started, kind=kind)
+        NASA_REQUESTS.inc(kind=kind, status=str(response.status_code))
+        if response.status_code == 429:
+            NASA_RATE_LIMITED.inc(kind=kind)
+        return response
+    
+    def _retry_after(self, response: httpx.Response, attempt: int) -> float:
+        """Seconds to wait after a 429, from Retry-After or exponential backoff."""
+        header = response.headers.get("Retry-After", "").strip()
+        delay = self.retry_delay * (2 ** attempt)
+        if header:
+            try:
+                delay = float(header)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(header).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    pass
+        return min(max(delay, 0.0), self.max_retry_after)
     
     def _parse_nasa_response(self, data: dict) -> List[ImageItem]:
         """Parse NASA API response into ImageItem objects."""
@@ -107,21 +372,37 @@ class NASAService:
                 return link.get('href', '')
         return ""
     
-    def _load_from_cache(self) -> List[ImageItem]:
-        """Load images from cache file."""
+    def _load_from_cache(self, legacy: bool = True) -> Sequence[ImageItem]:
+        """Load images from the memory-mapped cache file, or the legacy JSON cache.
+        
+        With ``legacy`` off only the binary file is read, so nothing is written.
+        """
+        try:
+            catalog = CatalogFile(self.cache_file)
+            self.cache_ts = catalog.ts
+            self.cache_checksum = catalog.checksum
+            return catalog.images()
+        except (OSError, CatalogCacheError):
+            if not legacy:
+                return []
+        
         try:
-            with open(self.cache_file, 'r') as f:
+            with open(self.legacy_cache_file, 'r') as f:
                 cache_data = json.load(f)
-                return [ImageItem(**item) for item in cache_data['items']]
+                images = [ImageItem(**item) for item in cache_data['items']]
+                self.cache_ts = cache_data.get('ts', 0)
         except Exception:
             return []
+        
+        # Migrate to the binary format, keeping the original timestamp
+        try:
+            self._save_to_cache(images, ts=self.cache_ts)
+        except OSError as e:
+            print(f"Failed to migrate legacy cache: {e}")
+        return images
     
-    def _save_to_cache(self, images: List[ImageItem]) -> None:
-        """Save images to cache file."""
-        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-        cache_data = {
-            'ts': int(time.time()),
-            'items': [img.dict() for img in images]
-        }
-        with open(self.cache_file, 'w') as f:
-            json.dump(cache_data, f, separators=(',', ':'))
\ No newline at end of file
+    def _save_to_cache(self, images: Sequence[ImageItem], ts: Optional[int] = None) -> None:
+        """Save images to cache file atomically."""
+        ts = int(time.time()) if ts is None else ts
+        self.cache_checksum = write_catalog(self.cache_file, images, ts)
+        self.cache_ts = ts
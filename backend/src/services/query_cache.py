@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Rough per-entry and per-hit footprint used to enforce the memory bound
+ENTRY_OVERHEAD_BYTES = 512
+HIT_BYTES = 120
+
+
+class QueryCache:
+    """Bounded LRU cache of ranked search results with TTL expiry.
+
+    Entries are tagged with the index version they were computed against;
+    seeing a newer version drops everything, so a rebuilt or extended
+    index never serves stale rankings.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._version = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, version: int, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, version: int, key: Hashable, value: Any, size: int = 0) -> None:
+        """Store a value costing roughly ``size`` hits, evicting LRU entries as needed."""
+        if not self.enabled:
+            return
+
+        cost = ENTRY_OVERHEAD_BYTES + HIT_BYTES * size
+        if cost > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return  # computed against an index that has since been replaced
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic(), cost, value)
+            self.bytes += cost
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, version: int) -> None:
+        """Drop every entry computed against an index older than ``version``."""
+        with self._lock:
+            self._check_version(version)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "version": self._version,
+        }
+
+    def _check_version(self, version: int) -> None:
+        if version > self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+
+    def _remove(self, key: Hashable) -> None:
+        _, cost, _ = self._entries.pop(key)
+        self.bytes -= cost
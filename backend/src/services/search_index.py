@@ -0,0 +1,577 @@
+import math
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .catalog_cache import CatalogCacheError, SectionFile, string_column, write_sections
+
+# Persisted index: a section file holding META, the vocabulary in term-id
+# order ("vocab.*"), flattened postings with per-term offsets
+# ("postings.*"), flattened positions ("positions.*"), per-document
+# segment lengths ("segments.*"), and the df / doc_len / idf / norms
+# arrays. It is only valid for the catalog file whose checksum it records.
+INDEX_MAGIC = b"CSXI"
+INDEX_FORMAT_VERSION = 2
+META = struct.Struct("<dddQQ64s")
+
+# Documents are indexed as token segments: the title, the description, then
+# one segment per keyword. Title and keyword tokens count twice towards term
+# frequencies and document length.
+TITLE_SEGMENT = 0
+DESCRIPTION_SEGMENT = 1
+FIRST_KEYWORD_SEGMENT = 2
+
+# A position is (segment << POSITION_BITS) | offset within the segment, so
+# consecutive positions never cross a segment boundary. Only the first
+# MAX_OFFSET tokens of a segment get positions (and segments past
+# MAX_SEGMENT none); the rest still count towards BM25.
+POSITION_BITS = 16
+MAX_OFFSET = (1 << POSITION_BITS) - 1
+MAX_SEGMENT = (1 << (32 - POSITION_BITS)) - 1
+
+# Boost factors by where the query's tokens occur as a phrase, and for all
+# of them within PROXIMITY_WINDOW consecutive tokens of one segment
+EXACT_KEYWORD_BOOST = 5.0
+KEYWORD_PHRASE_BOOST = 3.0
+TITLE_PHRASE_BOOST = 2.0
+DESCRIPTION_PHRASE_BOOST = 1.5
+PROXIMITY_BOOST = 1.25
+PROXIMITY_WINDOW = 8
+
+
+class InvertedIndex:
+    """Append-only Okapi BM25 postings with token positions, held in compact arrays.
+
+    Documents get consecutive ids in insertion order. Each posting has a
+    term frequency and a run of positions (see ``POSITION_BITS``) in the
+    term's position list, starting at the posting's entry in
+    ``postings_starts``. Removed documents are
+    tombstoned: their postings stay in place but they stop counting towards
+    document frequencies, corpus size and average length. Readers never use
+    the index directly; they score against an ``IndexSnapshot`` that is
+    bounded to the documents present when it was taken, so changes made by
+    the writer are invisible to queries already in flight.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocabulary: Dict[str, int] = {}
+        self.postings_docs: List[array] = []
+        self.postings_tfs: List[array] = []
+        self.postings_starts: List[array] = []
+        self.postings_positions: List[array] = []
+        self.df = array('I')
+        self.doc_len = array('I')
+        # Token count of every segment, per document from segment_offsets[doc_id]
+        self.segment_offsets = array('I', [0])
+        self.segment_lengths = array('H')
+        self.deleted: Set[int] = set()
+        self.total_len = 0
+        self.version = 0
+        # IDF and norms loaded from disk, valid until the next change
+        self._stored_stats: Optional[Tuple[array, array]] = None
+
+    @property
+    def doc_count(self) -> int:
+        """Number of doc ids allocated, including removed documents."""
+        return len(self.doc_len)
+
+    @property
+    def corpus_size(self) -> int:
+        """Number of live documents."""
+        return len(self.doc_len) - len(self.deleted)
+
+    def add(self, corpus: List[List[List[str]]]) -> None:
+        """Append documents given as token segments (title, description, keywords...),
+        updating postings, positions and document frequencies."""
+        self._thaw()
+        vocabulary = self.vocabulary
+        postings_docs, postings_tfs = self.postings_docs, self.postings_tfs
+        postings_starts, postings_positions = self.postings_starts, self.postings_positions
+        df = self.df
+        # Arrays of the terms seen in this call, saving the lookups per posting
+        terms: Dict[str, Tuple[int, array, array, array, array]] = {}
+        doc_id = self.doc_count
+        for segments in corpus:
+            # Keywords and the title come first, so terms are numbered in the
+            # order they occur in the BM25 token stream, and every position
+            # before the description counts twice
+            positions: Dict[str, List[int]] = {}
+            doubled: Dict[str, int] = {}
+            overflow: Dict[str, int] = {}  # weighted counts of tokens without a position
+            length = 0
+            for segment in [*range(FIRST_KEYWORD_SEGMENT, len(segments)), TITLE_SEGMENT, DESCRIPTION_SEGMENT]:
+                tokens = segments[segment]
+                if segment == DESCRIPTION_SEGMENT:
+                    doubled = {token: len(found) for token, found in positions.items()}
+                    weight = 1
+                else:
+                    weight = 2
+                length += weight * len(tokens)
+                base = segment << POSITION_BITS
+                rest = ()
+                if len(tokens) > MAX_OFFSET or segment > MAX_SEGMENT:
+                    keep = MAX_OFFSET if segment <= MAX_SEGMENT else 0
+                    tokens, rest = tokens[:keep], tokens[keep:]
+                for offset, token in enumerate(tokens, base):
+                    found = positions.get(token)
+                    if found is None:
+                        positions[token] = [offset]
+                    else:
+                        found.append(offset)
+                for token in rest:
+                    positions.setdefault(token, [])
+                    overflow[token] = overflow.get(token, 0) + weight
+
+            self.doc_len.append(length)
+            self.total_len += length
+            if overflow:  # also when a segment is too long for its length
+                self.segment_lengths.extend(min(len(tokens), MAX_OFFSET) for tokens in segments)
+            else:
+                self.segment_lengths.extend(map(len, segments))
+            self.segment_offsets.append(len(self.segment_lengths))
+
+            for token, found in positions.items():
+                term = terms.get(token)
+                if term is None:
+                    term_id = vocabulary.get(token)
+                    if term_id is None:
+                        term_id = len(postings_docs)
+                        vocabulary[token] = term_id
+                        postings_docs.append(array('I'))
+                        postings_tfs.append(array('I'))
+                        postings_starts.append(array('I'))
+                        postings_positions.append(array('I'))
+                        df.append(0)
+                    term = terms[token] = (
+                        term_id, postings_docs[term_id], postings_tfs[term_id],
+                        postings_starts[term_id], postings_positions[term_id]
+                    )
+                term_id, docs, tfs, starts, term_positions = term
+                # The start goes in before the positions, so a posting's
+                # positions always end at the next start or the list's end
+                starts.append(len(term_positions))
+                if len(found) == 1:
+                    term_positions.append(found[0])  # most terms occur once per document
+                else:
+                    term_positions.extend(found)
+                docs.append(doc_id)
+                tfs.append(len(found) + doubled.get(token, 0) + (overflow.get(token, 0) if overflow else 0))
+                df[term_id] += 1
+
+            doc_id += 1
+
+    def remove(self, doc_id: int, segments: List[List[str]]) -> None:
+        """Tombstone a document; ``segments`` must be what it was indexed with."""
+        if doc_id in self.deleted or doc_id >= self.doc_count:
+            return
+
+        self._stored_stats = None
+        self.deleted.add(doc_id)
+        self.total_len -= self.doc_len[doc_id]
+        for token in {token for tokens in segments for token in tokens}:
+            term_id = self.vocabulary.get(token)
+            if term_id is not None and self.df[term_id]:
+                self.df[term_id] -= 1
+
+    def snapshot(self) -> "IndexSnapshot":
+        """Freeze the current statistics into a consistent read-only view."""
+        self.version += 1
+        return IndexSnapshot(self, self._stored_stats)
+
+    def reordered(self, order: Sequence[int]) -> "InvertedIndex":
+        """Compacted copy holding the documents in ``order``, renumbered by position.
+
+        Tombstoned documents left out of ``order`` are dropped. Postings are
+        remapped rather than re-tokenized.
+        """
+        new_ids = array('q', [-1]) * self.doc_count
+        for new_id, doc_id in enumerate(order):
+            new_ids[doc_id] = new_id
+
+        index = InvertedIndex(self.k1, self.b, self.epsilon)
+        index.version = self.version
+        for token, term_id in self.vocabulary.items():
+            tfs = self.postings_tfs[term_id]
+            starts, positions = self.postings_starts[term_id], self.postings_positions[term_id]
+            postings = sorted(
+                (new_ids[doc_id], tfs[i], _posting_positions(starts, positions, i))
+                for i, doc_id in enumerate(self.postings_docs[term_id])
+                if new_ids[doc_id] >= 0
+            )
+            if not postings:
+                continue
+            index.vocabulary[token] = len(index.postings_docs)
+            index.postings_docs.append(array('I', (doc_id for doc_id, _, _ in postings)))
+            index.postings_tfs.append(array('I', (tf for _, tf, _ in postings)))
+            new_starts, new_positions = array('I'), array('I')
+            for _, _, doc_positions in postings:
+                new_starts.append(len(new_positions))
+                new_positions.extend(doc_positions)
+            index.postings_starts.append(new_starts)
+            index.postings_positions.append(new_positions)
+            index.df.append(len(postings))
+
+        index.doc_len = array('I', (self.doc_len[doc_id] for doc_id in order))
+        index.total_len = sum(index.doc_len)
+        for doc_id in order:
+            index.segment_lengths.extend(
+                self.segment_lengths[self.segment_offsets[doc_id]:self.segment_offsets[doc_id + 1]]
+            )
+            index.segment_offsets.append(len(index.segment_lengths))
+        return index
+
+    def save(self, path: str, snapshot: "IndexSnapshot", catalog_checksum: str) -> None:
+        """Persist the index and ``snapshot``'s statistics for a catalog file."""
+        if self.deleted or snapshot.doc_count != self.doc_count:
+            raise ValueError("Only a compacted, fully published index can be saved")
+
+        offsets = array('Q', [0])
+        docs = array('I')
+        tfs = array('I')
+        starts = array('I')
+        position_offsets = array('Q', [0])
+        positions = array('I')
+        for term_id, term_docs in enumerate(self.postings_docs):
+            docs.extend(term_docs)
+            tfs.extend(self.postings_tfs[term_id])
+            starts.extend(self.postings_starts[term_id])
+            offsets.append(len(docs))
+            positions.extend(self.postings_positions[term_id])
+            position_offsets.append(len(positions))
+
+        vocab_offsets, vocab_data = string_column(self.vocabulary)
+        sections = {
+            "meta": META.pack(self.k1, self.b, self.epsilon, self.version, self.total_len, catalog_checksum.encode()),
+            "vocab.offsets": vocab_offsets,
+            "vocab.data": vocab_data,
+            "postings.offsets": offsets.tobytes(),
+            "postings.docs": docs.tobytes(),
+            "postings.tfs": tfs.tobytes(),
+            "postings.starts": starts.tobytes(),
+            "positions.offsets": position_offsets.tobytes(),
+            "positions.data": positions.tobytes(),
+            "segments.offsets": self.segment_offsets.tobytes(),
+            "segments.lengths": self.segment_lengths.tobytes(),
+            "df": self.df.tobytes(),
+            "doc_len": self.doc_len.tobytes(),
+            "idf": snapshot.idf.tobytes(),
+            "norms": snapshot.norms.tobytes(),
+        }
+        write_sections(path, INDEX_MAGIC, INDEX_FORMAT_VERSION, 0, self.doc_count, sections)
+
+    @classmethod
+    def load(cls, path: str, catalog_checksum: str) -> "InvertedIndex":
+        """Load a persisted index built for the catalog with ``catalog_checksum``.
+
+        Postings stay memory-mapped until the index is next appended to.
+        """
+        f = SectionFile(path, INDEX_MAGIC, INDEX_FORMAT_VERSION, verify=True)
+        k1, b, epsilon, version, total_len, checksum = f.unpack("meta", META)
+        if checksum.rstrip(b"\0").decode() != catalog_checksum:
+            raise CatalogCacheError(f"{path} was built for a different catalog")
+
+        index = cls(k1, b, epsilon)
+        index.version = version
+        index.total_len = total_len
+
+        vocab_offsets = f.array("vocab.offsets", 'Q')
+        vocab_data = f.section("vocab.data")
+        index.vocabulary = {
+            str(vocab_data[vocab_offsets[i]:vocab_offsets[i + 1]], "utf-8"): i
+            for i in range(len(vocab_offsets) - 1)
+        }
+
+        offsets = f.array("postings.offsets", 'Q')
+        index.postings_docs = FlatPostings(f.array("postings.docs", 'I'), offsets)
+        index.postings_tfs = FlatPostings(f.array("postings.tfs", 'I'), offsets)
+        index.postings_starts = FlatPostings(f.array("postings.starts", 'I'), offsets)
+        index.postings_positions = FlatPostings(f.array("positions.data", 'I'), f.array("positions.offsets", 'Q'))
+        index.df = _copy_array('I', f.section("df"))
+        index.doc_len = _copy_array('I', f.section("doc_len"))
+        index.segment_offsets = _copy_array('I', f.section("segments.offsets"))
+        index.segment_lengths = _copy_array('H', f.section("segments.lengths"))
+        index._stored_stats = (_copy_array('d', f.section("idf")), _copy_array('d', f.section("norms")))
+
+        if (
+            len(index.doc_len) != f.count
+            or len(index.df) != len(index.vocabulary)
+            or len(index.segment_offsets) != f.count + 1
+        ):
+            raise CatalogCacheError(f"{path} is inconsistent")
+        return index
+
+    def _thaw(self) -> None:
+        """Copy memory-mapped postings into appendable arrays."""
+        self._stored_stats = None
+        if isinstance(self.postings_docs, FlatPostings):
+            self.postings_docs = self.postings_docs.to_arrays()
+            self.postings_tfs = self.postings_tfs.to_arrays()
+            self.postings_starts = self.postings_starts.to_arrays()
+            self.postings_positions = self.postings_positions.to_arrays()
+
+
+class FlatPostings(Sequence[memoryview]):
+    """Read-only per-term views over flattened, memory-mapped postings."""
+
+    def __init__(self, flat: memoryview, offsets: memoryview):
+        self._flat = flat
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, term_id: int) -> memoryview:
+        return self._flat[self._offsets[term_id]:self._offsets[term_id + 1]]
+
+    def __reduce__(self):
+        # Memory maps cannot be pickled; ship plain arrays instead
+        return list, (self.to_arrays(),)
+
+    def to_arrays(self) -> List[array]:
+        return [_copy_array('I', self[term_id]) for term_id in range(len(self))]
+
+
+def _posting_positions(starts: Sequence[int], positions: Sequence[int], i: int) -> Sequence[int]:
+    """Positions of the ``i``-th posting in a term's position list."""
+    end = starts[i + 1] if i + 1 < len(starts) else len(positions)
+    return positions[starts[i]:end]
+
+
+def _phrase_starts(phrase: List[str], positions: Dict[str, Sequence[int]]) -> Iterator[int]:
+    """Positions where ``phrase`` starts, given each of its tokens' positions in one document."""
+    first = positions[phrase[0]]
+    if len(phrase) == 1:
+        yield from first
+        return
+    rest = [(i, set(positions[token])) for i, token in enumerate(phrase) if i]
+    last = len(phrase) - 1
+    for start in first:
+        # The whole phrase has to stay within the start's segment
+        if (start + last) >> POSITION_BITS == start >> POSITION_BITS and all(
+            start + i in token_positions for i, token_positions in rest
+        ):
+            yield start
+
+
+def _within_window(positions: List[Sequence[int]], window: int) -> bool:
+    """Whether one position from every list falls within ``window`` consecutive positions of one segment."""
+    merged = sorted((position, i) for i, token_positions in enumerate(positions) for position in token_positions)
+    counts = [0] * len(positions)
+    covered = 0
+    low = 0
+    for position, i in merged:
+        if not counts[i]:
+            covered += 1
+        counts[i] += 1
+        # Drop positions too far back or in an earlier segment
+        while merged[low][0] <= position - window or merged[low][0] >> POSITION_BITS != position >> POSITION_BITS:
+            j = merged[low][1]
+            counts[j] -= 1
+            if not counts[j]:
+                covered -= 1
+            low += 1
+        if covered == len(positions):
+            return True
+    return False
+
+
+def _copy_array(typecode: str, data: memoryview) -> array:
+    values = array(typecode)
+    values.frombytes(data.cast('B'))
+    return values
+
+
+class IndexSnapshot:
+    """Immutable view of an ``InvertedIndex`` with precomputed IDF and norms.
+
+    Scoring is equivalent to ``rank_bm25.BM25Okapi.get_scores`` over the
+    snapshot's live documents but only touches documents that appear in
+    the postings of the query terms. Phrases and boosts are matched from
+    positions: the rarest term's postings are walked and the other terms
+    are looked up in theirs by binary search.
+    """
+
+    def __init__(self, index: InvertedIndex, stored_stats: Optional[Tuple[array, array]] = None):
+        self.k1 = index.k1
+        self.b = index.b
+        self.version = index.version
+        self.doc_count = index.doc_count
+        self.corpus_size = index.corpus_size
+        self.term_count = len(index.postings_docs)
+        self.deleted: FrozenSet[int] = frozenset(index.deleted)
+        self._vocabulary = index.vocabulary
+        self._postings_docs = index.postings_docs
+        self._postings_tfs = index.postings_tfs
+        self._postings_starts = index.postings_starts
+        self._postings_positions = index.postings_positions
+        self._segment_offsets = index.segment_offsets
+        self._segment_lengths = index.segment_lengths
+        self.avgdl = index.total_len / self.corpus_size if self.corpus_size else 0.0
+
+        if stored_stats is not None:
+            self.idf, self.norms = stored_stats
+            return
+
+        self.idf = self._calc_idf(index.df, index.epsilon)
+        k1, b, avgdl = self.k1, self.b, self.avgdl
+        self.norms = array('d', (k1 * (1 - b + b * dl / avgdl) for dl in index.doc_len)) if avgdl else array('d')
+
+    @property
+    def vocabulary(self) -> Dict[str, int]:
+        """Term ids; may include terms added after the snapshot (ids >= term_count)."""
+        return self._vocabulary
+
+    def postings(self, term_id: int) -> Tuple[Sequence[int], Sequence[int]]:
+        """Doc ids and term frequencies of a term, unfiltered by ``doc_count`` and ``deleted``."""
+        return self._postings_docs[term_id], self._postings_tfs[term_id]
+
+    def positions(self, term_id: int) -> Tuple[Sequence[int], Sequence[int]]:
+        """Where each of a term's postings starts in its position list, and the list."""
+        return self._postings_starts[term_id], self._postings_positions[term_id]
+
+    def segments(self) -> Tuple[Sequence[int], Sequence[int]]:
+        """Per-document offsets into the segment lengths, and the lengths."""
+        return self._segment_offsets, self._segment_lengths
+
+    def score(self, query_tokens: List[str], allowed: Optional[bytes] = None) -> Dict[int, float]:
+        """Return BM25 scores keyed by doc id for documents matching any query token.
+
+        With an ``allowed`` bitmap (bit ``d & 7`` of byte ``d >> 3``) only
+        those documents are scored.
+        """
+        scores: Dict[int, float] = {}
+        k1_plus_1 = self.k1 + 1
+        norms = self.norms
+        doc_count = self.doc_count
+        deleted = self.deleted
+
+        # Repeated query tokens are scored repeatedly, as BM25Okapi does
+        for token in query_tokens:
+            term_id = self._vocabulary.get(token)
+            if term_id is None or term_id >= self.term_count:
+                continue
+
+            idf = self.idf[term_id]
+            for doc_id, tf in zip(self._postings_docs[term_id], self._postings_tfs[term_id]):
+                if doc_id >= doc_count:
+                    break  # appended after this snapshot was taken
+                if deleted and doc_id in deleted:
+                    continue
+                if allowed is not None and not allowed[doc_id >> 3] >> (doc_id & 7) & 1:
+                    continue
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (tf * k1_plus_1 / (tf + norms[doc_id]))
+
+        return scores
+
+    def phrase_docs(self, phrase: List[str], allowed: Optional[bytes] = None) -> Set[int]:
+        """Live documents where ``phrase`` occurs: its tokens in order at
+        consecutive positions of one segment. ``allowed`` is as for ``score``."""
+        return {
+            doc_id for doc_id, positions in self._cooccurrences(phrase, allowed)
+            if next(_phrase_starts(phrase, positions), None) is not None
+        }
+
+    def boosts(self, query_tokens: List[str], allowed: Optional[bytes] = None) -> Dict[int, float]:
+        """Boost factor by doc id for documents where the query tokens occur
+        together (documents left out have a factor of 1).
+
+        As a phrase, the tokens may form a whole keyword, sit inside a
+        keyword, the title or the description, each with its own factor
+        and the largest one applying. Without a phrase match, several
+        distinct tokens within ``PROXIMITY_WINDOW`` tokens of each other
+        get ``PROXIMITY_BOOST``.
+        """
+        boosts: Dict[int, float] = {}
+        if not query_tokens:
+            return boosts
+        length = len(query_tokens)
+        proximity = len(set(query_tokens)) > 1
+        segment_offsets, segment_lengths = self._segment_offsets, self._segment_lengths
+
+        for doc_id, positions in self._cooccurrences(query_tokens, allowed):
+            boost = 1.0
+            for position in _phrase_starts(query_tokens, positions):
+                segment = position >> POSITION_BITS
+                if segment >= FIRST_KEYWORD_SEGMENT:
+                    if not position & MAX_OFFSET and segment_lengths[segment_offsets[doc_id] + segment] == length:
+                        boost = EXACT_KEYWORD_BOOST
+                        break
+                    boost = max(boost, KEYWORD_PHRASE_BOOST)
+                elif segment == TITLE_SEGMENT:
+                    boost = max(boost, TITLE_PHRASE_BOOST)
+                elif length > 1:
+                    boost = max(boost, DESCRIPTION_PHRASE_BOOST)
+            if boost == 1.0 and proximity and _within_window(list(positions.values()), PROXIMITY_WINDOW):
+                boost = PROXIMITY_BOOST
+            if boost != 1.0:
+                boosts[doc_id] = boost
+        return boosts
+
+    def _cooccurrences(
+        self, tokens: List[str], allowed: Optional[bytes] = None
+    ) -> Iterator[Tuple[int, Dict[str, Sequence[int]]]]:
+        """Live documents containing every one of ``tokens``, with each distinct token's positions there."""
+        terms = []
+        for token in dict.fromkeys(tokens):
+            term_id = self._vocabulary.get(token)
+            if term_id is None or term_id >= self.term_count:
+                return
+            terms.append((
+                token, self._postings_docs[term_id], self._postings_starts[term_id], self._postings_positions[term_id]
+            ))
+        terms.sort(key=lambda term: len(term[1]))
+        (rarest, docs, starts, positions), others = terms[0], terms[1:]
+        doc_count = self.doc_count
+        deleted = self.deleted
+        # Doc ids only grow, so each search starts where the last one ended
+        lows = [0] * len(others)
+
+        for i, doc_id in enumerate(docs):
+            if doc_id >= doc_count:
+                break  # appended after this snapshot was taken
+            if deleted and doc_id in deleted:
+                continue
+            if allowed is not None and not allowed[doc_id >> 3] >> (doc_id & 7) & 1:
+                continue
+            found = {rarest: _posting_positions(starts, positions, i)}
+            for k, (token, term_docs, term_starts, term_positions) in enumerate(others):
+                j = lows[k] = bisect_left(term_docs, doc_id, lows[k])
+                if j == len(term_docs) or term_docs[j] != doc_id:
+                    break
+                found[token] = _posting_positions(term_starts, term_positions, j)
+            else:
+                yield doc_id, found
+
+    def _calc_idf(self, doc_freqs: array, epsilon: float) -> array:
+        """Compute IDF with BM25Okapi's epsilon floor for negative values.
+
+        Terms that only occur in removed documents are left out of the
+        average, as they would be after a rebuild.
+        """
+        n = self.corpus_size
+        idf = array('d', bytes(8 * self.term_count))
+        idf_sum = 0.0
+        terms = 0
+        negative = []
+
+        for term_id in range(self.term_count):
+            df = doc_freqs[term_id]
+            if not df:
+                continue
+            value = math.log(n - df + 0.5) - math.log(df + 0.5)
+            idf[term_id] = value
+            idf_sum += value
+            terms += 1
+            if value < 0:
+                negative.append(term_id)
+
+        if terms:
+            eps = epsilon * (idf_sum / terms)
+            for term_id in negative:
+                idf[term_id] = eps
+
+        return idf
@@ -1,80 +1,509 @@
+import asyncio
+import heapq
+import os
+import pickle
 import re
-from typing import Dict, List, Tuple
-
-from rank_bm25 import BM25Okapi
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from operator import itemgetter
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
 from ..models.schemas import ImageItem
+from .catalog_cache import CatalogCacheError, CatalogView, CompactCatalog, compact
+from .facet_index import NO_FILTERS, FacetCounts, Filters, bitmap, bitset, facet_index_for
+from .metrics import INDEX_BUILD_SECONDS, SEARCH_STAGE_SECONDS
+from .query_cache import QueryCache
+from .search_index import IndexSnapshot, InvertedIndex
+from .vector_scorer import VectorScorer, numpy_available
+
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+# Scoring implementations; "numpy" needs NumPy and SciPy installed
+SCORERS = ("python", "numpy")
+
+# Index update modes
+REBUILD = "rebuild"
+APPEND = "append"
+UPSERT = "upsert"
+
+# Rebuild once tombstoned documents exceed this share of the index
+COMPACT_DELETED_RATIO = 0.25
+
+
+class SearchSnapshot(NamedTuple):
+    """Consistent pairing of an index snapshot and the images it covers."""
+    index: IndexSnapshot
+    images: Sequence[ImageItem]
+    vectors: Optional[VectorScorer] = None
+
+
+class RankedHits(NamedTuple):
+    """Boosted (doc id, score) hits in catalog order plus their score range."""
+    hits: List[Tuple[int, float]]
+    min_score: float
+    max_score: float
 
 
 class SearchService:
-    def __init__(self):
-        self.bm25 = None
-        self.images = []
+    def __init__(
+        self,
+        executor: str = "inline",
+        max_workers: Optional[int] = None,
+        cache: Optional[QueryCache] = None,
+        scorer: str = "python"
+    ):
+        if executor not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown search executor '{executor}', expected one of {EXECUTOR_MODES}")
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown search scorer '{scorer}', expected one of {SCORERS}")
+        if scorer == "numpy" and not numpy_available():
+            print("NumPy/SciPy not installed, using the Python scorer")
+            scorer = "python"
+        
+        self.index = None
+        self.snapshot: Optional[SearchSnapshot] = None
+        self.executor = executor
+        self.max_workers = max_workers
+        self.scorer = scorer
+        self.cache = cache if cache is not None else QueryCache()
+        self._images: Sequence[ImageItem] = []
+        self._doc_ids: Dict[str, int] = {}
         self._stop_words = frozenset({'the', 'a', 'an', 'and'})
+        self._write_lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._payload: Optional[Tuple[int, bytes]] = None
     
-    def build_index(self, images: List[ImageItem]) -> None:
-        """Build BM25 search index using rank-bm25 library."""
-        if not images:
-            return
+    @property
+    def images(self) -> List[ImageItem]:
+        snapshot = self.snapshot
+        if not snapshot:
+            return []
+        deleted = snapshot.index.deleted
+        return [
+            img for doc_id, img in enumerate(snapshot.images[:snapshot.index.doc_count])
+            if doc_id not in deleted
+        ]
+    
+    @property
+    def version(self) -> int:
+        return self.snapshot.index.version if self.snapshot else 0
+    
+    def build_index(self, images: Sequence[ImageItem]) -> None:
+        """Build BM25 inverted index from scratch, replacing the current corpus."""
+        self._update(images, REBUILD)
+    
+    def add_documents(self, images: List[ImageItem]) -> None:
+        """Append images to the current index without re-tokenizing the corpus."""
+        self._update(images, APPEND)
+    
+    def update_documents(self, images: List[ImageItem]) -> None:
+        """Add new images and replace indexed images that share their id."""
+        self._update(images, UPSERT)
+    
+    def load_index(self, path: str, images: Sequence[ImageItem], catalog_checksum: Optional[str]) -> bool:
+        """Adopt a persisted index if it was built for this exact catalog."""
+        if not catalog_checksum:
+            return False
+        try:
+            index = InvertedIndex.load(path, catalog_checksum)
+        except FileNotFoundError:
+            return False
+        except (OSError, CatalogCacheError) as e:
+            print(f"Persisted search index not used: {e}")
+            return False
+        if index.doc_count != len(images):
+            return False
+        
+        started = perf_counter()
+        ids = _image_ids(images)
+        with self._write_lock:
+            # Newer than anything published, so cached results are dropped
+            index.version = max(index.version, self.version + 1)
+            self.index = index
+            self._images = compact(images)
+            self._doc_ids = {img_id: doc_id for doc_id, img_id in enumerate(ids)}
+            self._publish()
+        INDEX_BUILD_SECONDS.since(started, mode="load")
+        return True
+    
+    def save_index(self, path: str, images: Sequence[ImageItem], catalog_checksum: str) -> bool:
+        """Persist the index for a saved catalog, in that catalog's order.
+        
+        If incremental updates left the index in a different order (or with
+        replaced documents), it is first remapped to match the catalog and
+        the remapped index is published, so ties rank in catalog order.
+        """
+        ids = _image_ids(images)
+        with self._write_lock:
+            if self.index is None:
+                return False
+            
+            order = [self._doc_ids.get(img_id) for img_id in ids]
+            if None in order or len(set(order)) != len(order):
+                print("Search index does not match the catalog, not persisting it")
+                return False
+            
+            if order != list(range(self.index.doc_count)):
+                self.index = self.index.reordered(order)
+                self._images = compact(images)
+                self._doc_ids = {img_id: doc_id for doc_id, img_id in enumerate(ids)}
+                self._publish()
             
-        self.images = images
-        corpus = [self._tokenize(img) for img in images]
-        self.bm25 = BM25Okapi(corpus, k1=1.2, b=0.75)
+            self.index.save(path, self.snapshot.index, catalog_checksum)
+        return True
     
     def search(self, query: str) -> Tuple[List[ImageItem], Dict[str, float]]:
-        """Search with BM25 scoring using rank-bm25 library."""
-        if not query.strip() or not self.bm25:
-            return [], {}
+        """Search with BM25 scoring, returning every result fully ordered."""
+        return self.rank(query).all()
+    
+    def rank(self, query: str, filters: Filters = NO_FILTERS) -> "RankedResults":
+        """Score and boost matching documents without ordering them.
         
-        query_tokens = self._normalize(query)
-        if not query_tokens:
-            return [], {}
+        With ``filters``, documents failing them are skipped before scoring.
+        """
+        snapshot = self.snapshot
+        version, key = self._cache_key(snapshot, query, filters)
+        ranked = self.cache.get(version, key)
+        if ranked is None:
+            ranked = self._ranked(snapshot, self._rank_hits(snapshot, query, self._allowed(snapshot, filters)))
+            self.cache.put(version, key, ranked, ranked.total)
+        return ranked
+    
+    def search_many(self, queries: Sequence[str]) -> List[Tuple[List[ImageItem], Dict[str, float]]]:
+        """``search`` for many queries in one pass."""
+        return [ranked.all() for ranked in self.rank_many(queries)]
+    
+    def rank_many(self, queries: Sequence[str]) -> List["RankedResults"]:
+        """``rank`` for many queries against one snapshot, scoring each distinct query once."""
+        snapshot = self.snapshot
+        version, keys, results, misses = self._batch_lookup(snapshot, queries)
+        if misses:
+            hits = self._rank_many_hits(snapshot, list(misses.values()))
+            self._batch_store(snapshot, version, misses, hits, results)
+        return [results[key] for key in keys]
+    
+    async def build_index_async(self, images: Sequence[ImageItem]) -> None:
+        """``build_index`` run on the configured executor."""
+        await self._update_async(images, REBUILD)
+    
+    async def add_documents_async(self, images: List[ImageItem]) -> None:
+        """``add_documents`` run on the configured executor."""
+        await self._update_async(images, APPEND)
+    
+    async def update_documents_async(self, images: List[ImageItem]) -> None:
+        """``update_documents`` run on the configured executor."""
+        await self._update_async(images, UPSERT)
+    
+    async def save_index_async(self, path: str, images: Sequence[ImageItem], catalog_checksum: str) -> bool:
+        """``save_index`` run off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.save_index, path, images, catalog_checksum)
+    
+    async def rank_async(self, query: str, filters: Filters = NO_FILTERS) -> "RankedResults":
+        """``rank`` run on the configured executor."""
+        if self.executor == "inline":
+            return self.rank(query, filters)
         
-        # Get BM25 scores from library
-        scores = self.bm25.get_scores(query_tokens)
+        snapshot = self.snapshot
+        version, key = self._cache_key(snapshot, query, filters)
+        ranked = self.cache.get(version, key)
+        if ranked is not None:
+            return ranked
         
-        # Apply custom boosting and filter results
-        scored_results = []
-        for i, (img, score) in enumerate(zip(self.images, scores)):
-            if score > 0:
-                boosted_score = self._boost_score(query, img, score)
-                scored_results.append((img, boosted_score))
+        hits, = await self._rank_many_hits_async(snapshot, [query], filters)
+        ranked = self._ranked(snapshot, hits)
+        self.cache.put(version, key, ranked, ranked.total)
+        return ranked
+    
+    async def rank_many_async(self, queries: Sequence[str]) -> List["RankedResults"]:
+        """``rank_many`` run on the configured executor, as a single task."""
+        if self.executor == "inline":
+            return self.rank_many(queries)
+        
+        snapshot = self.snapshot
+        version, keys, results, misses = self._batch_lookup(snapshot, queries)
+        if misses:
+            hits = await self._rank_many_hits_async(snapshot, list(misses.values()))
+            self._batch_store(snapshot, version, misses, hits, results)
+        return [results[key] for key in keys]
+    
+    async def _rank_many_hits_async(
+        self, snapshot: Optional[SearchSnapshot], queries: List[str], filters: Filters = NO_FILTERS
+    ) -> List["RankedHits"]:
+        if not snapshot:
+            # Nothing indexed yet; the service itself cannot be shipped to workers
+            return [RankedHits([], 0.0, 0.0) for _ in queries]
+        
+        loop = asyncio.get_running_loop()
+        if self.executor == "thread":
+            return await loop.run_in_executor(self._get_pool(), self._rank_many_hits, snapshot, queries, filters)
         
-        if not scored_results:
-            return [], {}
+        # Workers keep the last snapshot they were sent and only receive
+        # a new one after a rebuild has been published
+        version = snapshot.index.version
+        hits = await loop.run_in_executor(self._get_pool(), _worker_rank, version, queries, filters)
+        if hits is None:
+            payload = await loop.run_in_executor(None, self._snapshot_payload, snapshot)
+            hits = await loop.run_in_executor(self._get_pool(), _worker_install_and_rank, payload, queries, filters)
+        return hits
+    
+    def _update(self, images: Sequence[ImageItem], mode: str) -> None:
+        if images:
+            started = perf_counter()
+            self._apply(images, [self._tokenize(img) for img in images], mode)
+            INDEX_BUILD_SECONDS.since(started, mode=mode)
+    
+    async def _update_async(self, images: Sequence[ImageItem], mode: str) -> None:
+        if not images or self.executor == "inline":
+            self._update(images, mode)
+            return
         
-        # Sort by score
-        scored_results.sort(key=lambda x: x[1], reverse=True)
+        started = perf_counter()
+        loop = asyncio.get_running_loop()
+        if self.executor == "thread":
+            corpus = await loop.run_in_executor(self._get_pool(), _tokenize_all, self, images)
+        else:
+            # Tokenize in parallel chunks across worker processes
+            chunk_size = max(1, -(-len(images) // (self._pool_size() * 4)))
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(self._get_pool(), _worker_tokenize, images[i:i + chunk_size])
+                for i in range(0, len(images), chunk_size)
+            ))
+            corpus = [tokens for chunk in chunks for tokens in chunk]
         
-        # Normalize scores to 0.01-1.0 range
-        if len(scored_results) > 1:
-            max_score = scored_results[0][1]
-            min_score = scored_results[-1][1]
-            score_range = max_score - min_score
+        # Postings updates run off the event loop too; queries keep using
+        # the previous snapshot until the new one is swapped in
+        await loop.run_in_executor(None, self._apply, images, corpus, mode)
+        INDEX_BUILD_SECONDS.since(started, mode=mode)
+    
+    def _apply(self, images: Sequence[ImageItem], corpus: List[List[List[str]]], mode: str) -> None:
+        """Add tokenized images to the index and publish a new snapshot."""
+        with self._write_lock:
+            if mode == UPSERT and self.index is not None:
+                # Tombstone the indexed versions of replaced images
+                for img in images:
+                    doc_id = self._doc_ids.get(img.id)
+                    if doc_id is not None:
+                        self.index.remove(doc_id, self._tokenize(self._images[doc_id]))
+                
+                if len(self.index.deleted) > COMPACT_DELETED_RATIO * self.index.doc_count:
+                    live = [img for doc_id, img in enumerate(self._images) if doc_id not in self.index.deleted]
+                    corpus = [self._tokenize(img) for img in live] + corpus
+                    images = live + images
+                    mode = REBUILD
             
-            if score_range > 0:
-                normalized_scores = {
-                    img.id: round(max(0.01, (score - min_score) / score_range), 3)
-                    for img, score in scored_results
-                }
+            if mode == REBUILD or self.index is None:
+                index = InvertedIndex(k1=1.2, b=0.75)
+                index.version = self.version
+                self.index = index
+                # Held in columnar form; pydantic items are only built for hits
+                self._images = compact(images)
+                self._doc_ids = {}
             else:
-                normalized_scores = {img.id: 1.0 for img, _ in scored_results}
-        else:
-            normalized_scores = {scored_results[0][0].id: 1.0}
+                if not isinstance(self._images, CompactCatalog):
+                    self._images = CompactCatalog(self._images)
+                self._images.extend(images)
+            
+            doc_id = self.index.doc_count
+            self.index.add(corpus)
+            for img_id in _image_ids(images):
+                self._doc_ids[img_id] = doc_id
+                doc_id += 1
+            self._publish()
+    
+    def _publish(self) -> None:
+        """Swap in a snapshot of the current index; callers hold the write lock."""
+        index = self.index.snapshot()
+        vectors = VectorScorer(index) if self.scorer == "numpy" else None
+        self.snapshot = SearchSnapshot(index, self._images, vectors)
+        self.cache.invalidate(self.version)
+    
+    def _rank_hits(
+        self, snapshot: Optional[SearchSnapshot], query: str, allowed: Optional[bytes] = None
+    ) -> "RankedHits":
+        """Score and boost matching documents, returning doc-id hits.
+        
+        ``allowed`` is a bitmap of the documents that may match (see
+        ``_allowed``); the others are neither scored nor boosted. Quoted
+        phrases in the query narrow it further to documents containing them.
+        """
+        if not query.strip() or not snapshot or allowed == b"":
+            return RankedHits([], 0.0, 0.0)
+        
+        started = perf_counter()
+        query_tokens = self._normalize(query)
+        phrases = self._phrases(query)
+        SEARCH_STAGE_SECONDS.since(started, stage="tokenize")
+        if not query_tokens:
+            return RankedHits([], 0.0, 0.0)
+        
+        if phrases:
+            started = perf_counter()
+            allowed = self._phrase_allowed(snapshot, phrases, allowed)
+            SEARCH_STAGE_SECONDS.since(started, stage="phrase")
+            if allowed == b"":
+                return RankedHits([], 0.0, 0.0)
         
-        return [img for img, _ in scored_results], normalized_scores
+        started = perf_counter()
+        if snapshot.vectors is not None:
+            scores = snapshot.vectors.score(query_tokens)
+            SEARCH_STAGE_SECONDS.since(started, stage="score")
+            started = perf_counter()
+            hits = RankedHits(*snapshot.vectors.rank(scores, query_tokens, allowed))
+            SEARCH_STAGE_SECONDS.since(started, stage="boost")
+            return hits
+        
+        # Only documents in the query terms' postings are scored
+        scores = snapshot.index.score(query_tokens, allowed)
+        SEARCH_STAGE_SECONDS.since(started, stage="score")
+        started = perf_counter()
+        # Boosts come from the positions of the documents holding every
+        # query token, so the other hits cost a dict lookup
+        boosts = snapshot.index.boosts(query_tokens, allowed)
+        
+        # Apply boosting and filter results, in catalog order so that
+        # stable ordering breaks ties the same way as a full scan
+        hits = []
+        min_score = max_score = 0.0
+        for doc_id in sorted(scores):
+            score = scores[doc_id]
+            if score > 0:
+                boosted_score = score * boosts.get(doc_id, 1.0)
+                if not hits or boosted_score > max_score:
+                    max_score = boosted_score
+                if not hits or boosted_score < min_score:
+                    min_score = boosted_score
+                hits.append((doc_id, boosted_score))
+        
+        SEARCH_STAGE_SECONDS.since(started, stage="boost")
+        return RankedHits(hits, min_score, max_score)
     
-    def _tokenize(self, image: ImageItem) -> List[str]:
-        """Extract and tokenize text from image metadata."""
-        text_parts = image.keywords * 2  # Double weight for keywords
+    def _rank_many_hits(
+        self, snapshot: Optional[SearchSnapshot], queries: List[str], filters: Filters = NO_FILTERS
+    ) -> List["RankedHits"]:
+        """``_rank_hits`` for several queries; with the vector scorer, one sparse product."""
+        allowed = self._allowed(snapshot, filters)
+        if (
+            len(queries) < 2 or not snapshot or snapshot.vectors is None or allowed == b""
+            or any(self._phrases(query) for query in queries)
+        ):
+            # Phrases restrict each query to different documents
+            return [self._rank_hits(snapshot, query, allowed) for query in queries]
         
-        if image.title:
-            text_parts.extend([image.title] * 2)  # Double weight for title
+        started = perf_counter()
+        tokens = [self._normalize(query) for query in queries]
+        SEARCH_STAGE_SECONDS.since(started, stage="tokenize")
+        ranked = snapshot.vectors.rank_batch(tokens, allowed)
+        return [RankedHits(*hits) for hits in ranked]
+    
+    def _batch_lookup(
+        self, snapshot: Optional[SearchSnapshot], queries: Sequence[str]
+    ) -> Tuple[int, List[Tuple], Dict[Tuple, "RankedResults"], Dict[Tuple, str]]:
+        """Cache keys for ``queries``, cached results by key and the distinct misses."""
+        version = snapshot.index.version if snapshot else 0
+        keys: List[Tuple] = []
+        results: Dict[Tuple, RankedResults] = {}
+        misses: Dict[Tuple, str] = {}
+        for query in queries:
+            _, key = self._cache_key(snapshot, query)
+            keys.append(key)
+            if key in results or key in misses:
+                continue
+            ranked = self.cache.get(version, key)
+            if ranked is None:
+                misses[key] = query
+            else:
+                results[key] = ranked
+        return version, keys, results, misses
+    
+    def _batch_store(
+        self,
+        snapshot: Optional[SearchSnapshot],
+        version: int,
+        misses: Dict[Tuple, str],
+        hits: List["RankedHits"],
+        results: Dict[Tuple, "RankedResults"]
+    ) -> None:
+        """Turn hits for the missed queries into results, caching single-query scores."""
+        batched = len(misses) > 1 and snapshot is not None and snapshot.vectors is not None
+        for key, query_hits in zip(misses, hits):
+            ranked = results[key] = self._ranked(snapshot, query_hits)
+            # Batched sums can differ from single queries in the last bit;
+            # keep them out of the cache so /search stays deterministic
+            if not batched:
+                self.cache.put(version, key, ranked, ranked.total)
+    
+    def _cache_key(
+        self, snapshot: Optional[SearchSnapshot], query: str, filters: Filters = NO_FILTERS
+    ) -> Tuple[int, Tuple]:
+        """Index version plus normalized tokens and quoted phrases, which is
+        all that scores and boosts depend on."""
+        version = snapshot.index.version if snapshot else 0
+        key = (tuple(self._normalize(query)), tuple(tuple(phrase) for phrase in self._phrases(query)))
+        return version, key + (filters,) if filters.active else key
+    
+    def _allowed(self, snapshot: Optional[SearchSnapshot], filters: Filters) -> Optional[bytes]:
+        """Bitmap of the snapshot's documents passing ``filters``; None when unfiltered.
         
-        if image.description:
-            text_parts.append(image.description)  # Include full description
+        An empty bitmap means nothing passes.
+        """
+        if not filters.active or not snapshot:
+            return None
+        mask = facet_index_for(snapshot.images).allowed(filters)
+        return bitmap(mask, len(snapshot.images)) if mask else b""
+    
+    def _phrase_allowed(
+        self, snapshot: SearchSnapshot, phrases: List[List[str]], allowed: Optional[bytes]
+    ) -> bytes:
+        """``allowed`` narrowed to the documents containing every phrase."""
+        for phrase in phrases:
+            if snapshot.vectors is not None:
+                docs = snapshot.vectors.phrase_docs(phrase, allowed)
+            else:
+                docs = snapshot.index.phrase_docs(phrase, allowed)
+            if not docs:
+                return b""
+            allowed = bitmap(bitset(docs, len(snapshot.images)), len(snapshot.images))
+        return allowed
+    
+    def _ranked(self, snapshot: Optional[SearchSnapshot], hits: "RankedHits") -> "RankedResults":
+        if not hits.hits:
+            return RankedResults([], ())
+        return RankedResults(hits.hits, snapshot.images, hits.min_score, hits.max_score)
+    
+    def _snapshot_payload(self, snapshot: SearchSnapshot) -> Tuple[int, bytes]:
+        """Pickle a snapshot once per version for shipping to worker processes."""
+        version = snapshot.index.version
+        payload = self._payload
+        if payload is None or payload[0] != version:
+            # The writer mutates shared postings in place, so pickle under its lock
+            with self._write_lock:
+                payload = (version, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+            self._payload = payload
+        return payload
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.executor == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="search")
+        return self._pool
+    
+    def _pool_size(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+    
+    def _tokenize(self, image: ImageItem) -> List[List[str]]:
+        """Tokenize image metadata into index segments: title, description, then each keyword.
         
-        return self._normalize(" ".join(text_parts))
+        The index weights title and keyword tokens double.
+        """
+        return [self._normalize(image.title), self._normalize(image.description)] + [
+            self._normalize(keyword) for keyword in image.keywords
+        ]
     
     def _normalize(self, text: str) -> List[str]:
         """Normalize and tokenize text."""
@@ -84,23 +513,156 @@ class SearchService:
         tokens = re.findall(r'[a-z0-9]+', text.lower())
         return [t for t in tokens if t not in self._stop_words and (len(t) > 1 or t.isdigit())]
     
-    def _boost_score(self, query: str, image: ImageItem, base_score: float) -> float:
-        """Apply custom relevance boosts."""
-        if base_score == 0:
-            return base_score
-        
-        query_lower = query.lower().strip()
-        boost = 1.0
-        
-        # Keyword exact match boost
-        for keyword in image.keywords:
-            if query_lower == keyword.lower():
-                boost = max(boost, 5.0)
-            elif query_lower in keyword.lower():
-                boost = max(boost, 3.0)
-        
-        # Title match boost
-        if image.title and query_lower in image.title.lower():
-            boost = max(boost, 2.0)
+    def _phrases(self, query: str) -> List[List[str]]:
+        """Normalized tokens of each double-quoted phrase in a query."""
+        phrases = (self._normalize(text) for text in re.findall(r'"([^"]*)"', query))
+        return [tokens for tokens in phrases if tokens]
+
+
+class RankedResults:
+    """Boosted hits for one query, ordered lazily.
+
+    Hits are (doc id, score) pairs into the snapshot's images; items are
+    only built for the hits a caller reads. Pages are served from a bounded
+    heap; the full ordering is only built when every result is needed
+    (e.g. for history) and is then reused. Scores are normalized to the
+    0.01-1.0 range using the min/max over all hits, so any page matches the
+    fully sorted output.
+    """
+
+    def __init__(
+        self,
+        hits: List[Tuple[int, float]],
+        images: Sequence[ImageItem],
+        min_score: float = 0.0,
+        max_score: float = 0.0
+    ):
+        self._hits = hits
+        self._images = images
+        self._ordered = None
+        self._facets: Optional[Tuple[int, FacetCounts]] = None
+        self.total = len(hits)
+        self.min_score = min_score
+        self.max_score = max_score
+    
+    def top(self, k: int) -> List[Tuple[ImageItem, float]]:
+        """Return the k best hits, highest score first."""
+        if self._ordered is None and k < self.total:
+            started = perf_counter()
+            # nsmallest is stable, so ties keep catalog order like sorted()
+            hits = heapq.nsmallest(k, self._hits, key=_negated_score)
+            SEARCH_STAGE_SECONDS.since(started, stage="sort")
+        else:
+            hits = self._ordered_hits()[:k]
+        images = self._images
+        return [(images[doc_id], score) for doc_id, score in hits]
+    
+    def page(self, start: int, end: int) -> List[ImageItem]:
+        """Return the ordered images in [start, end)."""
+        return [img for img, _ in self.top(end)[start:end]]
+    
+    def page_hits(self, start: int, end: int) -> List[Tuple[ImageItem, float]]:
+        """Return the ordered images in [start, end) with normalized scores."""
+        return [(img, self.normalize(score)) for img, score in self.top(end)[start:end]]
+    
+    def normalize(self, score: float) -> float:
+        """Normalize a boosted score to the 0.01-1.0 range."""
+        score_range = self.max_score - self.min_score
+        if score_range > 0:
+            return round(max(0.01, (score - self.min_score) / score_range), 3)
+        return 1.0
+    
+    def scores(self) -> Dict[str, float]:
+        """Normalized scores for every hit, keyed by image id in rank order."""
+        hits = self._ordered_hits()
+        started = perf_counter()
+        image_id = _image_id_getter(self._images)
+        scores = {image_id(doc_id): self.normalize(score) for doc_id, score in hits}
+        SEARCH_STAGE_SECONDS.since(started, stage="normalize")
+        return scores
+    
+    def all(self) -> Tuple[List[ImageItem], Dict[str, float]]:
+        """Return every hit in rank order with normalized scores."""
+        images = self._images
+        return [images[doc_id] for doc_id, _ in self._ordered_hits()], self.scores()
+    
+    def ids(self) -> Tuple[List[str], Dict[str, float]]:
+        """Return every hit's image id in rank order with normalized scores."""
+        image_id = _image_id_getter(self._images)
+        return [image_id(doc_id) for doc_id, _ in self._ordered_hits()], self.scores()
+    
+    def facets(self, limit: int = 10) -> FacetCounts:
+        """Keyword and year counts over every hit, kept for the next page."""
+        if not self.total:
+            return FacetCounts([], [])
+        cached = self._facets
+        if cached is None or cached[0] != limit:
+            mask = bitset((doc_id for doc_id, _ in self._hits), len(self._images))
+            cached = self._facets = (limit, facet_index_for(self._images).facets(mask, limit))
+        return cached[1]
+    
+    def iter_hits(self) -> Iterator[Tuple[ImageItem, float]]:
+        """Yield every hit in rank order with its normalized score.
         
-        return base_score * boost
\ No newline at end of file
+        Items are built one at a time as the caller consumes them.
+        """
+        images = self._images
+        for doc_id, score in self._ordered_hits():
+            yield images[doc_id], self.normalize(score)
+    
+    def _ordered_hits(self) -> List[Tuple[int, float]]:
+        if self._ordered is None:
+            started = perf_counter()
+            self._ordered = sorted(self._hits, key=itemgetter(1), reverse=True)
+            SEARCH_STAGE_SECONDS.since(started, stage="sort")
+        return self._ordered
+
+
+def _negated_score(hit: Tuple[int, float]) -> float:
+    return -hit[1]
+
+
+def _image_id_getter(images: Sequence[ImageItem]) -> Callable[[int], str]:
+    """Image id at a position, read from the id column of a ``CatalogView``."""
+    if isinstance(images, CatalogView):
+        return partial(images.string, "id")
+    return lambda position: images[position].id
+
+
+def _image_ids(images: Sequence[ImageItem]) -> List[str]:
+    return images.ids() if isinstance(images, CatalogView) else [img.id for img in images]
+
+
+# Process-pool workers: each keeps its own service holding the most recent
+# snapshot it was sent, keyed by index version
+_worker_service: Optional[SearchService] = None
+
+
+def _tokenize_all(service: SearchService, images: List[ImageItem]) -> List[List[List[str]]]:
+    return [service._tokenize(img) for img in images]
+
+
+def _worker_tokenize(images: List[ImageItem]) -> List[List[List[str]]]:
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = SearchService()
+    return _tokenize_all(_worker_service, images)
+
+
+def _worker_rank(version: int, queries: List[str], filters: Filters = NO_FILTERS) -> Optional[List[RankedHits]]:
+    service = _worker_service
+    if service is None or service.version != version:
+        return None
+    return service._rank_many_hits(service.snapshot, queries, filters)
+
+
+def _worker_install_and_rank(
+    payload: Tuple[int, bytes], queries: List[str], filters: Filters = NO_FILTERS
+) -> List[RankedHits]:
+    global _worker_service
+    version, data = payload
+    if _worker_service is None or _worker_service.version != version:
+        service = SearchService()
+        service.snapshot = pickle.loads(data)
+        _worker_service = service
+    return _worker_service._rank_many_hits(_worker_service.snapshot, queries, filters)
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models.schemas import HistoryEntry, PaginatedHistory
+from .history_service import HistoryService
+
+# Methods workers may call on the history owner
+HISTORY_METHODS = ("add_search_ids", "get_paginated", "get_entry", "delete_entry", "get_suggestions", "stats")
+# Longest request line; a search recording every hit sends all result ids
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+# Methods whose requests or responses can hold every result id of a search;
+# they are encoded and decoded on the default executor
+BULK_METHODS = ("add_search_ids", "get_entry")
+# Methods safe to send twice; a write that timed out may still have been applied
+RETRIED_METHODS = ("get_paginated", "get_entry", "get_suggestions", "stats")
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identity of a file's current contents; cache and index files are
+    replaced by rename, so any rewrite changes the inode."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class HistoryServer:
+    """Serves a ``HistoryService`` to worker processes over a Unix socket.
+
+    The loader process owns the history log; workers send one JSON request
+    per line (``{"method": ..., "args": [...]}``) and get one JSON response
+    line back, so every write goes through a single writer in order.
+    Requests run on the default executor, keeping the loader's event loop
+    free while a large search is recorded.
+    """
+
+    def __init__(self, history: HistoryService, path: str):
+        self.history = history
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left behind by a previous owner
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path, limit=MAX_MESSAGE_BYTES)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Closing the connections ends their handlers at the next read
+            for writer in self._clients.values():
+                writer.close()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(await loop.run_in_executor(None, self._respond, line))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            # ValueError: a request over MAX_MESSAGE_BYTES, the stream cannot resync
+            print(f"History client disconnected: {e}")
+        finally:
+            del self._clients[task]
+            writer.close()
+
+    def _respond(self, line: bytes) -> bytes:
+        return json.dumps(self._call(line)).encode() + b"\n"
+
+    def _call(self, line: bytes) -> Dict[str, Any]:
+        try:
+            request = json.loads(line)
+            method = request["method"]
+            if method not in HISTORY_METHODS:
+                return {"error": f"Unknown method {method}"}
+            result = getattr(self.history, method)(*request.get("args", []))
+        except Exception as e:
+            return {"error": str(e)}
+
+        if isinstance(result, (PaginatedHistory, HistoryEntry)):
+            result = result.model_dump()
+        return {"result": result}
+
+
+class HistoryClient:
+    """Asynchronous ``HistoryService`` stand-in for workers, forwarding to the owner.
+
+    Every method but the vocabulary setters and ``close`` is a coroutine doing
+    one round trip over the owner's socket, so a slow owner delays only the
+    requests waiting on history, never the event loop. Calls share one
+    connection per event loop and are sent one at a time. While the owner
+    is unreachable, reads return nothing and writes are dropped with a
+    message rather than failing the request. Only reads are retried, as a
+    write that timed out may still have been applied.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def add_search_ids(self, query: str, result_ids: List[str], scores: Dict[str, float]) -> Optional[str]:
+        return await self._call("add_search_ids", query, result_ids, scores)
+
+    async def get_paginated(self, page: int = 1, page_size: int = 10) -> PaginatedHistory:
+        result = await self._call("get_paginated", page, page_size)
+        if result is None:
+            return PaginatedHistory(items=[], total=0, page=page, page_size=page_size)
+        return PaginatedHistory(**result)
+
+    async def get_entry(self, history_id: str) -> Optional[HistoryEntry]:
+        result = await self._call("get_entry", history_id)
+        return HistoryEntry(**result) if result is not None else None
+
+    async def delete_entry(self, history_id: str) -> bool:
+        return bool(await self._call("delete_entry", history_id))
+
+    async def get_suggestions(self, query: str, limit: int = 5) -> List[str]:
+        return await self._call("get_suggestions", query, limit) or []
+
+    async def stats(self) -> Dict[str, int]:
+        return await self._call("stats") or {"entries": 0, "result_ids": 0, "pending_records": 0, "log_records": 0}
+
+    def set_vocabulary(self, images) -> None:
+        """The owner builds the vocabulary from its own catalog."""
+
+    def extend_vocabulary(self, images) -> None:
+        """The owner builds the vocabulary from its own catalog."""
+
+    def close(self) -> None:
+        self._disconnect()
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams and locks belong to the loop that created them
+            self._disconnect()
+            self._lock = asyncio.Lock()
+            self._loop = loop
+
+        bulk = method in BULK_METHODS
+        if bulk:
+            request = await loop.run_in_executor(None, _encode_request, method, args)
+        else:
+            request = _encode_request(method, args)
+
+        attempts = 2 if method in RETRIED_METHODS else 1
+        async with self._lock:
+            # One reconnect covers an owner that restarted since the last call
+            for attempt in range(attempts):
+                try:
+                    line = await asyncio.wait_for(self._exchange(request), self.timeout)
+                    break
+                except (OSError, asyncio.TimeoutError, ValueError) as e:
+                    # ValueError: a response over MAX_MESSAGE_BYTES
+                    self._disconnect()
+                    if attempt == attempts - 1:
+                        print(f"History owner unavailable at {self.path}: {e!r}")
+                        return None
+
+        response = await loop.run_in_executor(None, json.loads, line) if bulk else json.loads(line)
+        if "error" in response:
+            print(f"History {method} failed: {response['error']}")
+            return None
+        return response["result"]
+
+    async def _exchange(self, request: bytes) -> bytes:
+        if self._reader is not None and self._reader.at_eof():
+            # The owner closed the connection since the last call (a
+            # restart); reconnecting first lets writes through unretried
+            self._disconnect()
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=MAX_MESSAGE_BYTES)
+        self._writer.write(request)
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("history owner closed the connection")
+        return line
+
+    def _disconnect(self) -> None:
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except RuntimeError:  # its event loop has already been closed
+                pass
+        self._reader = self._writer = None
+
+
+def _encode_request(method: str, args: Tuple) -> bytes:
+    return json.dumps({"method": method, "args": args}).encode() + b"\n"
@@ -0,0 +1,109 @@
+import bisect
+import heapq
+import math
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from ..models.schemas import ImageItem
+
+# A search this long ago counts half as much as one made now
+FRECENCY_HALF_LIFE = 7 * 86400
+
+
+class PrefixIndex:
+    """Ranked strings held in a sorted array for prefix lookups.
+
+    Keys are kept sorted by their lowercased form, so all strings starting
+    with a prefix form one contiguous range found with two bisections.
+    Inserts and deletes shift the array (a memmove), which stays cheap far
+    beyond the sizes a history or vocabulary reaches. Writers must not run
+    alongside readers; every key in the array has a rank at all times.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[str, str]] = []
+        self._ranks: Dict[str, Hashable] = {}
+
+    def __len__(self) -> int:
+        return len(self._ranks)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._ranks
+
+    def rank(self, text: str) -> Optional[Hashable]:
+        return self._ranks.get(text)
+
+    def set(self, text: str, rank: Hashable) -> None:
+        """Insert ``text`` or update its rank."""
+        new = text not in self._ranks
+        self._ranks[text] = rank
+        if new:
+            bisect.insort(self._keys, (text.lower(), text))
+
+    def discard(self, text: str) -> None:
+        if text not in self._ranks:
+            return
+        key = (text.lower(), text)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+        del self._ranks[text]
+
+    def top(self, prefix: str, limit: int, exclude: Iterable[str] = ()) -> List[str]:
+        """Best ranked strings starting with ``prefix``, ignoring case and ``exclude``."""
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+
+        keys = self._keys
+        lo = bisect.bisect_left(keys, (prefix,))
+        hi = bisect.bisect_left(keys, (prefix[:-1] + chr(ord(prefix[-1]) + 1),), lo)
+        skip = {text.lower() for text in exclude}
+        candidates = (keys[i][1] for i in range(lo, hi) if keys[i][0] not in skip)
+        return heapq.nlargest(limit, candidates, key=self._ranks.__getitem__)
+
+
+def frecency(previous: Optional[float], timestamp: int) -> float:
+    """Fold one search at ``timestamp`` into a frecency score.
+
+    The score is ``log2(sum(2 ** -(age / half_life)))`` shifted by
+    ``timestamp / half_life``; scores stay comparable without re-decaying
+    every entry as time passes, and both recency and repetition raise them.
+    """
+    now = timestamp / FRECENCY_HALF_LIFE
+    if previous is None:
+        return now
+    return now + math.log2(2.0 ** min(previous - now, 64.0) + 1.0)
+
+
+def catalog_vocabulary(images: Iterable[ImageItem]) -> PrefixIndex:
+    """Index catalog keywords and titles, ranked by how many images use them."""
+    return extended_vocabulary(PrefixIndex(), images)
+
+
+def extended_vocabulary(vocabulary: PrefixIndex, images: Iterable[ImageItem]) -> PrefixIndex:
+    """A copy of a ``catalog_vocabulary`` that also counts ``images``.
+
+    The given index is left as it is, since suggestions may be reading it.
+    """
+    keys = vocabulary._keys
+    counts = dict(vocabulary._ranks)
+    canonical: Dict[str, str] = {}
+    for img in images:
+        for text in set(img.keywords) | {img.title}:
+            text = text.strip()
+            if not text:
+                continue
+            # One spelling per case-insensitive term, the first one seen
+            lower = text.lower()
+            spelling = canonical.get(lower)
+            if spelling is None:
+                i = bisect.bisect_left(keys, (lower,))
+                spelling = keys[i][1] if i < len(keys) and keys[i][0] == lower else text
+                canonical[lower] = spelling
+            counts[spelling] = counts.get(spelling, 0) + 1
+
+    index = PrefixIndex()
+    # Already sorted runs, which sorted() merges in linear time
+    index._keys = sorted(keys + sorted((text.lower(), text) for text in counts.keys() - vocabulary._ranks.keys()))
+    index._ranks = counts
+    return index
@@ -0,0 +1,267 @@
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional dependencies, only needed for SEARCH_SCORER=numpy
+    np = None
+    sparse = None
+
+from .metrics import SEARCH_STAGE_SECONDS
+from .search_index import (
+    DESCRIPTION_PHRASE_BOOST, EXACT_KEYWORD_BOOST, FIRST_KEYWORD_SEGMENT, KEYWORD_PHRASE_BOOST, MAX_OFFSET,
+    MAX_SEGMENT, POSITION_BITS, PROXIMITY_BOOST, PROXIMITY_WINDOW, TITLE_PHRASE_BOOST, TITLE_SEGMENT, IndexSnapshot
+)
+
+
+def numpy_available() -> bool:
+    return np is not None and sparse is not None
+
+
+class VectorScorer:
+    """BM25 plus boosts over a CSR term-document matrix.
+
+    Each row holds a term's precomputed BM25 weight in every live document
+    of an ``IndexSnapshot``, so a query is the sum of a few sparse rows. The
+    weights are computed with the same floating point operations, in the
+    same order, as ``IndexSnapshot.score`` and boosts are the factors
+    ``IndexSnapshot.boosts`` finds, so single queries produce identical
+    scores.
+
+    Positions are held per term as sorted ``(doc id << 32) | position``
+    keys, so phrases are matched by looking up shifted keys of one token
+    among the next token's keys for all documents at once.
+    """
+
+    def __init__(self, index: IndexSnapshot):
+        self.doc_count = index.doc_count
+        self._vocabulary = index.vocabulary
+        self._term_count = index.term_count
+
+        live = np.ones(self.doc_count, dtype=bool)
+        if index.deleted:
+            live[np.fromiter(index.deleted, dtype=np.int64)] = False
+
+        rows, docs, tfs, keys = [], [], [], []
+        for term_id in range(self._term_count):
+            term_docs, term_tfs = index.postings(term_id)
+            term_docs = np.frombuffer(term_docs, dtype=np.uint32)
+            term_tfs = np.frombuffer(term_tfs, dtype=np.uint32)
+            # Drop documents appended after the snapshot or removed before it
+            keep = term_docs < self.doc_count
+            keep[keep] = live[term_docs[keep]]
+            rows.append(np.full(int(keep.sum()), term_id, dtype=np.int64))
+            docs.append(term_docs[keep].astype(np.int64))
+            tfs.append(term_tfs[keep].astype(np.float64))
+
+            term_starts, term_positions = index.positions(term_id)
+            term_positions = np.frombuffer(term_positions, dtype=np.uint32)
+            counts = np.diff(np.frombuffer(term_starts, dtype=np.uint32).astype(np.int64), append=len(term_positions))
+            position_keep = np.repeat(keep, counts)
+            # Positions are stored keywords first, so order them within each doc
+            keys.append(np.sort(
+                (np.repeat(term_docs.astype(np.int64), counts)[position_keep] << 32) | term_positions[position_keep]
+            ))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate(tfs) if tfs else np.zeros(0)
+        idf = np.frombuffer(index.idf, dtype=np.float64)
+        norms = np.frombuffer(index.norms, dtype=np.float64)
+        weights = idf[rows] * (tfs * (index.k1 + 1) / (tfs + norms[docs]))
+        self.matrix = sparse.csr_matrix((weights, (rows, docs)), shape=(self._term_count, self.doc_count))
+
+        self._keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        self._key_offsets = np.zeros(self._term_count + 1, dtype=np.int64)
+        np.cumsum([len(term_keys) for term_keys in keys], out=self._key_offsets[1:])
+        segment_offsets, segment_lengths = index.segments()
+        self._segment_offsets = np.frombuffer(segment_offsets, dtype=np.uint32)[:self.doc_count + 1].astype(np.int64)
+        self._segment_lengths = np.frombuffer(segment_lengths, dtype=np.uint16)[:self._segment_offsets[-1]].copy()
+
+    def score(self, query_tokens: List[str]) -> "np.ndarray":
+        """Dense BM25 scores over all documents, summed in query token order."""
+        matrix = self.matrix
+        scores = np.zeros(self.doc_count)
+        for token in query_tokens:
+            term_id = self._vocabulary.get(token)
+            if term_id is None or term_id >= self._term_count:
+                continue
+            start, end = matrix.indptr[term_id], matrix.indptr[term_id + 1]
+            scores[matrix.indices[start:end]] += matrix.data[start:end]
+        return scores
+
+    def score_batch(self, queries: List[List[str]]) -> "sparse.csr_matrix":
+        """BM25 scores of many queries as one sparse product (queries x docs).
+
+        Sums are taken in term order here rather than token order, so scores
+        can differ from ``score`` in the last bit.
+        """
+        rows, cols = [], []
+        for row, query_tokens in enumerate(queries):
+            for token in query_tokens:
+                term_id = self._vocabulary.get(token)
+                if term_id is not None and term_id < self._term_count:
+                    rows.append(row)
+                    cols.append(term_id)
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(queries), self._term_count)
+        )
+        return (counts @ self.matrix).tocsr()
+
+    def rank_batch(
+        self, queries: List[List[str]], allowed: Optional[bytes] = None
+    ) -> List[Tuple[List[Tuple[int, float]], float, float]]:
+        """``rank`` for many queries, scored with one ``score_batch`` product."""
+        started = perf_counter()
+        mask = self._mask(allowed)
+        matrix = self.score_batch(queries)
+        matrix.sort_indices()
+        SEARCH_STAGE_SECONDS.since(started, stage="score")
+        started = perf_counter()
+        ranked = []
+        for row, query_tokens in enumerate(queries):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            doc_ids = matrix.indices[start:end]
+            scores = matrix.data[start:end]
+            positive = scores > 0
+            if mask is not None:
+                positive &= mask[doc_ids]
+            doc_ids, scores = doc_ids[positive], scores[positive]
+            if not len(doc_ids):
+                ranked.append(([], 0.0, 0.0))
+                continue
+            boosted = scores * self.boosts(query_tokens, mask)[doc_ids]
+            ranked.append((list(zip(doc_ids.tolist(), boosted.tolist())), float(boosted.min()), float(boosted.max())))
+        SEARCH_STAGE_SECONDS.since(started, stage="boost")
+        return ranked
+
+    def boosts(self, query_tokens: List[str], mask: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Per-document boost factor, as ``IndexSnapshot.boosts`` gives it.
+
+        Documents outside ``mask`` (see ``_mask``) may be left at 1.
+        """
+        factors = np.ones(self.doc_count)
+        keys = self._token_keys(query_tokens)
+        if keys is None:
+            return factors
+
+        length = len(query_tokens)
+        starts = self._phrase_starts(query_tokens, keys)
+        if len(starts):
+            doc_ids = starts >> 32
+            segments = (starts >> POSITION_BITS) & MAX_SEGMENT
+            phrase_boosts = np.where(
+                segments == TITLE_SEGMENT, TITLE_PHRASE_BOOST, DESCRIPTION_PHRASE_BOOST if length > 1 else 1.0
+            )
+            keyword = segments >= FIRST_KEYWORD_SEGMENT
+            phrase_boosts[keyword] = KEYWORD_PHRASE_BOOST
+            exact = keyword & (starts & MAX_OFFSET == 0)
+            exact[exact] = (
+                self._segment_lengths[self._segment_offsets[doc_ids[exact]] + segments[exact]] == length
+            )
+            phrase_boosts[exact] = EXACT_KEYWORD_BOOST
+            np.maximum.at(factors, doc_ids, phrase_boosts)
+
+        if len(keys) > 1:
+            factors[self._near(list(keys.values()), factors, mask)] = PROXIMITY_BOOST
+        return factors
+
+    def phrase_docs(self, phrase: List[str], allowed: Optional[bytes] = None) -> List[int]:
+        """``IndexSnapshot.phrase_docs`` for all documents at once, as a sorted list."""
+        keys = self._token_keys(phrase)
+        if keys is None:
+            return []
+        doc_ids = _distinct(self._phrase_starts(phrase, keys) >> 32)
+        mask = self._mask(allowed)
+        if mask is not None:
+            doc_ids = doc_ids[mask[doc_ids]]
+        return doc_ids.tolist()
+
+    def rank(
+        self, scores: "np.ndarray", query_tokens: List[str], allowed: Optional[bytes] = None
+    ) -> Tuple[List[Tuple[int, float]], float, float]:
+        """Boosted (doc id, score) hits in doc order with their min and max.
+
+        With an ``allowed`` bitmap only those documents are kept.
+        """
+        positive = scores > 0
+        mask = self._mask(allowed)
+        if mask is not None:
+            positive &= mask
+        doc_ids = np.flatnonzero(positive)
+        if not len(doc_ids):
+            return [], 0.0, 0.0
+        boosted = scores[doc_ids] * self.boosts(query_tokens, mask)[doc_ids]
+        return list(zip(doc_ids.tolist(), boosted.tolist())), float(boosted.min()), float(boosted.max())
+
+    def _token_keys(self, tokens: List[str]) -> Optional[Dict[str, "np.ndarray"]]:
+        """Position keys of each distinct token, or None if one is not indexed."""
+        keys = {}
+        for token in dict.fromkeys(tokens):
+            term_id = self._vocabulary.get(token)
+            if term_id is None or term_id >= self._term_count:
+                return None
+            keys[token] = self._keys[self._key_offsets[term_id]:self._key_offsets[term_id + 1]]
+        return keys
+
+    def _phrase_starts(self, phrase: List[str], keys: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        """Keys of the positions where ``phrase`` starts, in any document."""
+        starts = keys[phrase[0]]
+        for i, token in enumerate(phrase[1:], 1):
+            starts = starts[_contains(keys[token], starts + i)]
+        last = len(phrase) - 1
+        return starts[(starts + last) >> POSITION_BITS == starts >> POSITION_BITS]
+
+    def _near(
+        self, keys: List["np.ndarray"], factors: "np.ndarray", mask: Optional["np.ndarray"]
+    ) -> "np.ndarray":
+        """Doc ids without a phrase boost where one position of every token
+        falls within ``PROXIMITY_WINDOW`` positions of one segment."""
+        doc_ids = _distinct(keys[0] >> 32)
+        for token_keys in keys[1:]:
+            doc_ids = doc_ids[_contains(token_keys >> 32, doc_ids)]
+        keep = factors[doc_ids] == 1.0
+        if mask is not None:
+            keep &= mask[doc_ids]
+        doc_ids = doc_ids[keep]
+        if not len(doc_ids):
+            return doc_ids
+
+        keys = [token_keys[_contains(doc_ids, token_keys >> 32)] for token_keys in keys]
+        merged = np.concatenate(keys)
+        tags = np.repeat(np.arange(len(keys)), [len(token_keys) for token_keys in keys])
+        order = np.argsort(merged, kind="stable")
+        merged, tags = merged[order], tags[order]
+        # At every position, the earliest of each token's latest position so
+        # far; the window holds all tokens if that is recent and in the same
+        # segment (keys agree above the offset bits)
+        earliest = None
+        for tag in range(len(keys)):
+            latest = np.maximum.accumulate(np.where(tags == tag, merged, -1))
+            earliest = latest if earliest is None else np.minimum(earliest, latest)
+        near = (earliest > merged - PROXIMITY_WINDOW) & (earliest >> POSITION_BITS == merged >> POSITION_BITS)
+        return _distinct(merged[near] >> 32)
+
+    def _mask(self, allowed: Optional[bytes]) -> Optional["np.ndarray"]:
+        """Boolean array over documents from an allowed-documents bitmap."""
+        if allowed is None:
+            return None
+        bits = np.unpackbits(np.frombuffer(allowed, dtype=np.uint8), bitorder="little")
+        return bits[:self.doc_count].astype(bool)
+
+
+def _contains(sorted_values: "np.ndarray", values: "np.ndarray") -> "np.ndarray":
+    """Which of ``values`` occur in the sorted array ``sorted_values``."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    found = np.searchsorted(sorted_values, values)
+    np.minimum(found, len(sorted_values) - 1, out=found)
+    return sorted_values[found] == values
+
+
+def _distinct(sorted_values: "np.ndarray") -> "np.ndarray":
+    """A sorted array without its repeats."""
+    keep = np.ones(len(sorted_values), dtype=bool)
+    np.not_equal(sorted_values[1:], sorted_values[:-1], out=keep[1:])
+    return sorted_values[keep]
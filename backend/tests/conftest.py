@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.benchmark import SyntheticCorpus
+from src.routes import api as api_module
+from src.services.catalog_store import CatalogStore
+from src.services.history_service import HistoryService
+from src.services.nasa_service import NASAService
+from src.services.query_cache import QueryCache
+from src.services.search_service import SearchService
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The API router over a synthetic catalog, with a stub NASA API.
+
+    The catalog is already indexed, so no request loads anything. Requests
+    that reach the NASA API are recorded in ``nasa_requests`` and answered
+    with ``nasa_response``.
+    """
+    images = list(SyntheticCorpus(300, 7).images())
+    state = SimpleNamespace(images=images, nasa_requests=[], nasa_response={"collection": {"items": []}})
+
+    def nasa(request):
+        state.nasa_requests.append(request)
+        return httpx.Response(200, json=state.nasa_response)
+
+    nasa_service = NASAService(
+        cache_file=str(tmp_path / "cache.bin"), legacy_cache_file=str(tmp_path / "cache.json"),
+        base_url="https://api.example/search"
+    )
+    client = httpx.AsyncClient(transport=httpx.MockTransport(nasa))
+    monkeypatch.setattr(nasa_service, "_get_client", lambda: client)
+    history_service = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0)
+    search_service = SearchService(executor="inline", cache=QueryCache(max_entries=0))
+    search_service.build_index(images)
+    ready = asyncio.Event()
+    ready.set()
+
+    monkeypatch.setattr(api_module, "nasa_service", nasa_service)
+    monkeypatch.setattr(api_module, "history_service", history_service)
+    monkeypatch.setattr(api_module, "search_service", search_service)
+    monkeypatch.setattr(api_module, "catalog_store", CatalogStore(images))
+    monkeypatch.setattr(api_module, "_search_initialized", True)
+    monkeypatch.setattr(api_module, "_search_ready", ready)
+    monkeypatch.setattr(api_module, "NASA_FALLBACK_MERGE", False)
+
+    app = FastAPI()
+    app.include_router(api_module.router)
+    state.app = app
+    state.module = api_module
+    with TestClient(app) as state.client:
+        yield state
+    history_service.close()
@@ -0,0 +1,159 @@
+import asyncio
+
+from src.services.search_service import SearchService
+
+
+def test_search_pages_rank_order(api):
+    first = api.client.get("/search", params={"q": "mars", "page_size": 5}).json()
+    second = api.client.get("/search", params={"q": "mars", "page_size": 5, "page": 2}).json()
+    ranked = api.module.search_service.rank("mars")
+
+    assert first["total"] == ranked.total > 10
+    assert [img["id"] for img in first["items"] + second["items"]] == [img.id for img in ranked.page(0, 10)]
+    assert list(first["scores"]) == [img.id for img, _ in ranked.top(ranked.total)]
+    assert not api.nasa_requests
+
+
+def test_zero_hit_search_falls_back_to_nasa(api):
+    body = api.client.get("/search", params={"q": "zzyzx"}).json()
+    assert body["total"] == 0
+    assert [r.url.params["q"] for r in api.nasa_requests] == ["zzyzx"]
+
+
+def test_filtered_search_does_not_fall_back(api):
+    assert api.client.get("/search", params={"q": "mars"}).json()["total"]
+    body = api.client.get("/search", params={"q": "mars", "date_from": "2999"}).json()
+    assert body["total"] == 0 and body["items"] == []
+    assert not api.nasa_requests
+
+
+def test_fast_search_pages_match_the_model_path(api, monkeypatch):
+    params = {"q": "apollo", "page": 2, "page_size": 7}
+    slow = api.client.get("/search", params=params).json()
+    monkeypatch.setattr(api.module, "FAST_RESPONSES", True)
+    catalog = api.module.catalog_store.snapshot()
+
+    fast = api.client.get("/search", params=params)
+    # The id index is built off the request path, never by a request
+    assert catalog._positions is None
+    assert fast.json()["items"] == slow["items"]
+    assert fast.json()["scores"] == {img["id"]: slow["scores"][img["id"]] for img in slow["items"]}
+    assert api.client.get("/search", params=params, headers={"If-None-Match": fast.headers["etag"]}).status_code == 304
+
+    catalog.positions()
+    assert api.client.get("/search", params=params).content == fast.content
+
+
+def test_refresh_patches_the_index_with_upstream_changes(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(api.module, "SEARCH_INDEX_FILE", str(tmp_path / "index.bin"))
+    known = api.images[0]
+    api.nasa_response = {"collection": {"items": [
+        {
+            "data": [{"nasa_id": "zzyzx-1", "title": "Zzyzx flyby", "keywords": ["zzyzx"]}],
+            "links": [{"rel": "preview", "href": "https://images.example/zzyzx-1.jpg"}],
+        },
+        {
+            "data": [{
+                "nasa_id": known.nasa_id, "title": "Quokka", "description": known.description,
+                "date_created": known.date_created, "keywords": list(known.keywords),
+            }],
+            "links": [{"rel": "preview", "href": known.preview_url}],
+        },
+    ]}}
+
+    asyncio.run(api.module.refresh_images())
+
+    assert [img["id"] for img in api.client.get("/search", params={"q": "zzyzx"}).json()["items"]] == ["zzyzx_1"]
+    assert [img["id"] for img in api.client.get("/search", params={"q": "quokka"}).json()["items"]] == [known.id]
+    assert api.module.catalog_store.images[0].nasa_id == "zzyzx-1"
+    assert len(api.module.catalog_store.images) == len(api.images) + 1
+    assert api.module.nasa_service.is_cache_fresh()
+
+
+def test_history_results_replay_the_recorded_ranking(api):
+    api.client.get("/search", params={"q": "saturn rings"})
+    entry = api.client.get("/history").json()["items"][0]
+    ranked = api.module.search_service.rank("saturn rings")
+    assert entry["query"] == "saturn rings" and entry["total"] == ranked.total
+
+    full = api.client.get(f"/history/{entry['id']}/results").json()
+    assert [img["id"] for img in full["results"]] == [img.id for img in ranked.page(0, ranked.total)]
+
+    url = f"/history/{entry['id']}/results/paginated"
+    page_size = 4
+    pages = []
+    for page in range(1, (ranked.total + page_size - 1) // page_size + 1):
+        body = api.client.get(url, params={"page": page, "page_size": page_size}).json()
+        assert body["total"] == ranked.total
+        assert list(body["scores"]) == [img["id"] for img in body["items"]]
+        pages += body["items"]
+    assert pages == full["results"]
+
+    assert api.client.get(url, params={"page": page + 1, "page_size": page_size}).status_code == 404
+    assert api.client.get("/history/missing/results").status_code == 404
+
+
+def test_history_results_skip_images_no_longer_in_the_catalog(api):
+    api.client.get("/search", params={"q": "mars"})
+    history_id = api.client.get("/history").json()["items"][0]["id"]
+    ranked = list(api.module.search_service.rank("mars").scores())
+    dropped = set(ranked[::2])
+    api.module.catalog_store.replace([img for img in api.images if img.id not in dropped])
+
+    body = api.client.get(f"/history/{history_id}/results/paginated", params={"page_size": 100}).json()
+    assert [img["id"] for img in body["items"]] == ranked[1::2][:100]
+    assert body["total"] == len(ranked[1::2])
+
+
+def test_batch_search_matches_single_searches(api, monkeypatch):
+    service = api.module.search_service
+    ranked_queries = []
+    rank_many_hits = service._rank_many_hits
+
+    def spy(snapshot, queries, *args):
+        ranked_queries.append(list(queries))
+        return rank_many_hits(snapshot, queries, *args)
+    monkeypatch.setattr(service, "_rank_many_hits", spy)
+
+    queries = ["mars", "apollo moon", " mars ", "Mars!", "zzyzx"]
+    body = api.client.post(
+        "/search/batch", json={"queries": queries, "page": 2, "page_size": 5, "record_history": False}
+    ).json()
+    assert len(ranked_queries) == 1 and len(ranked_queries[0]) == 3
+    assert not api.client.get("/history").json()["items"]
+    # Only the query without local hits went to the NASA API
+    assert [r.url.params["q"] for r in api.nasa_requests] == ["zzyzx"]
+
+    for query, result in zip(queries, body["results"]):
+        single = api.client.get("/search", params={"q": query, "page": 2, "page_size": 5})
+        if result["total"] > 5:
+            assert result == single.json()
+        else:
+            assert result["items"] == [] and single.status_code == 404
+
+
+def test_batch_search_records_each_query_once(api):
+    api.client.post("/search/batch", json={"queries": ["venus", "jupiter", "venus"]})
+    entries = api.client.get("/history").json()["items"]
+    assert sorted(entry["query"] for entry in entries) == ["jupiter", "venus"]
+
+
+def test_worker_attaches_to_the_loaders_catalog(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(api.module, "SEARCH_INDEX_FILE", str(tmp_path / "index.bin"))
+    monkeypatch.setattr(api.module, "SHARED_STATE", "worker")
+    monkeypatch.setattr(api.module, "_shared_seen", (None, None))
+    module = api.module
+    published = api.images[:120]
+
+    # What the loader leaves behind: a cache and the index built from it
+    loader = SearchService(executor="inline")
+    loader.build_index(published)
+    module.nasa_service._save_to_cache(published)
+    assert not asyncio.run(module._attach_shared_state())
+    loader.save_index(module.SEARCH_INDEX_FILE, published, module.nasa_service.cache_checksum)
+
+    assert module._shared_files() != module._shared_seen
+    assert asyncio.run(module._attach_shared_state())
+    assert module._shared_files() == module._shared_seen
+    assert list(module.catalog_store.images) == published
+    assert api.client.get("/search", params={"q": "mars"}).json()["total"] == loader.rank("mars").total
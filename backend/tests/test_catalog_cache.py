@@ -0,0 +1,146 @@
+import os
+import pickle
+import stat
+
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services.catalog_cache import (
+    DIRECTORY_ENTRY, FILE_MODE, FORMAT_VERSION, HEADER, MAGIC, CatalogCacheError, CatalogFile, CompactCatalog,
+    compact, write_catalog
+)
+from src.services.nasa_service import NASAService
+
+
+@pytest.fixture
+def images():
+    return list(SyntheticCorpus(200, 1).images())
+
+
+@pytest.fixture
+def cache_file(tmp_path, images):
+    path = str(tmp_path / "cache.bin")
+    write_catalog(path, images, ts=123)
+    return path
+
+
+def _truncate(path, size):
+    with open(path, "r+b") as f:
+        f.truncate(size)
+
+
+def _flip(path, offset):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def _section_offset(path, name):
+    with open(path, "rb") as f:
+        data = f.read()
+    count = HEADER.unpack_from(data, 0)[4]
+    for i in range(count):
+        raw_name, offset, _ = DIRECTORY_ENTRY.unpack_from(data, HEADER.size + i * DIRECTORY_ENTRY.size)
+        if raw_name.rstrip(b"\0").decode() == name:
+            return offset
+    raise KeyError(name)
+
+
+def test_round_trip(tmp_path, images):
+    path = str(tmp_path / "cache.bin")
+    checksum = write_catalog(path, images, ts=123)
+    catalog = CatalogFile(path)
+    assert catalog.ts == 123
+    assert catalog.checksum == checksum
+    assert list(catalog.images()) == images
+
+
+@pytest.mark.parametrize("size", [0, 10, HEADER.size, 30, 50, 71, 72, 200])
+def test_truncated_file_is_rejected(cache_file, size):
+    _truncate(cache_file, size)
+    with pytest.raises(CatalogCacheError):
+        CatalogFile(cache_file)
+
+
+def test_truncated_tail_is_rejected(cache_file):
+    with open(cache_file, "rb") as f:
+        size = len(f.read())
+    _truncate(cache_file, size - 1)
+    with pytest.raises(CatalogCacheError):
+        CatalogFile(cache_file)
+
+
+def test_damaged_string_data_is_rejected_on_open(cache_file):
+    _flip(cache_file, _section_offset(cache_file, "title.data") + 3)
+    with pytest.raises(CatalogCacheError, match="checksum"):
+        CatalogFile(cache_file)
+
+
+def test_file_without_digest_is_checked_for_valid_strings(tmp_path, images):
+    # Files written before the digest section existed
+    path = str(tmp_path / "cache.bin")
+    write_catalog(path, images, ts=1)
+    catalog = CatalogFile(path)
+    sections = {name: bytes(view) for name, view in catalog._sections.items() if name != "checksum"}
+    title = sections["title.data"]
+    sections["title.data"] = b"\xff" + title[1:]
+
+    legacy = str(tmp_path / "legacy.bin")
+    position = HEADER.size + DIRECTORY_ENTRY.size * len(sections)
+    directory, body = [], b""
+    for name, data in sections.items():
+        directory.append(DIRECTORY_ENTRY.pack(name.encode(), position + len(body), len(data)))
+        body += data
+    with open(legacy, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 1, len(images), len(sections)) + b"".join(directory) + body)
+
+    with pytest.raises(CatalogCacheError, match="title.data"):
+        CatalogFile(legacy)
+
+
+def test_damaged_cache_falls_back_to_empty_catalog(tmp_path, cache_file):
+    _truncate(cache_file, 50)
+    service = NASAService(cache_file=cache_file, legacy_cache_file=str(tmp_path / "missing.json"))
+    assert list(service._load_from_cache()) == []
+    assert service.cache_checksum is None
+
+
+def test_cache_file_is_readable_by_other_users(cache_file):
+    # What open() would create: 0644 under the usual umask
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == FILE_MODE
+    assert FILE_MODE & stat.S_IRUSR
+
+
+def test_compact_catalog_matches_the_items(images):
+    catalog = CompactCatalog(images[:150])
+    catalog.extend(images[150:])
+    assert len(catalog) == len(images)
+    assert list(catalog) == images
+    assert catalog[-1] == images[-1] and catalog[10:20:3] == images[10:20:3]
+    assert catalog.ids() == [img.id for img in images]
+    assert catalog.keywords(5) == images[5].keywords
+    with pytest.raises(IndexError):
+        catalog[len(images)]
+    # Keywords are stored once however many images share them
+    assert len(catalog._keywords) == len({k for img in images for k in img.keywords})
+
+
+def test_compact_catalog_copies_are_independent(images):
+    catalog = CompactCatalog(images[:100], ts=7)
+    restored = pickle.loads(pickle.dumps(catalog))
+    assert isinstance(restored, CompactCatalog) and restored.ts == 7
+    assert list(restored) == images[:100]
+
+    copy = catalog.copy()
+    copy.extend(images[100:])
+    assert len(catalog) == 100 and list(copy) == images
+    assert compact(catalog) is not catalog and list(compact(catalog)) == images[:100]
+
+
+def test_catalog_views_are_shared_and_pickled_as_items(cache_file, images):
+    view = CatalogFile(cache_file).images()
+    assert compact(view) is view
+    assert list(view) == images and view.keywords(3) == images[3].keywords
+    assert pickle.loads(pickle.dumps(view)) == images
@@ -0,0 +1,83 @@
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services.catalog_cache import CatalogFile, write_catalog
+from src.services.catalog_store import CatalogStore
+from src.services.suggestion_index import catalog_vocabulary, extended_vocabulary
+
+
+def corpus(n, seed=5):
+    return list(SyntheticCorpus(n, seed).images())
+
+
+@pytest.mark.parametrize("mapped", [False, True])
+def test_lookups_by_id_and_nasa_id(tmp_path, mapped):
+    images = corpus(60)
+    if mapped:
+        write_catalog(str(tmp_path / "cache.bin"), images, ts=1)
+        images = CatalogFile(str(tmp_path / "cache.bin")).images()
+    store = CatalogStore(images)
+    catalog = store.snapshot()
+
+    wanted = [images[12].id, "missing", images[3].id, images[12].id]
+    assert catalog.resolve(wanted) == [12, 3, 12]
+    assert catalog.lookup(wanted) == [images[12], images[3], images[12]]
+    assert catalog.get(images[7].id) == images[7] and catalog.get("missing") is None
+    assert catalog.get_by_nasa_id(images[7].nasa_id) == images[7]
+
+
+def test_replace_leaves_taken_snapshots_alone():
+    images = corpus(60)
+    store = CatalogStore(images[:30])
+    old = store.snapshot()
+    store.replace(images[30:])
+
+    assert old.get(images[0].id) == images[0] and old.get(images[40].id) is None
+    assert store.snapshot().lookup([images[0].id, images[40].id]) == [images[40]]
+    assert len(store) == 30
+
+
+def test_append_extends_in_place_and_keeps_old_generations():
+    images = corpus(60)
+    store = CatalogStore(images[:40])
+    old = store.snapshot()
+    old.serialize_all()
+    catalog = store.images
+
+    added = store.append(images[30:50] + images[45:50])
+    assert added == images[40:50]
+    assert store.images is catalog
+
+    new = store.snapshot()
+    assert len(new) == 50 and list(new.images) == images[:50]
+    assert new.get(images[45].id) == images[45]
+    assert list(new.iter_json())[:40] == list(old.iter_json())
+
+    assert len(old) == 40
+    assert old.page(30, 60) == images[30:40]
+    assert old.get(images[45].id) is None
+    assert len(list(old.iter_json())) == 40
+
+
+def test_append_to_an_older_generation_branches():
+    images = corpus(60)
+    store = CatalogStore(images[:40])
+    old = store.snapshot()
+    store.append(images[40:50])
+
+    branch = old.extended(images[50:60])
+    assert list(branch.images) == images[:40] + images[50:60]
+    assert list(store.snapshot().images) == images[:50]
+
+
+def test_extended_vocabulary_matches_a_full_build():
+    images = corpus(200)
+    images[150] = images[150].model_copy(update={"keywords": [k.upper() for k in images[150].keywords] + ["  "]})
+    full = catalog_vocabulary(images)
+    base = catalog_vocabulary(images[:120])
+    extended = extended_vocabulary(base, images[120:])
+
+    assert extended._keys == full._keys
+    assert extended._ranks == full._ranks
+    assert base._ranks == catalog_vocabulary(images[:120])._ranks
+    assert extended.top("m", 5) == full.top("m", 5)
@@ -0,0 +1,23 @@
+import re
+
+from src.benchmark import SyntheticCorpus
+from src.cli import main
+from src.services.catalog_cache import write_catalog
+
+
+def test_memory_report_compares_models_and_the_compact_catalog(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert main(["memory-report"]) == 1
+    assert "No catalog cache found" in capsys.readouterr().out
+
+    (tmp_path / "data").mkdir()
+    write_catalog(str(tmp_path / "data" / "cache.bin"), list(SyntheticCorpus(500, 3).images()), ts=1)
+    assert main(["memory-report"]) == 0
+    report = capsys.readouterr().out
+    per_image = {
+        name.strip(): float(value)
+        for name, value in re.findall(r"^([^:]+):\s+(\d+) bytes/image", report, re.MULTILINE)
+    }
+    assert "Images:                    500" in report
+    assert 0 < per_image["CompactCatalog"] < per_image["pydantic ImageItem list"]
+    assert "Memory-mapped cache file" in per_image
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services.export import arrow_chunks, ndjson_chunks, scored_json
+
+
+def test_ndjson_chunks_hold_whole_lines():
+    chunks = list(ndjson_chunks((b'{"n":%d}' % i for i in range(5)), chunk_rows=2))
+    assert chunks == [b'{"n":0}\n{"n":1}\n', b'{"n":2}\n{"n":3}\n', b'{"n":4}\n']
+    assert list(ndjson_chunks([])) == []
+    assert json.loads(scored_json(b'{"id":"a"}', 0.25)) == {"id": "a", "score": 0.25}
+
+
+def test_arrow_chunks_are_one_stream():
+    pa = pytest.importorskip("pyarrow")
+    images = list(SyntheticCorpus(25, 2).images())
+    chunks = list(arrow_chunks(((img, i / 10) for i, img in enumerate(images)), with_score=True, batch_rows=10))
+    # Schema, two full batches, then the last batch with the end of stream
+    assert len(chunks) == 4
+
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    assert table.column("id").to_pylist() == [img.id for img in images]
+    assert table.column("keywords").to_pylist() == [img.keywords for img in images]
+    assert table.column("score").to_pylist() == [i / 10 for i in range(25)]
+
+
+def test_search_export_streams_every_hit_in_rank_order(api):
+    ranked = api.module.search_service.rank("mars")
+    response = api.client.get("/search/export", params={"q": "mars"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["x-total-count"] == str(ranked.total)
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row.pop("score"), row["id"]) for row in rows] == [(s, i) for i, s in ranked.scores().items()]
+    assert rows[0] == ranked.page(0, 1)[0].model_dump()
+    # Exports are not searches: nothing is recorded and no fallback runs
+    assert not api.client.get("/history").json()["items"]
+    assert api.client.get("/search/export", params={"q": "zzyzx"}).text == ""
+    assert not api.nasa_requests
+
+
+def test_sources_export_streams_the_catalog(api):
+    response = api.client.get("/sources/export")
+    assert response.headers["x-total-count"] == str(len(api.images))
+    assert [json.loads(line) for line in response.text.splitlines()] == [img.model_dump() for img in api.images]
+
+
+def test_arrow_exports(api):
+    pa = pytest.importorskip("pyarrow")
+    response = api.client.get("/sources/export", params={"format": "arrow"})
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names[-1] == "preview_url"
+    assert table.to_pylist() == [img.model_dump() for img in api.images]
+
+    ranked = api.module.search_service.rank("apollo")
+    response = api.client.get("/search/export", params={"q": "apollo", "format": "arrow"})
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert dict(zip(table.column("id").to_pylist(), table.column("score").to_pylist())) == ranked.scores()
+    assert table.column("id").to_pylist() == list(ranked.scores())
+
+
+def test_arrow_export_without_pyarrow(api, monkeypatch):
+    monkeypatch.setattr(api.module, "arrow_available", lambda: False)
+    assert api.client.get("/sources/export", params={"format": "arrow"}).status_code == 501
+    assert api.client.get("/sources/export", params={"format": "csv"}).status_code == 422
@@ -0,0 +1,64 @@
+from collections import Counter
+
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services import facet_index
+from src.services.facet_index import FacetIndex, bitset, iter_bits, make_filters, parse_datetime, popcount
+
+
+@pytest.fixture(scope="module")
+def images():
+    return list(SyntheticCorpus(600, 11).images())
+
+
+def _expected(images, positions, limit):
+    keywords = Counter()
+    years = Counter()
+    for position in positions:
+        img = images[position]
+        keywords.update({keyword.strip().lower() for keyword in img.keywords})
+        created = parse_datetime(img.date_created)
+        if created is not None:
+            years[created.year] += 1
+    return keywords, sorted(years.items())
+
+
+@pytest.mark.parametrize("filters", [
+    make_filters(["mars"]),
+    make_filters(["Apollo 11", "moon"]),
+    make_filters(date_from="1990", date_to="1999-12"),
+    make_filters(["earth"], date_from="2000-01-01"),
+    make_filters(["no such keyword"]),
+])
+def test_filters_match_every_image_check(images, filters):
+    index = FacetIndex(images)
+    expected = [i for i, img in enumerate(images) if filters.matches(img)]
+    assert list(iter_bits(index.allowed(filters), len(images))) == expected
+
+
+@pytest.mark.parametrize("direct_count_docs", [0, 4096])
+def test_facet_counts(images, monkeypatch, direct_count_docs):
+    # Both counting strategies: per keyword bitset and per document
+    monkeypatch.setattr(facet_index, "DIRECT_COUNT_DOCS", direct_count_docs)
+    index = FacetIndex(images)
+    for mask in (None, index.allowed(make_filters(["mars"]))):
+        positions = range(len(images)) if mask is None else list(iter_bits(mask, len(images)))
+        keywords, years = _expected(images, positions, 10)
+        counts = index.facets(mask, limit=10)
+
+        assert counts.years == years
+        assert [count for _, count in counts.keywords] == sorted(keywords.values(), reverse=True)[:10]
+        assert all(keywords[keyword.lower()] == count for keyword, count in counts.keywords)
+
+
+def test_bitsets():
+    doc_ids = [0, 7, 8, 63, 64, 1000]
+    mask = bitset(doc_ids, 1001)
+    assert list(iter_bits(mask, 1001)) == doc_ids
+    assert popcount(mask) == len(doc_ids) == bin(mask).count("1")
+
+
+def test_bad_dates_are_rejected():
+    with pytest.raises(ValueError):
+        make_filters(date_from="last tuesday")
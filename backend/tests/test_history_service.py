@@ -0,0 +1,144 @@
+import json
+import threading
+
+import pytest
+
+from src.services.history_service import HistoryService
+
+
+def failing_once(original, write_first):
+    calls = []
+
+    def append(records):
+        calls.append(records)
+        if len(calls) == 1:
+            if write_first:
+                original(records)
+            raise OSError("disk full")
+        return original(records)
+    return append
+
+
+@pytest.mark.parametrize("write_first", [False, True])
+def test_records_survive_a_failed_flush(tmp_path, write_first):
+    path = str(tmp_path / "history.log")
+    history = HistoryService(history_file=path, flush_interval=0)
+    history.add_search_ids("mars", ["a", "b"], {"a": 1.0, "b": 0.5})
+    history._append_records = failing_once(history._append_records, write_first)
+
+    second = history.add_search_ids("moon", ["c", "a"], {"c": 0.9, "a": 0.4})
+    assert history.stats()["pending_records"] == 2
+
+    third = history.add_search_ids("venus", ["d"], {"d": 0.7})
+    assert history.stats()["pending_records"] == 0
+    history.close()
+
+    reloaded = HistoryService(history_file=path, flush_interval=0)
+    assert [e.query for e in reloaded.history.values()] == ["mars", "moon", "venus"]
+    assert reloaded.get_entry(second).result_ids == ["c", "a"]
+    assert reloaded.get_entry(third).result_ids == ["d"]
+    reloaded.close()
+
+
+def test_readers_run_alongside_writers(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=60)
+    stop = threading.Event()
+    errors = []
+
+    def write():
+        for i in range(3000):
+            history_id = history.add_search_ids(f"mars {i % 50}", ["a", "b"], {"a": 1.0, "b": 0.5})
+            if i % 3:
+                history.delete_entry(history_id)
+        stop.set()
+
+    def read():
+        try:
+            while not stop.is_set():
+                history.get_paginated(1, 20)
+                history.get_suggestions("")
+                history.get_suggestions("mars")
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    write()
+    for thread in readers:
+        thread.join()
+    history.close()
+    assert errors == []
+
+
+def test_recent_searches_without_a_prefix(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0)
+    for query in ["mars", "moon", "venus", "mars", "saturn"]:
+        history.add_search_ids(query, [], {})
+    assert history.get_suggestions("", 3) == ["saturn", "mars", "venus"]
+    assert history.get_suggestions("  ", 10) == ["saturn", "mars", "venus", "moon"]
+    history.close()
+
+
+def test_entries_round_trip_through_the_log(tmp_path):
+    path = str(tmp_path / "history.log")
+    history = HistoryService(history_file=path, flush_interval=0)
+    mars = history.add_search_ids("mars", ["a", "b"], {"a": 1.25, "b": 0.5})
+    moon = history.add_search_ids("moon", ["b", "c"], {"b": 0.123456, "c": 0.1})
+    gone = history.add_search_ids("venus", ["d"], {"d": 0.7})
+    history.delete_entry(gone)
+    history.close()
+
+    reloaded = HistoryService(history_file=path, flush_interval=0)
+    assert reloaded.stats()["result_ids"] == 4
+    assert reloaded.get_entry(gone) is None
+    for history_id in (mars, moon):
+        assert reloaded.get_entry(history_id) == history.get_entry(history_id)
+    # Thousandths are packed, anything finer is kept as given
+    assert reloaded.history[mars].scores is not None
+    assert reloaded.get_entry(moon).result_scores == {"b": 0.123456, "c": 0.1}
+    reloaded.close()
+
+
+def test_legacy_history_is_migrated(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([
+        {"id": "1", "timestamp": 100, "query": "mars", "total": 2,
+         "result_ids": ["a", "b"], "result_scores": {"a": 1.0, "b": 0.5}},
+        {"id": "2", "timestamp": 200, "query": "moon", "total": 1,
+         "result_ids": ["c"], "result_scores": {"c": 0.25}},
+    ]))
+    path = tmp_path / "history.log"
+    history = HistoryService(history_file=str(path), legacy_history_file=str(legacy), flush_interval=0)
+    assert path.exists()
+    history.close()
+
+    reloaded = HistoryService(history_file=str(path), legacy_history_file=str(tmp_path / "none.json"), flush_interval=0)
+    assert [e.query for e in reloaded.get_paginated().items] == ["moon", "mars"]
+    assert reloaded.get_entry("1").result_scores == {"a": 1.0, "b": 0.5}
+    assert reloaded.get_suggestions("m") == ["moon", "mars"]
+    reloaded.close()
+
+
+def test_log_is_compacted_to_live_entries(tmp_path):
+    path = tmp_path / "history.log"
+    history = HistoryService(history_file=str(path), flush_interval=0, compact_min_records=10)
+    for i in range(50):
+        history_id = history.add_search_ids(f"query {i % 3}", [str(i)], {str(i): 1.0})
+    history.delete_entry(history_id)
+    assert history.stats()["log_records"] <= 10
+    assert len(path.read_text().splitlines()) == history.stats()["log_records"] + 1
+    history.close()
+
+    reloaded = HistoryService(history_file=str(path), flush_interval=0)
+    assert [e.query for e in reloaded.get_paginated().items] == ["query 0", "query 2"]
+    assert reloaded.get_paginated().items[0].result_ids == ["48"]
+    reloaded.close()
+
+
+def test_results_per_entry_are_capped(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0, max_results=2)
+    history_id = history.add_search_ids("mars", ["a", "b", "c"], {"a": 1.0, "b": 0.5, "c": 0.1})
+    entry = history.get_entry(history_id)
+    assert (entry.total, entry.result_ids, entry.result_scores) == (3, ["a", "b"], {"a": 1.0, "b": 0.5})
+    history.close()
@@ -0,0 +1,86 @@
+import re
+import time
+
+from fastapi.testclient import TestClient
+
+from src.services.metrics import InstrumentationMiddleware, ProfileStore, Registry, SamplingProfiler, registry
+
+
+def sample(text, name):
+    match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_registry_renders_the_text_format():
+    metrics = Registry()
+    requests = metrics.counter("requests_total", "Requests", ("kind",))
+    requests.inc(kind="page")
+    requests.inc(2, kind='say "hi"\n')
+    metrics.gauge("pages", "Pages").set(3.5)
+    latency = metrics.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    metrics.add_collector(lambda: [("docs", "gauge", "Documents", [({"shard": "a"}, 7)])])
+    metrics.add_collector(lambda: 1 / 0)
+
+    text = metrics.render()
+    assert "# TYPE requests_total counter" in text
+    assert sample(text, 'requests_total{kind="page"}') == 1
+    assert sample(text, 'requests_total{kind="say \\"hi\\"\\n"}') == 2
+    assert sample(text, "pages") == 3.5
+    assert [sample(text, f'latency_seconds_bucket{{le="{le}"}}') for le in ("0.1", "1", "+Inf")] == [1, 2, 3]
+    assert sample(text, "latency_seconds_sum") == 5.55 and sample(text, "latency_seconds_count") == 3
+    assert sample(text, 'docs{shard="a"}') == 7
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Registry(enabled=False)
+    metrics.counter("requests_total", "Requests").inc()
+    metrics.histogram("latency_seconds", "Latency").since(0.0)
+    text = metrics.render()
+    assert sample(text, "requests_total") is None and sample(text, "latency_seconds_count") is None
+
+
+def test_profile_store_keeps_the_latest_profiles():
+    store = ProfileStore(max_profiles=2)
+    ids = [store.add(f"GET /{i}", SamplingProfiler()) for i in range(3)]
+    assert store.get(ids[0]) is None
+    assert [p["id"] for p in store.list()] == [ids[2], ids[1]]
+
+
+def test_metrics_endpoint_reports_requests_and_service_state(api):
+    api.client.get("/search", params={"q": "mars"})
+    client = TestClient(InstrumentationMiddleware(api.app, registry))
+    client.get("/search", params={"q": "apollo"})
+
+    response = api.client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert sample(text, 'http_request_seconds_count{method="GET",route="/search",status="200"}') >= 1
+    assert sample(text, 'search_stage_seconds_count{stage="score"}') >= 2
+    assert sample(text, "catalog_images") == len(api.images)
+    assert sample(text, "search_index_documents") == len(api.images)
+    assert sample(text, "history_entries") == 2
+
+
+def test_requests_can_ask_for_a_profile(api, monkeypatch):
+    store = ProfileStore()
+    monkeypatch.setattr(api.module, "profile_store", store)
+
+    rank = api.module.search_service.rank
+
+    def slow_rank(*args):
+        time.sleep(0.05)
+        return rank(*args)
+    monkeypatch.setattr(api.module.search_service, "rank", slow_rank)
+    client = TestClient(InstrumentationMiddleware(api.app, registry, store))
+
+    assert "x-profile-id" not in client.get("/search", params={"q": "mars"}).headers
+    profile_id = client.get("/search", params={"q": "mars"}, headers={"X-Profile": "1"}).headers["x-profile-id"]
+    [listed] = client.get("/debug/profiles").json()
+    assert listed["id"] == profile_id and listed["request"] == "GET /search" and listed["samples"] > 0
+
+    stacks = client.get(f"/debug/profiles/{profile_id}").text
+    assert re.search(r"^\S.* \d+$", stacks, re.MULTILINE)
+    assert "slow_rank (test_metrics.py" in stacks
+    assert client.get("/debug/profiles/missing").status_code == 404
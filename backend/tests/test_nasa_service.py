@@ -0,0 +1,219 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+
+from src.services.nasa_service import NASAService, TokenBucket
+
+
+def payload(*nasa_ids):
+    return {"collection": {"items": [
+        {
+            "data": [{"nasa_id": nasa_id, "title": nasa_id.title(), "keywords": ["mars"]}],
+            "links": [{"rel": "preview", "href": f"https://images.example/{nasa_id}.jpg"}],
+        }
+        for nasa_id in nasa_ids
+    ]}}
+
+
+def make_service(tmp_path, handler, **kwargs):
+    """A service whose pooled client talks to ``handler`` instead of the API."""
+    service = NASAService(cache_file=str(tmp_path / "cache.bin"), base_url="https://api.example/search", **kwargs)
+    service.retry_delay = 0.01
+
+    def attach():
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service._client_loop = asyncio.get_running_loop()
+    return service, attach
+
+
+def test_client_is_pooled_per_event_loop():
+    service = NASAService()
+
+    async def clients():
+        first = service._get_client()
+        assert service._get_client() is first
+        return first
+
+    first = asyncio.run(clients())
+    second = asyncio.run(clients())
+    assert second is not first
+
+    asyncio.run(service.close())
+    assert service._client is None
+
+
+def test_pages_share_the_pooled_client(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        page = int(request.url.params["page"])
+        return httpx.Response(200, json=payload(f"p{page}") if page <= 3 else payload())
+
+    service, attach = make_service(tmp_path, handler, concurrency=4, rate_limit=1000)
+
+    async def run():
+        attach()
+        client = service._client
+        pages = [(page, [img.nasa_id for img in images]) async for page, images in service.iter_pages(1, 6, 100)]
+        assert service._client is client
+        await service.close()
+        return pages
+
+    assert asyncio.run(run()) == [(1, ["p1"]), (2, ["p2"]), (3, ["p3"])]
+    assert {r.url.params["media_type"] for r in requests} == {"image"}
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+
+    async def run():
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # The burst is free; the other four tokens accrue at 20 per second
+    assert asyncio.run(run()) >= 0.18
+
+
+def test_token_bucket_backoff_pauses_and_recovers():
+    bucket = TokenBucket(rate=100, burst=10, min_rate=10)
+    bucket.backoff(0.2)
+    assert bucket.rate == 50
+
+    async def run():
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.18
+    for _ in range(5):
+        bucket.recover()
+    assert bucket.rate == 100
+    for _ in range(10):
+        bucket.backoff(0)
+    assert bucket.rate == 10
+
+
+def test_fetch_page_honours_retry_after(tmp_path):
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.2"}),
+        httpx.Response(200, json=payload("a", "b")),
+    ]
+    seen = []
+
+    def handler(request):
+        seen.append(time.monotonic())
+        return responses.pop(0)
+
+    service, attach = make_service(tmp_path, handler, rate_limit=100)
+
+    async def run():
+        attach()
+        try:
+            return await service.fetch_page(1, 100)
+        finally:
+            await service.close()
+
+    images = asyncio.run(run())
+    assert [img.nasa_id for img in images] == ["a", "b"]
+    assert seen[1] - seen[0] >= 0.18
+    # Halved by the 429, then stepped back up by the success
+    assert service.rate_limiter.rate == 60
+
+
+def test_fetch_page_gives_up_after_retries(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"})
+
+    service, attach = make_service(tmp_path, handler, rate_limit=1000)
+
+    async def run():
+        attach()
+        try:
+            return await service.fetch_page(1, 100)
+        finally:
+            await service.close()
+
+    assert asyncio.run(run()) == []
+    assert len(calls) == service.max_retries
+
+
+def test_rate_limited_search_is_not_cached(tmp_path):
+    responses = [httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200, json=payload("a"))]
+    service, attach = make_service(tmp_path, lambda request: responses.pop(0), rate_limit=1000)
+
+    async def run():
+        attach()
+        try:
+            first = await service.search_fallback("Mars")
+            second = await service.search_fallback("mars ")
+            third = await service.search_fallback("MARS")
+            return first, second, third
+        finally:
+            await service.close()
+
+    first, second, third = asyncio.run(run())
+    assert first == []
+    assert [img.nasa_id for img in second] == [img.nasa_id for img in third] == ["a"]
+    assert not responses
+    assert service.fallback_cache.hits == 1
+
+
+def test_retry_after_parsing():
+    service = NASAService()
+    service.max_retry_after = 30.0
+    retry_after = lambda value: service._retry_after(httpx.Response(429, headers={"Retry-After": value}), 2)
+
+    assert retry_after("5") == 5.0
+    assert retry_after("600") == 30.0
+    assert retry_after("-3") == 0.0
+    assert 8 <= retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    # Unparseable values fall back to exponential backoff
+    assert retry_after("soon") == service.retry_delay * 4
+    assert service._retry_after(httpx.Response(429), 1) == service.retry_delay * 2
+
+
+def test_refresh_stops_at_known_images(tmp_path):
+    pages = {1: payload("new-a", "old-b"), 2: payload("new-c", "old-d"), 3: payload("old-e"), 4: payload("new-f")}
+    requested = []
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        requested.append(page)
+        return httpx.Response(200, json=pages.get(page, payload()))
+
+    service, attach = make_service(tmp_path, handler, concurrency=1, rate_limit=1000)
+    known = service._parse_nasa_response(payload("old-b", "old-d", "old-e", "old-g"))
+    # Changed upstream since the last refresh
+    known[1] = known[1].model_copy(update={"title": "Stale"})
+
+    async def run():
+        attach()
+        return await service.refresh_catalog(known, max_pages=10)
+
+    catalog, updated = asyncio.run(run())
+    assert requested == [1, 2, 3]
+    assert [img.nasa_id for img in catalog] == ["new-a", "new-c", "old-b", "old-d", "old-e", "old-g"]
+    assert catalog[3].title == "Old-D"
+    assert [img.nasa_id for img in updated] == ["new-a", "new-c", "old-d"]
+
+
+def test_cache_freshness_follows_the_timestamp(tmp_path):
+    service = NASAService(cache_file=str(tmp_path / "cache.bin"))
+    assert service.cache_age() == float("inf") and not service.is_cache_fresh()
+
+    images = service._parse_nasa_response(payload("a", "b"))
+    service._save_to_cache(images, ts=int(time.time()) - 60)
+    reloaded = NASAService(cache_file=str(tmp_path / "cache.bin"))
+    assert [img.nasa_id for img in reloaded._load_from_cache()] == ["a", "b"]
+    assert 60 <= reloaded.cache_age() < 120 and reloaded.is_cache_fresh()
+
+    reloaded.cache_duration = 30
+    assert not reloaded.is_cache_fresh()
@@ -0,0 +1,69 @@
+import time
+
+from src.benchmark import SyntheticCorpus
+from src.services.facet_index import make_filters
+from src.services.query_cache import ENTRY_OVERHEAD_BYTES, HIT_BYTES, QueryCache
+from src.services.search_service import SearchService
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put(1, "a", "A")
+    cache.put(1, "b", "B")
+    assert cache.get(1, "a") == "A"
+    cache.put(1, "c", "C")
+    assert cache.get(1, "b") is None
+    assert (cache.get(1, "a"), cache.get(1, "c")) == ("A", "C")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = QueryCache(ttl=0.05)
+    cache.put(1, "a", "A")
+    assert cache.get(1, "a") == "A"
+    time.sleep(0.06)
+    assert cache.get(1, "a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_memory_bound():
+    cost = ENTRY_OVERHEAD_BYTES + HIT_BYTES * 10
+    cache = QueryCache(max_bytes=2 * cost)
+    for key in "abc":
+        cache.put(1, key, key, size=10)
+    assert cache.stats()["entries"] == 2 and cache.bytes == 2 * cost
+    # Larger than the whole cache: not stored
+    cache.put(1, "huge", "x", size=10 ** 9)
+    assert cache.get(1, "huge") is None
+
+
+def test_newer_index_versions_drop_entries():
+    cache = QueryCache()
+    cache.put(1, "a", "A")
+    cache.invalidate(2)
+    assert cache.get(2, "a") is None
+    # Results computed against the old index are not stored
+    cache.put(1, "a", "A")
+    assert cache.get(2, "a") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = QueryCache(max_entries=0)
+    cache.put(1, "a", "A")
+    assert cache.get(1, "a") is None and cache.stats()["misses"] == 0
+
+
+def test_search_results_are_shared_by_equivalent_queries():
+    images = list(SyntheticCorpus(300, 9).images())
+    service = SearchService(executor="inline")
+    service.build_index(images[:200])
+
+    ranked = service.rank("Apollo 11")
+    assert service.rank("  the APOLLO, 11!") is ranked
+    assert service.rank('"apollo 11"') is not ranked
+    assert service.rank("apollo 11", make_filters(["moon"])) is not ranked
+
+    service.add_documents(images[200:])
+    fresh = service.rank("apollo 11")
+    assert fresh is not ranked and fresh.total > ranked.total
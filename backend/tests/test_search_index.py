@@ -0,0 +1,158 @@
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services.catalog_cache import CatalogCacheError, CatalogFile, write_catalog
+from src.services import search_index
+from src.services.search_index import (
+    DESCRIPTION_PHRASE_BOOST, EXACT_KEYWORD_BOOST, KEYWORD_PHRASE_BOOST, PROXIMITY_BOOST, PROXIMITY_WINDOW,
+    TITLE_PHRASE_BOOST, InvertedIndex
+)
+from src.services.search_service import SearchService
+
+
+@pytest.fixture
+def persisted(tmp_path):
+    """A saved catalog and the index built for it."""
+    images = list(SyntheticCorpus(300, 2).images())
+    catalog_path, index_path = str(tmp_path / "cache.bin"), str(tmp_path / "index.bin")
+    checksum = write_catalog(catalog_path, images, ts=1)
+    service = SearchService()
+    service.build_index(images)
+    assert service.save_index(index_path, images, checksum)
+    return service, CatalogFile(catalog_path).images(), index_path, checksum
+
+
+def _results(service, queries):
+    return [service.rank(query).all() for query in queries]
+
+
+def test_save_and_load_round_trip(persisted):
+    built, catalog, index_path, checksum = persisted
+    loaded = SearchService()
+    assert loaded.load_index(index_path, catalog, checksum)
+    queries = ["mars", "apollo 11", "space station", "nasa earth"]
+    assert _results(loaded, queries) == _results(built, queries)
+
+
+def test_index_for_another_catalog_is_not_used(persisted):
+    _, catalog, index_path, _ = persisted
+    assert not SearchService().load_index(index_path, catalog, "0" * 64)
+
+
+@pytest.mark.parametrize("size", [0, 10, 30, 50, 1000])
+def test_truncated_index_is_not_used(persisted, size):
+    _, catalog, index_path, checksum = persisted
+    with open(index_path, "r+b") as f:
+        f.truncate(size)
+    with pytest.raises(CatalogCacheError):
+        InvertedIndex.load(index_path, checksum)
+    assert not SearchService().load_index(index_path, catalog, checksum)
+
+
+def test_corrupt_index_is_not_used(persisted):
+    _, catalog, index_path, checksum = persisted
+    with open(index_path, "r+b") as f:
+        f.seek(-100, 2)
+        f.write(b"\xff" * 8)
+    assert not SearchService().load_index(index_path, catalog, checksum)
+
+
+def _index(*docs):
+    """An index of documents given as token segments: title, description, keywords..."""
+    index = InvertedIndex()
+    index.add([list(segments) for segments in docs])
+    return index
+
+
+def test_phrases_do_not_span_segments():
+    snapshot = _index(
+        (["mars", "rover"], ["landing", "site"]),  # title -> description
+        (["mars"], ["rover"], ["landing"]),  # description -> keyword
+        (["curiosity"], ["rover"], ["rover"], ["landing"]),  # keyword -> keyword
+        (["curiosity"], ["the", "rover", "landing", "site"]),
+    ).snapshot()
+    assert snapshot.phrase_docs(["rover", "landing"]) == {3}
+    # Nor do tokens in different segments count as near each other
+    assert snapshot.boosts(["rover", "landing"]) == {3: DESCRIPTION_PHRASE_BOOST}
+
+
+def test_proximity_window():
+    gap = ["filler"] * (PROXIMITY_WINDOW - 2)
+    snapshot = _index(
+        ([], ["apollo", *gap, "moon"]),  # just inside the window
+        ([], ["apollo", *gap, "filler", "moon"]),  # one token outside
+        ([], ["moon", "filler", "apollo"]),  # either order
+        (["apollo"], ["moon"]),  # different segments
+        ([], ["apollo", "moon"]),  # a phrase instead
+        ([], ["apollo", "apollo"]),
+    ).snapshot()
+    assert snapshot.boosts(["apollo", "moon"]) == {0: PROXIMITY_BOOST, 2: PROXIMITY_BOOST, 4: DESCRIPTION_PHRASE_BOOST}
+    # Repeating one token is not a proximity match
+    assert snapshot.boosts(["apollo", "apollo"]) == {5: DESCRIPTION_PHRASE_BOOST}
+
+
+def test_exact_keyword_boost():
+    snapshot = _index(
+        ([], [], ["space", "station"]),
+        ([], [], ["international", "space", "station"]),
+        (["space", "station", "crew"], []),
+        ([], ["the", "space", "station"]),
+        ([], [], ["mars"], ["space", "station", "crew"]),
+        ([], ["space", "station"], ["station", "space"]),
+    ).snapshot()
+    assert snapshot.boosts(["space", "station"]) == {
+        0: EXACT_KEYWORD_BOOST,
+        1: KEYWORD_PHRASE_BOOST,
+        2: TITLE_PHRASE_BOOST,
+        3: DESCRIPTION_PHRASE_BOOST,
+        4: KEYWORD_PHRASE_BOOST,
+        5: DESCRIPTION_PHRASE_BOOST,
+    }
+    # One token: a whole keyword or the title, never the description alone
+    assert snapshot.boosts(["crew"]) == {2: TITLE_PHRASE_BOOST, 4: KEYWORD_PHRASE_BOOST}
+    assert _index(([], ["mars"], ["mars"]), ([], ["mars"])).snapshot().boosts(["mars"]) == {0: EXACT_KEYWORD_BOOST}
+
+
+def test_positions_survive_save_and_load(tmp_path):
+    service = SearchService()
+    index = _index(*(service._tokenize(img) for img in SyntheticCorpus(300, 4).images()))
+    snapshot = index.snapshot()
+    path = str(tmp_path / "index.bin")
+    index.save(path, snapshot, "a" * 64)
+    loaded = InvertedIndex.load(path, "a" * 64).snapshot()
+
+    assert loaded.segments() == snapshot.segments()
+    for query in (["space", "station"], ["mars"], ["apollo", "moon"], ["nasa", "earth", "orbit"]):
+        assert loaded.phrase_docs(query) == snapshot.phrase_docs(query)
+        assert loaded.boosts(query) == snapshot.boosts(query)
+        assert loaded.score(query) == snapshot.score(query)
+
+
+def test_version_1_index_is_not_used(persisted, monkeypatch):
+    built, catalog, index_path, checksum = persisted
+    monkeypatch.setattr(search_index, "INDEX_FORMAT_VERSION", 1)
+    assert built.save_index(index_path, catalog, checksum)
+    monkeypatch.undo()
+
+    with pytest.raises(CatalogCacheError, match="version 2"):
+        InvertedIndex.load(index_path, checksum)
+    assert not SearchService().load_index(index_path, catalog, checksum)
+
+
+def test_scores_match_rank_bm25():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    service = SearchService()
+    images = list(SyntheticCorpus(1500, 6).images())
+    service.build_index(images)
+    snapshot = service.snapshot.index
+
+    def tokens(img):
+        # The token stream rank_bm25 was given: keywords and title twice
+        return service._normalize(" ".join(img.keywords * 2 + [img.title] * 2 + [img.description]))
+
+    bm25 = rank_bm25.BM25Okapi([tokens(img) for img in images], k1=1.2, b=0.75)
+    queries = ["mars", "apollo 11", "space station crew", "nasa nasa earth", "zzyzx", "the moon", "1969"]
+    for query in queries:
+        query_tokens = service._normalize(query)
+        expected = {doc_id: score for doc_id, score in enumerate(bm25.get_scores(query_tokens)) if score}
+        assert snapshot.score(query_tokens) == expected
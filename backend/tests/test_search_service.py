@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from src.benchmark import SyntheticCorpus
+from src.services.query_cache import QueryCache
+from src.services.search_service import SearchService
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def make(**kwargs):
+        service = SearchService(cache=QueryCache(max_entries=0), **kwargs)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        if service._pool is not None:
+            service._pool.shutdown()
+
+
+@pytest.mark.parametrize("executor", ["inline", "thread", "process"])
+def test_rank_async_before_any_index(make_service, executor):
+    service = make_service(executor=executor, max_workers=1)
+
+    async def rank():
+        return await service.rank_async("mars"), await service.rank_many_async(["mars", "moon"])
+
+    ranked, many = asyncio.run(rank())
+    assert ranked.total == 0
+    assert [r.total for r in many] == [0, 0]
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_executors_rank_like_inline(make_service, executor):
+    images = list(SyntheticCorpus(300, 3).images())
+    inline = make_service()
+    inline.build_index(images)
+    service = make_service(executor=executor, max_workers=2)
+    queries = ["mars", "apollo 11", '"space station"', "nasa moon"]
+
+    async def rank():
+        await service.build_index_async(images)
+        return [await service.rank_async(query) for query in queries]
+
+    assert [r.all() for r in asyncio.run(rank())] == [inline.rank(query).all() for query in queries]
+
+
+def test_scores_follow_rank_order(make_service):
+    service = make_service()
+    service.build_index(list(SyntheticCorpus(300, 3).images()))
+    ranked = service.rank("mars")
+    assert ranked.total > 20
+
+    scores = ranked.scores()
+    result_ids, history_scores = ranked.ids()
+    assert list(scores) == result_ids == [img.id for img, _ in ranked.top(ranked.total)]
+    assert history_scores == scores
+    assert list(scores.values()) == sorted(scores.values(), reverse=True)
+
+
+QUERIES = ["mars", "apollo 11", '"space station"', "nasa earth orbit", "1969"]
+
+
+def test_pages_added_incrementally_rank_like_a_rebuild(make_service):
+    images = list(SyntheticCorpus(500, 8).images())
+    incremental = make_service()
+    incremental.build_index(images[:100])
+    for start in range(100, 500, 100):
+        incremental.add_documents(images[start:start + 100])
+    rebuilt = make_service()
+    rebuilt.build_index(images)
+
+    assert incremental.images == images
+    for query in QUERIES:
+        assert incremental.rank(query).all() == rebuilt.rank(query).all()
+
+
+def test_in_flight_results_keep_their_snapshot(make_service):
+    images = list(SyntheticCorpus(400, 8).images())
+    service = make_service()
+    service.build_index(images[:200])
+    ranked = service.rank("mars")
+    before = ranked.all()
+
+    service.add_documents(images[200:])
+    assert ranked.all() == before
+    assert service.rank("mars").total > ranked.total
+
+
+def test_updated_documents_replace_their_old_versions(make_service):
+    images = list(SyntheticCorpus(300, 8).images())
+    service = make_service()
+    service.build_index(images)
+    # Past COMPACT_DELETED_RATIO, so the second update rebuilds the index
+    for changed in (images[:10], images[10:100]):
+        updated = [img.model_copy(update={"title": f"{img.title} zzyzx"}) for img in changed]
+        service.update_documents(updated)
+        images = [next((u for u in updated if u.id == img.id), img) for img in images]
+
+        rebuilt = make_service()
+        rebuilt.build_index(images)
+        assert sorted(img.id for img in service.images) == sorted(img.id for img in images)
+        for query in QUERIES + ["zzyzx"]:
+            assert service.rank(query).all()[1] == rebuilt.rank(query).all()[1]
+    assert service.rank("zzyzx").total == 100
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+from src.services.history_service import HistoryService
+from src.services.shared_state import HistoryClient, HistoryServer
+
+
+def test_client_round_trip(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0)
+    socket_path = str(tmp_path / "history.sock")
+
+    async def run():
+        server = HistoryServer(history, socket_path)
+        await server.start()
+        client = HistoryClient(socket_path)
+        try:
+            history_id = await client.add_search_ids("mars", ["a", "b"], {"a": 1.0, "b": 0.5})
+            page = await client.get_paginated(1, 10)
+            entry = await client.get_entry(history_id)
+            suggestions = await client.get_suggestions("ma")
+            deleted = await client.delete_entry(history_id)
+            return page, entry, suggestions, deleted, (await client.stats())["entries"]
+        finally:
+            client.close()
+            await server.close()
+
+    page, entry, suggestions, deleted, entries = asyncio.run(run())
+    history.close()
+    assert page.total == 1 and page.items[0].query == "mars"
+    assert entry.result_ids == ["a", "b"]
+    assert suggestions == ["mars"]
+    assert deleted and entries == 0
+
+
+def test_unreachable_owner_does_not_fail_requests(tmp_path):
+    client = HistoryClient(str(tmp_path / "missing.sock"), timeout=0.5)
+
+    async def run():
+        return (
+            await client.add_search_ids("mars", ["a"], {"a": 1.0}),
+            (await client.get_paginated(1, 10)).total,
+            await client.get_entry("x"),
+            await client.get_suggestions("ma"),
+        )
+
+    assert asyncio.run(run()) == (None, 0, None, [])
+
+
+def test_slow_owner_does_not_block_the_event_loop(tmp_path):
+    socket_path = str(tmp_path / "slow.sock")
+
+    async def run():
+        async def never_answer(reader, writer):
+            await reader.readline()
+            await asyncio.sleep(10)
+
+        server = await asyncio.start_unix_server(never_answer, path=socket_path)
+        client = HistoryClient(socket_path, timeout=0.3)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        try:
+            result = await client.get_paginated(1, 10)
+        finally:
+            ticker.cancel()
+            client.close()
+            server.close()
+        return result.total, ticks
+
+    total, ticks = asyncio.run(run())
+    assert total == 0
+    # Two timed-out attempts of 0.3 s each; the loop kept running throughout
+    assert ticks >= 30
+
+
+def test_timed_out_writes_are_not_resent(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0)
+    socket_path = str(tmp_path / "history.sock")
+
+    async def run():
+        server = HistoryServer(history, socket_path)
+        respond = server._respond
+
+        def slow_respond(line):
+            requests.append(line)
+            time.sleep(0.5)  # applied, but answered after the client gave up
+            return respond(line)
+
+        server._respond = slow_respond
+        await server.start()
+        client = HistoryClient(socket_path, timeout=0.2)
+        try:
+            added = await client.add_search_ids("mars", ["a"], {"a": 1.0})
+            await asyncio.sleep(0.6)
+            server._respond = respond
+            # Reads are retried over a fresh connection
+            page = await client.get_paginated(1, 10)
+            return added, page.total
+        finally:
+            client.close()
+            await server.close()
+
+    requests = []
+    added, total = asyncio.run(run())
+    history.close()
+    assert added is None
+    assert len(requests) == 1
+    assert total == 1
+
+
+def test_restarted_owner_gets_writes_through(tmp_path):
+    history = HistoryService(history_file=str(tmp_path / "history.log"), flush_interval=0)
+    socket_path = str(tmp_path / "history.sock")
+
+    async def run():
+        server = HistoryServer(history, socket_path)
+        await server.start()
+        client = HistoryClient(socket_path)
+        try:
+            await client.add_search_ids("mars", ["a"], {"a": 1.0})
+            await server.close()
+            server = HistoryServer(history, socket_path)
+            await server.start()
+            await asyncio.sleep(0.05)
+            return await client.add_search_ids("moon", ["b"], {"b": 1.0})
+        finally:
+            client.close()
+            await server.close()
+
+    assert asyncio.run(run()) is not None
+    history.close()
+    assert history.stats()["entries"] == 2
@@ -0,0 +1,25 @@
+from src.services.suggestion_index import PrefixIndex, frecency
+
+
+def test_prefix_index_ranks_and_discards():
+    index = PrefixIndex()
+    for rank, text in enumerate(["Mars rover", "mars", "Moon", "marsh", "Mariner 4"]):
+        index.set(text, rank)
+    assert index.top("mar", 3) == ["Mariner 4", "marsh", "mars"]
+    assert index.top("MARS", 5, exclude=["MARSH"]) == ["mars", "Mars rover"]
+
+    index.set("Mars rover", 10)
+    index.discard("marsh")
+    index.discard("marsh")
+    assert index.top("mar", 2) == ["Mars rover", "Mariner 4"]
+    assert len(index) == 4 and "marsh" not in index
+    assert index._keys == sorted((text.lower(), text) for text in index._ranks)
+    assert index.top("", 5) == []
+
+
+def test_frecency_favours_recent_and_repeated_searches():
+    day = 86400
+    once_old = frecency(None, 0)
+    once_new = frecency(None, 3 * day)
+    assert once_new > once_old
+    assert frecency(once_old, 3 * day) > once_new
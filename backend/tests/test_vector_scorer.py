@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from src.benchmark import SyntheticCorpus
+from src.services.catalog_cache import CatalogFile, write_catalog
+from src.services.facet_index import make_filters
+from src.services.query_cache import QueryCache
+from src.services.search_service import SearchService
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return SyntheticCorpus(800, 5)
+
+
+@pytest.fixture(scope="module")
+def queries(corpus):
+    mixes = corpus.query_mixes(10, 7)
+    return [query for mix in mixes.values() for query in mix] + ["apollo 11", "zzz unknown", "nasa nasa mars"]
+
+
+def _service(scorer, images=None):
+    service = SearchService(cache=QueryCache(max_entries=0), scorer=scorer)
+    if images is not None:
+        service.build_index(images)
+    return service
+
+
+def _assert_equivalent(service, queries):
+    """The vector scorer gives exactly the index's scores, boosts and phrase matches."""
+    snapshot = service.snapshot
+    index, vectors = snapshot.index, snapshot.vectors
+    assert vectors is not None
+    for query in queries:
+        tokens = service._normalize(query.replace('"', ""))
+        if not tokens:
+            continue
+        dense = vectors.score(tokens)
+        assert {d: s for d, s in index.score(tokens).items() if s} == {d: s for d, s in enumerate(dense.tolist()) if s}
+
+        factors = vectors.boosts(tokens).tolist()
+        boosts = index.boosts(tokens)
+        assert {d: f for d, f in enumerate(factors) if f != 1.0} == {d: f for d, f in boosts.items() if f != 1.0}
+        assert vectors.phrase_docs(tokens) == sorted(index.phrase_docs(tokens))
+
+
+def _assert_same_results(numpy_service, python_service, queries, filters=None):
+    for query in queries:
+        args = (query,) if filters is None else (query, filters)
+        assert numpy_service.rank(*args).all() == python_service.rank(*args).all(), query
+
+
+def test_build(corpus, queries):
+    images = list(corpus.images())
+    numpy_service = _service("numpy", images)
+    _assert_equivalent(numpy_service, queries)
+    _assert_same_results(numpy_service, _service("python", images), queries)
+
+
+def test_append_and_upsert(corpus, queries):
+    images = list(corpus.images())
+    numpy_service, python_service = _service("numpy", images[:600]), _service("python", images[:600])
+    for service in (numpy_service, python_service):
+        service.add_documents(images[600:])
+    _assert_equivalent(numpy_service, queries)
+
+    changed = [
+        image.model_copy(update={"title": images[-1].title, "keywords": image.keywords[:1]})
+        for image in images[:200]
+    ]
+    for service in (numpy_service, python_service):
+        service.update_documents(changed)
+    assert numpy_service.snapshot.index.deleted
+    _assert_equivalent(numpy_service, queries)
+    _assert_same_results(numpy_service, python_service, queries)
+
+
+def test_save_and_load(tmp_path, corpus, queries):
+    images = list(corpus.images())
+    catalog_path, index_path = str(tmp_path / "cache.bin"), str(tmp_path / "index.bin")
+    checksum = write_catalog(catalog_path, images, ts=1)
+    assert _service("python", images).save_index(index_path, images, checksum)
+
+    catalog = CatalogFile(catalog_path).images()
+    loaded = _service("numpy")
+    assert loaded.load_index(index_path, catalog, checksum)
+    _assert_equivalent(loaded, queries)
+    _assert_same_results(loaded, _service("python", images), queries)
+
+
+def test_filters(corpus, queries):
+    images = list(corpus.images())
+    numpy_service, python_service = _service("numpy", images), _service("python", images)
+    for filters in (
+        make_filters([corpus.keywords[0]]),
+        make_filters([], "1990", "2010"),
+        make_filters([corpus.keywords[1]], "2000"),
+    ):
+        _assert_same_results(numpy_service, python_service, queries, filters)